@@ -34,14 +34,75 @@ INSTALLED_APPS = [
 # -----------------------------
 MIDDLEWARE = [
    'django.middleware.security.SecurityMiddleware',
+    'yearbook.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'yearbook.querybudget.QueryBudgetMiddleware',
 ]
 
+# -----------------------------
+# QUERY BUDGETS
+# -----------------------------
+# Maximum SQL queries per request, by URL name. Requests over budget are
+# logged by QueryBudgetMiddleware and fail the tests in yearbook/tests.py.
+QUERY_BUDGET_DEFAULT = 10
+QUERY_BUDGETS = {
+    'landing': 1,
+    'about': 1,
+    'profile': 8,
+    'login': 6,
+    'signup': 10,
+    'dashboard': 4,
+    'student_dashboard': 7,
+    'search_students': 4,
+    'search_all': 5,
+    'album_list': 4,
+    'album_detail': 6,
+    'photo_detail': 5,
+    'admin_dashboard': 6,
+    'admin_student_list': 4,
+    'admin_student_add': 6,
+    'admin_student_import': 4,
+    'admin_student_edit': 6,
+    'admin_student_delete': 12,
+    'admin_student_detail': 4,
+    'admin_bulk_operations': 12,
+    'admin_album_list': 4,
+    'admin_album_add': 4,
+    'admin_album_bulk_operations': 8,
+    'admin_album_edit': 4,
+    'admin_album_delete': 8,
+    'admin_photo_list': 6,
+    'admin_photo_add': 6,
+    'admin_photo_bulk_operations': 8,
+    'admin_photo_delete': 6,
+    'admin_upload_status': 4,
+    'admin_cache_stats': 3,
+    'admin_user_lookup': 3,
+    'admin_search_report': 4,
+    'media_file': 5,
+    'logout': 5,
+}
+# POST and other unsafe methods, which also run the save's signals (and
+# BEGIN/COMMIT); measured by test_writes_within_budget, and the deletes by
+# test_deletes_do_not_grow_with_rows at two sizes
+QUERY_WRITE_BUDGET_DEFAULT = 20
+QUERY_WRITE_BUDGETS = {
+    'admin_student_add': 10,
+    'admin_student_edit': 12,
+    'admin_student_delete': 12,
+    'admin_bulk_operations': 12,
+    'admin_album_add': 6,
+    'admin_album_edit': 8,
+    'admin_album_delete': 14,
+    'admin_photo_bulk_operations': 10,
+    'admin_photo_delete': 8,
+}
+
 
 # -----------------------------
 # URLS / WSGI
@@ -78,6 +139,39 @@ DATABASES = {
     }
 }
 
+# Read replicas for GET requests (see yearbook/routers.py). To use a local
+# SQLite copy kept fresh by `python manage.py sync_replicas --interval 5`:
+#
+# DATABASES['replica'] = {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': BASE_DIR / 'db.replica.sqlite3',
+#     'TEST': {'MIRROR': 'default'},
+# }
+# DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['yearbook.routers.ReadReplicaRouter']
+# Seconds a user's reads stay on the primary after they write; keep above
+# the replication delay (the sync interval for SQLite copies)
+REPLICA_STICKY_SECONDS = 15
+
+
+# -----------------------------
+# CACHE
+# -----------------------------
+# File-based so it is shared by every worker on the host without an
+# external service; used for page caching and cross-worker version keys.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Cached album pages are invalidated by version keys; this only bounds
+# how long unused entries stay on disk
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
 
 # -----------------------------
 # PASSWORD VALIDATION
@@ -109,6 +203,57 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Media is served by yearbook.views.media_file, which checks access. Set
+# MEDIA_SENDFILE so the front-end server sends the bytes instead:
+#   'x-accel-redirect'  nginx, with an internal location for the prefix:
+#                           location /protected-media/ {
+#                               internal;
+#                               alias /path/to/media/;
+#                           }
+#   'x-sendfile'        Apache mod_xsendfile or lighttpd
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# -----------------------------
+# BULK PHOTO UPLOADS
+# -----------------------------
+# 'thread' processes uploads from a background thread of the web process;
+# 'command' leaves them for `python manage.py process_photo_uploads`.
+PHOTO_UPLOAD_RUNNER = 'thread'
+PHOTO_UPLOAD_STAGING_DIR = BASE_DIR / 'upload_staging'
+PHOTO_UPLOAD_WORKERS = None  # processes per running job; defaults to the number of CPUs, 1 runs in-process
+PHOTO_UPLOAD_BATCH_SIZE = 50
+# Jobs running at once across every web process and command, so at most
+# PHOTO_UPLOAD_MAX_RUNNING * PHOTO_UPLOAD_WORKERS worker processes; the rest wait
+PHOTO_UPLOAD_MAX_RUNNING = 1
+# A running job without progress for this many seconds (its process died)
+# is handed back to the queue; keep it well above the time one batch takes
+PHOTO_UPLOAD_STALE_AFTER = 600
+
+# -----------------------------
+# STUDENT EXPORT
+# -----------------------------
+EXPORT_CHUNK_SIZE = 2000  # rows fetched from the database at a time
+
+# -----------------------------
+# ROSTER IMPORT
+# -----------------------------
+ROSTER_IMPORT_BATCH_SIZE = 500  # rows validated and saved per transaction
+
+# -----------------------------
+# SEARCH HISTORY
+# -----------------------------
+# Searches are queued and written in batches by a background thread;
+# set SEARCH_HISTORY_BUFFER = False to write each one immediately.
+SEARCH_HISTORY_BUFFER = True
+SEARCH_HISTORY_FLUSH_INTERVAL = 5  # seconds
+SEARCH_HISTORY_FLUSH_SIZE = 200
+SEARCH_HISTORY_COALESCE_SECONDS = 300  # repeats of the same search are dropped
+SEARCH_HISTORY_FLUSH_RETRIES = 3  # failed writes of a batch before it is dropped
+# Raw searches older than this are deleted by `manage.py prune_search_history`
+# once rolled up into daily counts (yearbook/searchlog.py)
+SEARCH_HISTORY_RETENTION_DAYS = 90
+
 # -----------------------------
 # AUTHENTICATION SETTINGS
 # -----------------------------
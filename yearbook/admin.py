@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import Student, Album, Photo, SearchHistory
+from . import bulk
+from .models import Student, Album, Photo, SearchHistory, SearchRollup
+from .pagination import EstimatedCountPaginator
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
@@ -10,6 +12,7 @@ class StudentAdmin(admin.ModelAdmin):
     search_fields = ('first_name', 'last_name', 'school_id', 'email')
     list_per_page = 20
     ordering = ('last_name', 'first_name')
+    autocomplete_fields = ('user',)
     
     fieldsets = (
         ('Personal Information', {
@@ -24,13 +27,18 @@ class StudentAdmin(admin.ModelAdmin):
         }),
     )
     
-    def make_honor_roll(self, request, queryset):
-        for student in queryset:
-            student.achievements = "Honor Roll Student - " + (student.achievements or "")
-            student.save()
-    make_honor_roll.short_description = "Mark selected students as Honor Roll"
-    
-    actions = ['make_honor_roll']
+    actions = [
+        bulk.admin_action(bulk.mark_honor_roll, "Mark selected students as Honor Roll",
+                          "{count} students marked as Honor Roll."),
+    ] + [
+        bulk.admin_action(bulk.reassign_students, f"Move selected students to {label}",
+                          f"{{count}} students moved to {label}.", department=code)
+        for code, label in Student.DEPARTMENTS
+    ] + [
+        bulk.admin_action(bulk.reassign_students, f"Move selected students to year {label}",
+                          f"{{count}} students moved to year {label}.", year=code)
+        for code, label in Student.YEARS
+    ]
 
 @admin.register(Album)
 class AlbumAdmin(admin.ModelAdmin):
@@ -51,14 +59,28 @@ class AlbumAdmin(admin.ModelAdmin):
             'fields': ('is_active',)
         }),
     )
+    
+    actions = [
+        bulk.admin_action(bulk.set_albums_active, "Activate selected albums",
+                          "{count} albums activated.", active=True),
+        bulk.admin_action(bulk.set_albums_active, "Deactivate selected albums",
+                          "{count} albums deactivated.", active=False),
+    ]
 
 @admin.register(Photo)
 class PhotoAdmin(admin.ModelAdmin):
     list_display = ('__str__', 'album', 'student', 'is_featured', 'uploaded_by', 'created_at')
-    list_filter = ('album', 'is_featured', 'created_at')
-    search_fields = ('caption', 'student__first_name', 'student__last_name')
+    # __str__ reads student and album; every column's FK comes in the one query
+    list_select_related = ('album', 'student', 'uploaded_by')
+    # Filtering on album itself would list every album in the sidebar
+    list_filter = ('is_featured', 'album__department', 'album__year')
+    date_hierarchy = 'created_at'
+    search_fields = ('caption', 'album__title', 'student__first_name', 'student__last_name')
+    autocomplete_fields = ('album', 'student', 'uploaded_by')
     list_per_page = 20
     ordering = ('-created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Photo Information', {
@@ -73,6 +95,13 @@ class PhotoAdmin(admin.ModelAdmin):
         }),
     )
     
+    actions = [
+        bulk.admin_action(bulk.set_photos_featured, "Feature selected photos",
+                          "{count} photos featured.", featured=True),
+        bulk.admin_action(bulk.set_photos_featured, "Unfeature selected photos",
+                          "{count} photos unfeatured.", featured=False),
+    ]
+    
     def save_model(self, request, obj, form, change):
         if not change:  # Only set uploaded_by when creating new photo
             obj.uploaded_by = request.user
@@ -81,8 +110,31 @@ class PhotoAdmin(admin.ModelAdmin):
 @admin.register(SearchHistory)
 class SearchHistoryAdmin(admin.ModelAdmin):
     list_display = ('user', 'search_query', 'search_type', 'created_at')
-    list_filter = ('search_type', 'created_at')
+    list_select_related = ('user',)
+    list_filter = ('search_type',)
+    date_hierarchy = 'created_at'
     search_fields = ('user__username', 'search_query')
+    autocomplete_fields = ('user',)
     list_per_page = 20
     ordering = ('-created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = ('created_at',)
+
+@admin.register(SearchRollup)
+class SearchRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'search_type', 'query', 'count')
+    list_filter = ('search_type',)
+    date_hierarchy = 'day'
+    search_fields = ('query',)
+    list_per_page = 50
+    ordering = ('-day', '-count')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        # Written by searchlog.rollup() only
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
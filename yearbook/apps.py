@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    from django.db import connections
+    from . import search
+    search.install(connections[using])
 
 
 class YearbookConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'yearbook'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(ensure_search_index, sender=self)
@@ -0,0 +1,121 @@
+"""
+Set-based bulk actions shared by the custom panel and the Django admin.
+
+Each action is a single UPDATE over a queryset, run in a transaction, and
+returns the number of rows it changed. Rows that already have the target
+value are excluded so the count is what actually changed. Because
+QuerySet.update() sends no model signals and skips auto_now, each action
+sets Student.updated_at, adjusts the dashboard statistics, and invalidates
+the page cache and typeahead index once the transaction commits.
+
+admin_action() wraps an action for a ModelAdmin ``actions`` list.
+"""
+from collections import Counter
+from functools import partial
+
+from django.contrib import messages
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from . import caching, stats, typeahead
+from .models import Student
+
+HONOR_ROLL = 'Honor Roll Student - '
+
+REASSIGN_FIELDS = ('department', 'year', 'block', 'section')
+
+
+def _after_commit(func, *args):
+    transaction.on_commit(partial(func, *args))
+
+
+def mark_honor_roll(students):
+    """Prefix each student's achievements with the honor roll note."""
+    with transaction.atomic():
+        count = (students.exclude(achievements__startswith=HONOR_ROLL)
+                 .update(achievements=Concat(Value(HONOR_ROLL), F('achievements')),
+                         updated_at=timezone.now()))
+        if count:
+            _after_commit(caching.bump, 'students')
+    return count
+
+
+def reassign_students(students, **values):
+    """Move students to another department, year, block and/or section.
+
+    Only the given, non-empty fields change. Raises ValueError for an
+    unknown field or a department/year outside Student.DEPARTMENTS/YEARS.
+    """
+    values = {name: value for name, value in values.items() if value}
+    unknown = set(values) - set(REASSIGN_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot reassign {', '.join(sorted(unknown))}")
+    if 'department' in values and values['department'] not in dict(Student.DEPARTMENTS):
+        raise ValueError(f"Unknown department '{values['department']}'")
+    if 'year' in values and values['year'] not in dict(Student.YEARS):
+        raise ValueError(f"Unknown year '{values['year']}'")
+    for name, value in values.items():
+        max_length = Student._meta.get_field(name).max_length
+        if len(value) > max_length:
+            raise ValueError(f'{name} is longer than {max_length} characters')
+    if not values:
+        return 0
+
+    unchanged = Q(**values)
+    with transaction.atomic():
+        students = students.exclude(unchanged)
+        deltas = Counter()
+        if 'department' in values or 'year' in values:
+            classes = list(students.values_list('department', 'year').annotate(n=Count('id')).order_by())
+            moved = [(values.get('department', department), values.get('year', year), n)
+                     for department, year, n in classes]
+            deltas = stats.student_deltas(moved)
+            deltas.update(stats.student_deltas(classes, -1))
+        count = students.update(**values, updated_at=timezone.now())
+        if count:
+            stats.adjust(deltas)
+            _after_commit(caching.bump, 'students')
+            _after_commit(typeahead.bump_version)
+    return count
+
+
+def set_albums_active(albums, active):
+    with transaction.atomic():
+        albums = albums.exclude(is_active=active)
+        ids = list(albums.values_list('id', flat=True))
+        count = albums.filter(id__in=ids).update(is_active=active)
+        if count:
+            _after_commit(caching.bump, 'albums', *[f'album:{pk}' for pk in ids])
+    return count
+
+
+def set_photos_featured(photos, featured):
+    with transaction.atomic():
+        photos = photos.exclude(is_featured=featured)
+        changed = list(photos.values_list('id', 'album_id'))
+        count = photos.filter(id__in=[pk for pk, _album in changed]).update(is_featured=featured)
+        if count:
+            names = {f'photo:{pk}' for pk, _album in changed}
+            names.update(f'album:{album_id}' for _pk, album_id in changed)
+            _after_commit(caching.bump, *names)
+    return count
+
+
+def admin_action(action, description, message, **kwargs):
+    """A ModelAdmin action running ``action(queryset, **kwargs)``.
+
+    ``message`` is formatted with the number of rows changed.
+    """
+    def run(modeladmin, request, queryset):
+        try:
+            count = action(queryset, **kwargs)
+        except ValueError as exc:
+            modeladmin.message_user(request, str(exc), messages.ERROR)
+            return
+        modeladmin.message_user(request, message.format(count=count), messages.SUCCESS)
+
+    run.__name__ = '_'.join([action.__name__] + [f'{k}_{v}' for k, v in kwargs.items()])
+    run.short_description = description
+    return run
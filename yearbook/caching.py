@@ -0,0 +1,281 @@
+"""
+Versioned page caching for the album browsing views.
+
+A cached page is stored under a key that embeds the current value of
+every version it depends on. Model signals replace those versions when
+the underlying rows change, so stale pages are never looked up again
+and simply expire. Pages contain nothing user-specific, so they are
+shared between users and keyed only by path and query string.
+
+A miss renders the page reading from the primary (routers.primary_reads),
+so a lagging replica is never cached under a version that just changed.
+
+Versions:
+    pages           everything (bulk operations that skip signals)
+    albums          any Album saved or deleted
+    photo-counts    a Photo created, deleted or moved between albums
+    students        any Student saved or deleted (names on photo cards)
+    album:<id>      the album or any of its photos changed
+    photo:<id>      the photo changed
+
+Fragments:
+    render_fragments() caches one rendered template per object (the student
+    cards and admin table rows), keyed by the template's source, the pages
+    version, the object's pk and its version (Student.updated_at). A page
+    that lists a hundred students re-renders only the ones that changed.
+
+Conditional GET:
+    conditional_page() gives a view an ETag built from a cheap validator
+    query and the same versions, and answers a matching If-None-Match with
+    a 304 before the view (or the page cache) runs.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import get_template
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.safestring import mark_safe
+
+from .routers import primary_reads
+
+PREFIX = 'yearbook:pagecache'
+
+
+def _version_key(name):
+    return f'{PREFIX}:version:{name}'
+
+
+def bump(*names):
+    """Invalidate every page that depends on any of ``names``."""
+    # A fresh timestamp rather than incr(): a version that was evicted and
+    # re-created can never collide with one used before
+    version = time.time_ns()
+    cache.set_many({_version_key(name): version for name in names}, timeout=None)
+
+
+def bump_album(album_id):
+    bump(f'album:{album_id}')
+
+
+def invalidate_all():
+    bump('pages')
+
+
+def _versions(names):
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+async def _aversions(names):
+    keys = [_version_key(name) for name in names]
+    found = await cache.aget_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        await cache.aset_many(missing, timeout=None)
+        found.update(missing)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def _page_key(view, request, dependencies, kwargs):
+    """(version names, key prefix) for a cached page."""
+    names = ['pages'] + [d.format(**kwargs) for d in dependencies]
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return names, f'{PREFIX}:{view.__name__}:{path}'
+
+
+def _cached_response(cached):
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    response['X-Page-Cache'] = 'hit'
+    return response
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def cache_page_versioned(*dependencies):
+    """Cache a GET view's 200 responses until one of its versions changes.
+
+    Each dependency is a version name, optionally formatted with the view's
+    URL kwargs: ``@cache_page_versioned('students', 'album:{album_id}')``.
+    Works on sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method != 'GET':
+                    return await view(request, *args, **kwargs)
+                names, prefix = _page_key(view, request, dependencies, kwargs)
+                key = f'{prefix}:{await _aversions(names)}'
+                cached = await cache.aget(key)
+                if cached is not None:
+                    return _cached_response(cached)
+                with primary_reads():
+                    response = await view(request, *args, **kwargs)
+                if _cacheable(response):
+                    await cache.aset(key, (response.content, response['Content-Type']),
+                                     timeout=settings.PAGE_CACHE_TIMEOUT)
+                    response['X-Page-Cache'] = 'miss'
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            names, prefix = _page_key(view, request, dependencies, kwargs)
+            key = f'{prefix}:{_versions(names)}'
+            cached = cache.get(key)
+            if cached is not None:
+                return _cached_response(cached)
+            with primary_reads():
+                response = view(request, *args, **kwargs)
+            if _cacheable(response):
+                cache.set(key, (response.content, response['Content-Type']),
+                          timeout=settings.PAGE_CACHE_TIMEOUT)
+                response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
+
+
+def _primary_validators(validators, request, **kwargs):
+    # A lagging replica's row with the new versions would be a valid ETag
+    # for a page that no longer exists
+    with primary_reads():
+        return validators(request, **kwargs)
+
+
+def _validate(request, parts, versions):
+    """(304 response or None, etag) for a validators() result."""
+    if parts is None:
+        return None, None
+    etag = 'W/"%s"' % hashlib.md5(repr((parts, versions)).encode()).hexdigest()
+    return get_conditional_response(request, etag=etag), etag
+
+
+def _set_validators(request, response, etag):
+    if etag is None or response.status_code not in (200, 304):
+        return response
+    response.headers.setdefault('ETag', etag)
+    # Browsers may keep the page but must ask again; it is behind a login
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_page(validators, *dependencies):
+    """Answer conditional GETs for a view with a 304 before it runs.
+
+    ``validators(request, **kwargs)`` returns the ETag parts from one cheap
+    query, or None when the page doesn't exist (the view then runs and
+    raises its 404). The ETag hashes them with the versions named by
+    ``dependencies`` (as for cache_page_versioned), so edits that leave the
+    timestamps alone, like a caption or a student's name, still change it.
+    No Last-Modified is sent: no timestamp follows those edits, so an
+    If-Modified-Since would be answered 304 for a changed page. Goes
+    outside cache_page_versioned; works on sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                versions = await _aversions(['pages'] + [d.format(**kwargs) for d in dependencies])
+                parts = await sync_to_async(_primary_validators)(validators, request, **kwargs)
+                not_modified, etag = _validate(request, parts, versions)
+                if not_modified is not None:
+                    return _set_validators(request, not_modified, etag)
+                response = await view(request, *args, **kwargs)
+                return _set_validators(request, response, etag)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            versions = _versions(['pages'] + [d.format(**kwargs) for d in dependencies])
+            parts = _primary_validators(validators, request, **kwargs)
+            not_modified, etag = _validate(request, parts, versions)
+            if not_modified is not None:
+                return _set_validators(request, not_modified, etag)
+            response = view(request, *args, **kwargs)
+            return _set_validators(request, response, etag)
+        return wrapper
+    return decorator
+
+
+_template_hashes = {}
+
+
+def _template_hash(template_name):
+    # Edited templates get fresh keys after a deploy (per process, not per request)
+    if template_name not in _template_hashes:
+        source = get_template(template_name).template.source
+        _template_hashes[template_name] = hashlib.md5(source.encode()).hexdigest()[:12]
+    return _template_hashes[template_name]
+
+
+def _count(name, amount):
+    if not amount:
+        return
+    key = f'{PREFIX}:fragments:{name}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, timeout=None)
+
+
+def render_fragments(template_name, objects, version, name='object'):
+    """Render ``template_name`` once per object, reusing cached renders.
+
+    ``version(obj)`` must change whenever the fragment would (for students,
+    ``updated_at``); the template sees the object as ``name`` and nothing
+    else, since fragments are shared between users. Returns the HTML
+    fragments in the order of ``objects``.
+    """
+    objects = list(objects)
+    if not objects:
+        return []
+    prefix = f'{PREFIX}:fragment:{_template_hash(template_name)}:{_versions(["pages"])}'
+    keys = []
+    for obj in objects:
+        obj_version = hashlib.md5(repr(version(obj)).encode()).hexdigest()[:12]
+        keys.append(f'{prefix}:{obj.pk}:{obj_version}')
+    found = cache.get_many(keys)
+
+    template = get_template(template_name)
+    rendered = {}
+    fragments = []
+    for key, obj in zip(keys, objects):
+        if key not in found:
+            rendered[key] = template.render({name: obj})
+        fragments.append(mark_safe(found.get(key, rendered.get(key))))
+    if rendered:
+        cache.set_many(rendered, timeout=settings.PAGE_CACHE_TIMEOUT)
+    _count('hits', len(found))
+    _count('misses', len(rendered))
+    return fragments
+
+
+def fragment_stats():
+    """Fragment cache hits and misses counted by every process."""
+    counts = cache.get_many([f'{PREFIX}:fragments:hits', f'{PREFIX}:fragments:misses'])
+    hits = counts.get(f'{PREFIX}:fragments:hits', 0)
+    misses = counts.get(f'{PREFIX}:fragments:misses', 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
@@ -13,12 +13,26 @@ class SignUpForm(UserCreationForm):
         fields = ['username', 'first_name', 'last_name', 'email', 'password1', 'password2']
 
 class StudentForm(forms.ModelForm):
+    # A username box with suggestions from admin_user_lookup, rather than a
+    # <select> that loads every account on the site
+    user = forms.ModelChoiceField(
+        queryset=User.objects.all(),
+        to_field_name='username',
+        required=False,
+        error_messages={'invalid_choice': 'There is no account with that username.'},
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'list': 'user-options',
+            'autocomplete': 'off',
+            'placeholder': 'Username',
+        })
+    )
+
     class Meta:
         model = Student
         fields = ['user', 'first_name', 'middle_name', 'last_name', 'school_id', 'email', 
                  'department', 'year', 'block', 'section', 'profile_photo', 'achievements']
         widgets = {
-            'user': forms.Select(attrs={'class': 'form-control'}),
             'first_name': forms.TextInput(attrs={'class': 'form-control'}),
             'middle_name': forms.TextInput(attrs={'class': 'form-control'}),
             'last_name': forms.TextInput(attrs={'class': 'form-control'}),
@@ -32,6 +46,15 @@ class StudentForm(forms.ModelForm):
             'achievements': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
         }
 
+class RosterImportForm(forms.Form):
+    roster = forms.FileField(
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'})
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
 class StudentSearchForm(forms.Form):
     search = forms.CharField(
         max_length=255,
@@ -0,0 +1,141 @@
+"""
+Buffered SearchHistory writes.
+
+student_dashboard records a search on every filtered page view, including
+pagination clicks that repeat the same query. Instead of one INSERT per
+request, searches are queued in memory, repeats of the same (user, query,
+type) within SEARCH_HISTORY_COALESCE_SECONDS are dropped, and a background
+thread writes the queue with bulk_create every SEARCH_HISTORY_FLUSH_INTERVAL
+seconds or as soon as SEARCH_HISTORY_FLUSH_SIZE entries are waiting. A batch
+that fails to write goes back to the head of the queue and is only dropped
+after SEARCH_HISTORY_FLUSH_RETRIES failures in a row. The queue is drained
+at interpreter exit.
+
+recent() merges entries that are still queued, so users see their own
+searches immediately.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class SearchHistoryBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = []
+        self._seen = {}  # (user_id, query, type) -> monotonic time recorded
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._failures = 0  # failed flushes in a row
+
+    def _start(self):
+        # Also restarts the writer in a process forked after it started
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='search-history-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(settings.SEARCH_HISTORY_FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+            close_old_connections()
+
+    def _is_repeat(self, key, now):
+        window = settings.SEARCH_HISTORY_COALESCE_SECONDS
+        if len(self._seen) > 10000:
+            self._seen = {k: t for k, t in self._seen.items() if now - t < window}
+        last = self._seen.get(key)
+        if last is not None and now - last < window:
+            return True
+        self._seen[key] = now
+        return False
+
+    def record(self, user, query, search_type='student'):
+        from .models import SearchHistory
+
+        query = query.strip()
+        if not query:
+            return
+        key = (user.pk, query.casefold(), search_type)
+        entry = SearchHistory(user_id=user.pk, search_query=query, search_type=search_type,
+                              created_at=timezone.now())
+        with self._lock:
+            if self._is_repeat(key, time.monotonic()):
+                return
+            buffered = settings.SEARCH_HISTORY_BUFFER
+            if buffered:
+                self._pending.append(entry)
+                full = len(self._pending) >= settings.SEARCH_HISTORY_FLUSH_SIZE
+                self._start()
+        if not buffered:
+            entry.save()
+        elif full:
+            self._wake.set()
+
+    def flush(self):
+        """Write every queued entry; returns how many were written."""
+        from . import stats
+        from .models import SearchHistory
+
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        try:
+            with transaction.atomic():
+                SearchHistory.objects.bulk_create(batch)
+                stats.adjust({'searches': len(batch)})
+        except Exception:
+            with self._lock:
+                self._failures += 1
+                if self._failures >= settings.SEARCH_HISTORY_FLUSH_RETRIES:
+                    self._failures = 0
+                    logger.exception('Dropped %d search history entries after repeated failures', len(batch))
+                    return 0
+                logger.exception('Could not write %d search history entries; will retry', len(batch))
+                for entry in batch:
+                    # bulk_create may have set ids before the rollback
+                    entry.pk = None
+                    entry._state.adding = True
+                self._pending[:0] = batch
+            return 0
+        with self._lock:
+            self._failures = 0
+        return len(batch)
+
+    def pending_for(self, user):
+        with self._lock:
+            return [entry for entry in self._pending if entry.user_id == user.pk]
+
+    def recent(self, user, limit=5):
+        """The user's latest searches, including ones not yet written."""
+        from .models import SearchHistory
+
+        stored = list(SearchHistory.objects.filter(user=user)[:limit])
+        pending = self.pending_for(user)
+        if not pending:
+            return stored
+        merged = sorted(stored + pending, key=lambda entry: entry.created_at, reverse=True)
+        return merged[:limit]
+
+    def shutdown(self):
+        self._stopping = True
+        self._wake.set()
+        self.flush()
+
+
+buffer = SearchHistoryBuffer()
+atexit.register(buffer.shutdown)
@@ -0,0 +1,143 @@
+"""
+Image metadata measured at ingest.
+
+Beside every image field the model stores the image's width and height
+(after EXIF orientation), its size in bytes, a dominant colour and a
+low-quality placeholder: a 16px copy encoded as a data: URI of a few
+hundred bytes. Templates use them through the ``image_attrs`` filter to
+give each <img> its dimensions, so the page doesn't reflow, and to paint
+the colour and blurred placeholder while the image loads.
+
+The pre_save signal measures an image whenever its field changes, bulk
+upload workers measure the image they have already decoded, and
+``manage.py backfill_image_metadata`` measures existing media in a
+process pool. Columns left None have not been measured yet.
+"""
+import base64
+import logging
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from . import renditions
+
+logger = logging.getLogger(__name__)
+
+# (model, image field) -> prefix of its metadata columns
+FIELDS = {
+    ('Photo', 'image'): 'image',
+    ('Album', 'cover_photo'): 'cover',
+    ('Student', 'profile_photo'): 'photo',
+}
+
+KEYS = ('width', 'height', 'bytes', 'color', 'placeholder')
+
+PLACEHOLDER_SIZE = 16
+SAMPLE_SIZE = 64  # colour and placeholder are taken from a copy this big
+
+ORIENTATION = 0x0112
+
+
+def columns(prefix):
+    """{key: column name} for a metadata prefix."""
+    return {key: f'{prefix}_{key}' for key in KEYS}
+
+
+def prefix_for(model, field):
+    return FIELDS[model.__name__ if isinstance(model, type) else type(model).__name__, field]
+
+
+def dominant_color(image):
+    """The most common of a few quantized colours, as ``#rrggbb``."""
+    quantized = image.quantize(colors=5)
+    _count, index = max(quantized.getcolors())
+    red, green, blue = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def placeholder(image):
+    small = image.copy()
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = BytesIO()
+    small.save(buffer, renditions.FORMAT, quality=40)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/{renditions.FORMAT.lower()};base64,{data}'
+
+
+def _sampled(sample, width, height, size):
+    sample = sample.convert('RGB')
+    sample.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+    return {
+        'width': width,
+        'height': height,
+        'bytes': size,
+        'color': dominant_color(sample),
+        'placeholder': placeholder(sample),
+    }
+
+
+def measure_image(image, size):
+    """Metadata of an already decoded (and orientation-corrected) image."""
+    return _sampled(image.copy(), *image.size, size)
+
+
+def measure(source, size):
+    """Metadata of an encoded image (a path or file object) of ``size`` bytes.
+
+    JPEGs are decoded at a reduced scale: only the dimensions need the
+    full-size header.
+    """
+    with Image.open(source) as image:
+        width, height = image.size
+        if image.getexif().get(ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+        image.draft('RGB', (SAMPLE_SIZE, SAMPLE_SIZE))
+        return _sampled(ImageOps.exif_transpose(image), width, height, size)
+
+
+def measure_stored(name):
+    """Metadata of a stored media file, or None if it can't be read.
+
+    Runs in the backfill command's worker processes.
+    """
+    from .storage import media_storage
+
+    media = media_storage()
+    try:
+        with media.open(name, 'rb') as source:
+            return measure(source, media.size(name))
+    except FileNotFoundError:
+        logger.debug('%s is missing; not measured', name)
+        return None
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning('Could not measure %s: %s', name, exc)
+        return None
+
+
+def measure_fieldfile(fieldfile):
+    """Metadata for an image field's current file, or None if unreadable."""
+    if not fieldfile._committed:
+        # A fresh upload, written to storage later in the model's save()
+        upload = fieldfile.file
+        try:
+            return measure(upload, upload.size)
+        except (OSError, ValueError, Image.DecompressionBombError) as exc:
+            logger.warning('Could not measure upload %s: %s', fieldfile.name, exc)
+            return None
+        finally:
+            upload.seek(0)
+    return measure_stored(fieldfile.name)
+
+
+def values(prefix, meta):
+    """Column values for ``meta`` (None clears them)."""
+    return {column: (meta or {}).get(key) for key, column in columns(prefix).items()}
+
+
+def stored(fieldfile):
+    """The metadata stored for ``fieldfile``, or None if not measured."""
+    if not fieldfile:
+        return None
+    meta = {key: getattr(fieldfile.instance, column)
+            for key, column in columns(prefix_for(fieldfile.instance, fieldfile.field.name)).items()}
+    return meta if meta['width'] else None
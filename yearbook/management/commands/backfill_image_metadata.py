@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+from django.core.management.base import BaseCommand
+
+from yearbook import caching, imagemeta, storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure dimensions, size, dominant colour and placeholder for existing '
+        'photos, album covers and profile photos, in a pool of processes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-measure images already measured')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes (default: CPU count; 1 measures in this process)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Files measured between database writes')
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or os.cpu_count()
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                       initializer=django.setup)
+        run = (lambda func, items: pool.map(func, items, chunksize=8)) if pool else map
+        try:
+            total = 0
+            for model, field in storage.media_fields():
+                measured, failed = self.backfill(run, model, field, options)
+                total += measured
+                self.stdout.write(f'{model.__name__}.{field}: measured {measured}, unreadable {failed}')
+        finally:
+            if pool:
+                pool.shutdown()
+        if total:
+            # Cached pages were rendered without the new attributes
+            caching.invalidate_all()
+        self.stdout.write(self.style.SUCCESS('Image metadata up to date.'))
+
+    def backfill(self, run, model, field, options):
+        prefix = imagemeta.prefix_for(model, field)
+        columns = list(imagemeta.columns(prefix).values())
+        queryset = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+        if not options['force']:
+            queryset = queryset.filter(**{f'{prefix}_width__isnull': True})
+
+        # Shared blobs are measured once, however many rows point at them
+        by_name = {}
+        for pk, name in queryset.values_list('pk', field).iterator(chunk_size=2000):
+            by_name.setdefault(name, []).append(pk)
+        names = list(by_name)
+
+        measured = failed = 0
+        size = options['batch_size']
+        for start in range(0, len(names), size):
+            batch = names[start:start + size]
+            rows = []
+            for name, meta in zip(batch, run(imagemeta.measure_stored, batch)):
+                if meta is None:
+                    failed += 1
+                    continue
+                values = imagemeta.values(prefix, meta)
+                rows.extend(model(pk=pk, **values) for pk in by_name[name])
+                measured += 1
+            model.objects.bulk_update(rows, columns, batch_size=500)
+        return measured, failed
@@ -0,0 +1,184 @@
+import asyncio
+import http.client
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+
+from .benchmark_urls import Command as BenchmarkUrls, percentile
+
+# The endpoints with async views
+ROUTES = ['search_students', 'search_all', 'album_list', 'album_detail']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the WSGI and ASGI code paths of the async routes, in process. '
+        'Requests go through the test client to the Django handlers, middleware and '
+        'views; no server or socket is involved, so this measures neither gunicorn '
+        'nor uvicorn/daphne. WSGI runs --concurrency clients against --wsgi-workers '
+        'slots (like gunicorn --threads); ASGI runs the same clients as tasks on one '
+        'event loop, each request in its own thread-sensitive context. Both share one '
+        'GIL. With --wsgi-url and/or --asgi-url the same requests go over HTTP to '
+        'servers you started (e.g. gunicorn and uvicorn on the same database) instead, '
+        'from --concurrency client threads with a keep-alive connection each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per route and mode')
+        parser.add_argument('--concurrency', type=int, default=100, help='Clients in flight')
+        parser.add_argument('--wsgi-workers', type=int, default=8,
+                            help='Requests the WSGI deployment serves at once')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per route and mode')
+        parser.add_argument('--user', help='Username to log in as (default: first superuser)')
+        parser.add_argument('--route', action='append', dest='routes',
+                            help=f'Route name to benchmark (repeatable; default {", ".join(ROUTES)})')
+        parser.add_argument('--query', default='sa', help='Search text for search routes')
+        parser.add_argument('--wsgi-url', help='Base URL of a running WSGI server to benchmark over HTTP')
+        parser.add_argument('--asgi-url', help='Base URL of a running ASGI server to benchmark over HTTP')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds an HTTP request may take')
+        parser.add_argument('--output', default='benchmark-asgi.json')
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.run_benchmark(options)
+
+    def run_benchmark(self, options):
+        urls_command = BenchmarkUrls(stdout=self.stdout, stderr=self.stderr)
+        user = urls_command.get_user(options['user'])
+        targets = urls_command.targets(options['routes'] or ROUTES, options['query'])
+        login = Client()
+        login.force_login(user)
+        cookies = login.cookies
+
+        servers = {mode: options[f'{mode}_url'] for mode in ('wsgi', 'asgi') if options[f'{mode}_url']}
+        if servers:
+            modes = [(mode, partial(self.run_http, base)) for mode, base in servers.items()]
+        else:
+            modes = [('wsgi', self.run_wsgi), ('asgi', self.run_asgi)]
+
+        results = {}
+        for name, url in targets:
+            results[name] = {'url': url}
+            for mode, run in modes:
+                samples, wall = run(url, cookies, options)
+                latencies = [seconds * 1000 for seconds, _status in samples]
+                results[name][mode] = {
+                    'status': sorted({status for _seconds, status in samples}),
+                    'p50_ms': round(percentile(latencies, 50), 3),
+                    'p95_ms': round(percentile(latencies, 95), 3),
+                    'mean_ms': round(statistics.fmean(latencies), 3),
+                    'throughput_rps': round(len(samples) / wall, 1),
+                }
+            line = f'{name:16}'
+            for mode, _run in modes:
+                result = results[name][mode]
+                line += f"  {mode} {result['throughput_rps']:8.1f} req/s p95 {result['p95_ms']:8.2f}ms"
+            if len(modes) == 2:
+                line += f"  ({results[name]['asgi']['throughput_rps'] / results[name]['wsgi']['throughput_rps']:.2f}x)"
+            self.stdout.write(line)
+
+        report = {
+            'commit': urls_command.commit(),
+            # The in-process harness is not a server benchmark; see the command's help
+            'harness': 'http' if servers else 'in-process test client',
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'routes': results,
+        }
+        if servers:
+            report['servers'] = servers
+        else:
+            report['wsgi_workers'] = options['wsgi_workers']
+        with open(options['output'], 'w') as out:
+            json.dump(report, out, indent=2)
+        if servers:
+            self.stdout.write(f"Measured over HTTP against {', '.join(servers.values())}.")
+        else:
+            self.stdout.write('In-process handler and view code paths only; no server was measured.')
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run_wsgi(self, url, cookies, options):
+        """(samples, wall seconds); latency includes waiting for a worker."""
+        workers = threading.BoundedSemaphore(options['wsgi_workers'])
+        local = threading.local()
+
+        def request(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.cookies = cookies
+            start = time.perf_counter()
+            with workers:
+                response = local.client.get(url)
+            return time.perf_counter() - start, response.status_code
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(request, range(options['warmup'])))
+            start = time.perf_counter()
+            samples = list(pool.map(request, range(options['requests'])))
+            return samples, time.perf_counter() - start
+
+    def run_asgi(self, url, cookies, options):
+        async def request(client, slots):
+            async with slots:
+                async with ThreadSensitiveContext():
+                    start = time.perf_counter()
+                    response = await client.get(url)
+                    return time.perf_counter() - start, response.status_code
+
+        async def run():
+            client = AsyncClient()
+            client.cookies = cookies
+            slots = asyncio.Semaphore(options['concurrency'])
+            for _ in range(options['warmup']):
+                await request(client, slots)
+            start = time.perf_counter()
+            samples = await asyncio.gather(*(request(client, slots) for _ in range(options['requests'])))
+            return samples, time.perf_counter() - start
+
+        return asyncio.run(run())
+
+    def run_http(self, base, url, cookies, options):
+        """(samples, wall seconds) against the server at ``base``; a request
+        that fails to connect or read counts with status 0."""
+        parts = urlsplit(base)
+        connect = partial(http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection,
+                          parts.netloc, timeout=options['timeout'])
+        path = parts.path.rstrip('/') + url
+        headers = {'Cookie': '; '.join(f'{key}={morsel.value}' for key, morsel in cookies.items())}
+        local = threading.local()
+        connections = []
+
+        def request(_):
+            if not hasattr(local, 'connection'):
+                local.connection = connect()
+                connections.append(local.connection)
+            start = time.perf_counter()
+            try:
+                local.connection.request('GET', path, headers=headers)
+                response = local.connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                # Reconnects on the next request
+                local.connection.close()
+                return time.perf_counter() - start, 0
+            return time.perf_counter() - start, response.status
+
+        try:
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                list(pool.map(request, range(options['warmup'])))
+                start = time.perf_counter()
+                samples = list(pool.map(request, range(options['requests'])))
+                return samples, time.perf_counter() - start
+        finally:
+            for connection in connections:
+                connection.close()
@@ -0,0 +1,74 @@
+import random
+import statistics
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+
+from yearbook import names
+
+from .benchmark_urls import percentile
+from .generate_dataset import FIRST_NAMES, LAST_NAMES
+
+QUERIES = ['santso', 'mendosa', 'cano', 'maria santso', 'dela crus', 'maria dela crus',
+           'mario dela cruz santos', 'zzqxv wwqq']
+CONSONANTS = 'bcdfghjklmnprstvz'
+VOWELS = 'aeiou'
+
+
+class Command(BaseCommand):
+    help = (
+        'Time typo-tolerant name matching (names.NameIndex) against a synthetic '
+        'in-memory index and fail if any query is slower than --max-ms at p95. '
+        'Names mix generate_dataset.py\'s with invented surnames whose frequency '
+        'falls off as in a real roster, so common words have thousands of students.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=100_000)
+        parser.add_argument('--surnames', type=int, default=8000,
+                            help='Invented surnames added to the generated names')
+        parser.add_argument('--repeat', type=int, default=200, help='Timed matches per query')
+        parser.add_argument('--query', action='append', dest='queries',
+                            help=f'Query to time (repeatable; default {", ".join(QUERIES)})')
+        parser.add_argument('--max-ms', type=float, default=1.0,
+                            help='Largest p95 any query may take; 0 to only report')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        start = time.perf_counter()
+        index = self.build(rng, options['students'], options['surnames'])
+        self.stdout.write(f"Indexed {options['students']} students, {len(index._word_grams)} words "
+                          f'in {time.perf_counter() - start:.1f} s')
+
+        slow = []
+        for query in options['queries'] or QUERIES:
+            # _match() is the in-memory part of match(), without the version check
+            found = index._match(query, 20)
+            latencies = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                index._match(query, 20)
+                latencies.append((time.perf_counter() - start) * 1000)
+            p95 = percentile(latencies, 95)
+            self.stdout.write(f'{query:28} p50 {percentile(latencies, 50):6.3f}ms  p95 {p95:6.3f}ms  '
+                              f'mean {statistics.fmean(latencies):6.3f}ms  {len(found):3d} found')
+            if options['max_ms'] and p95 > options['max_ms']:
+                slow.append(query)
+        if slow:
+            raise CommandError(f"Slower than {options['max_ms']} ms at p95: {', '.join(slow)}")
+
+    def build(self, rng, students, surnames):
+        invented = {
+            ''.join(rng.choice(VOWELS if i % 2 else CONSONANTS) for i in range(rng.randint(4, 8)))
+            for _ in range(surnames)
+        }
+        words = [names.fold(name) for name in FIRST_NAMES + LAST_NAMES] + sorted(invented)
+        # generate_dataset.py's names are the most common; the i-th word is
+        # about as frequent as 1 / i ** 0.8
+        weights = list(accumulate(1 / (i + 1) ** 0.8 for i in range(len(words))))
+        index = names.NameIndex()
+        for student_id in range(1, students + 1):
+            index._add_student(student_id, ' '.join(rng.choices(words, cum_weights=weights, k=rng.choice((3, 3, 4)))))
+        return index
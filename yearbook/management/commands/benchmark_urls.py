@@ -0,0 +1,174 @@
+import json
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from yearbook import urls
+from yearbook.models import Album, Photo, PhotoUploadJob, Student
+from yearbook.querybudget import QueryRecorder
+
+# Routes that change state or end the session
+SKIP = {'logout'}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every named route in yearbook/urls.py through the Django test '
+        'client and report latency percentiles, throughput and query counts as JSON. '
+        'Requests run in threads of one process, so concurrency measures contention '
+        'on the database and the GIL rather than multi-worker throughput.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per route')
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per route')
+        parser.add_argument('--user', help='Username to log in as (default: first superuser)')
+        parser.add_argument('--route', action='append', dest='routes',
+                            help='Only benchmark this route name (repeatable)')
+        parser.add_argument('--query', default='santos', help='Search text for search routes')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', help='Earlier JSON result to print deltas against')
+
+    def handle(self, *args, **options):
+        # The test client sends Host: testserver, as under the test runner
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.run_benchmark(options)
+
+    def run_benchmark(self, options):
+        user = self.get_user(options['user'])
+        targets = self.targets(options['routes'], options['query'])
+        local = threading.local()
+
+        def request(url):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(user)
+            with QueryRecorder() as recorder:
+                start = time.perf_counter()
+                response = local.client.get(url)
+                elapsed = time.perf_counter() - start
+            return elapsed, recorder.count, response.status_code
+
+        results = {}
+        concurrency = options['concurrency']
+        # Serial runs stay on this thread (and its database connection)
+        pool = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+        run = pool.map if pool else map
+        try:
+            for name, url in targets:
+                for _ in range(options['warmup']):
+                    request(url)
+                start = time.perf_counter()
+                samples = list(run(request, [url] * options['requests']))
+                wall = time.perf_counter() - start
+                latencies = [s[0] * 1000 for s in samples]
+                results[name] = {
+                    'url': url,
+                    'status': sorted({s[2] for s in samples}),
+                    'p50_ms': round(percentile(latencies, 50), 3),
+                    'p95_ms': round(percentile(latencies, 95), 3),
+                    'p99_ms': round(percentile(latencies, 99), 3),
+                    'mean_ms': round(statistics.fmean(latencies), 3),
+                    'throughput_rps': round(len(samples) / wall, 1),
+                    'queries': max(s[1] for s in samples),
+                }
+                self.stdout.write(
+                    f"{name:28} p50 {results[name]['p50_ms']:8.2f}ms  p95 {results[name]['p95_ms']:8.2f}ms  "
+                    f"p99 {results[name]['p99_ms']:8.2f}ms  {results[name]['throughput_rps']:8.1f} req/s  "
+                    f"{results[name]['queries']:3d} queries"
+                )
+        finally:
+            if pool:
+                pool.shutdown()
+
+        report = {
+            'commit': self.commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'database': connection.vendor,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'dataset': {
+                'students': Student.objects.count(),
+                'albums': Album.objects.count(),
+                'photos': Photo.objects.count(),
+            },
+            'routes': results,
+        }
+        with open(options['output'], 'w') as out:
+            json.dump(report, out, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def get_user(self, username):
+        users = User.objects.filter(username=username) if username else \
+            User.objects.filter(is_superuser=True).order_by('id')
+        user = users.first()
+        if user is None:
+            raise CommandError('No user to log in as; pass --user or create a superuser.')
+        return user
+
+    def targets(self, only, query):
+        album = Album.objects.filter(is_active=True).order_by('-photo_count').first()
+        photo = Photo.objects.filter(album=album).first() if album else None
+        student = Student.objects.order_by('id').first()
+        job = PhotoUploadJob.objects.order_by('-id').first()
+        values = {
+            'album_id': album and album.id,
+            'photo_id': photo and photo.id,
+            'student_id': student and student.id,
+            'job_id': job and job.id,
+            'path': photo and photo.image.name,
+        }
+        targets = []
+        for pattern in urls.urlpatterns:
+            if pattern.name in SKIP or (only and pattern.name not in only):
+                continue
+            kwargs = {name: values[name] for name in pattern.pattern.converters}
+            if None in kwargs.values():
+                self.stdout.write(self.style.WARNING(f'Skipping {pattern.name}: no sample object'))
+                continue
+            url = reverse(pattern.name, kwargs=kwargs)
+            if pattern.name in ('search_all', 'search_students', 'dashboard'):
+                url += f'?q={query}'
+            elif pattern.name in ('student_dashboard', 'admin_student_list', 'album_list'):
+                url += f'?search={query}'
+            targets.append((pattern.name, url))
+        return targets
+
+    def commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, path, results):
+        with open(path) as f:
+            previous = json.load(f)['routes']
+        self.stdout.write(f'\nChange against {path} (p95, queries):')
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            before = previous[name]
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            self.stdout.write(
+                f"{name:28} {before['p95_ms']:8.2f} -> {result['p95_ms']:8.2f}ms ({change:+.0f}%)  "
+                f"{before['queries']} -> {result['queries']} queries"
+            )
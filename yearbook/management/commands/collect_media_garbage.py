@@ -0,0 +1,60 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from yearbook import renditions, storage
+from yearbook.models import MediaBlob
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete image blobs (and their renditions) that no Photo, Album or '
+        'Student references anymore'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recount', action='store_true',
+                            help='Rebuild reference counts from the tables first')
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Keep unreferenced blobs newer than this; an upload may '
+                                 'be written before the row pointing at it is saved')
+        parser.add_argument('--dry-run', action='store_true', help='Report without deleting')
+
+    def handle(self, *args, **options):
+        media = storage.media_storage()
+        if options['recount']:
+            counted = storage.recount_references()
+            self.stdout.write(f'Recounted references for {counted} blob(s).')
+
+        root = media.path(storage.BLOB_DIR)
+        if not os.path.isdir(root):
+            self.stdout.write('No blobs stored yet.')
+            return
+        referenced = set(MediaBlob.objects.filter(references__gt=0).values_list('name', flat=True))
+        cutoff = time.time() - options['grace_hours'] * 3600
+
+        removed, freed = [], 0
+        for directory, _dirs, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, media.location).replace(os.sep, '/')
+                if not storage.is_blob(name) or name in referenced:
+                    continue
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                derived = [renditions.rendition_name(name, r) for r in renditions.RENDITIONS]
+                for file_name in [name] + derived:
+                    if media.exists(file_name):
+                        freed += media.size(file_name)
+                        if not options['dry_run']:
+                            media.delete(file_name)
+                removed.append(name)
+
+        if not options['dry_run']:
+            for start in range(0, len(removed), 500):
+                MediaBlob.objects.filter(name__in=removed[start:start + 500], references__lte=0).delete()
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(removed)} unreferenced blob(s), {freed / 1024 / 1024:.1f} MB.'
+        ))
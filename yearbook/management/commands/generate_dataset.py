@@ -0,0 +1,204 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from yearbook import caching, imagemeta, names, renditions, stats, storage, typeahead
+from yearbook.models import Album, Photo, SearchHistory, Student
+
+FIRST_NAMES = [
+    'Maria', 'Jose', 'Juan', 'Ana', 'Mark', 'John', 'Angel', 'Jenny', 'Joward', 'Kristine',
+    'Paolo', 'Camille', 'Miguel', 'Andrea', 'Carlo', 'Patricia', 'Rafael', 'Nicole', 'Gabriel',
+    'Bea', 'Francis', 'Joy', 'Christian', 'Mae', 'Renz', 'Althea', 'Ivan', 'Sofia', 'Kenneth',
+    'Erika', 'Álvaro', 'Niño', 'Rhea', 'Lorenzo', 'Trisha', 'Vincent', 'Czarina', 'Dominic',
+]
+LAST_NAMES = [
+    'Santos', 'Reyes', 'Cruz', 'Bautista', 'Ocampo', 'Garcia', 'Mendoza', 'Torres', 'Tomas',
+    'Andrada', 'Castillo', 'Flores', 'Villanueva', 'Ramos', 'Castro', 'Rivera', 'Aquino',
+    'Navarro', 'Salazar', 'Mercado', 'Dela Cruz', 'Dela Cerna', 'Caño', 'Remeticado',
+    'De Leon', 'Pascual', 'Gonzales', 'Lim', 'Tan', 'Luo', 'Fernandez', 'Domingo',
+]
+SEARCH_TERMS = FIRST_NAMES + LAST_NAMES + ['BSIT', 'STEM', 'ABM', 'BSHM', 'BSED', '2024', 'honor']
+BLOCKS = ['A', 'B', 'C', 'D']
+SECTIONS = ['1', '2', '3', '4']
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with synthetic students, albums, photos and search '
+        'history using bulk_create, for load testing and benchmarks'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--albums', type=int, default=25,
+                            help='At most one album per department and year can exist')
+        parser.add_argument('--photos', type=int, default=5000)
+        parser.add_argument('--searches', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=100,
+                            help='Accounts that own the generated search history')
+        parser.add_argument('--images', type=int, default=20,
+                            help='Distinct small images shared by the generated photos')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.tag = f'{self.rng.randrange(16 ** 6):06x}'
+
+        uploader = self.get_uploader()
+        users = self.create_users(options['users'])
+        students = self.create_students(options['students'])
+        albums = self.create_albums(options['albums'])
+        if options['photos'] and not albums:
+            albums = list(Album.objects.all())
+            if not albums:
+                raise CommandError('No albums available to hold the generated photos.')
+        images = self.create_images(options['images']) if options['photos'] else []
+        self.create_photos(options['photos'], albums, students, images, uploader)
+        self.create_searches(options['searches'], users or [uploader])
+
+        # bulk_create bypasses the signals that keep these in sync
+        Album.recount_photos()
+        storage.recount_references()
+        stats.reconcile()
+        typeahead.bump_version()
+        names.invalidate()
+        caching.invalidate_all()
+        self.stdout.write(self.style.SUCCESS('Synthetic dataset generated.'))
+
+    def random_past(self, days=365):
+        return self.now - timedelta(seconds=self.rng.randrange(days * 86400))
+
+    def bulk(self, model, objects):
+        created = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                with transaction.atomic():
+                    created += len(model.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            with transaction.atomic():
+                created += len(model.objects.bulk_create(batch))
+        self.stdout.write(f'{model.__name__}: {created} created')
+        return created
+
+    def get_uploader(self):
+        user, created = User.objects.get_or_create(
+            username='synthetic-admin', defaults={'is_staff': True, 'email': 'synthetic@example.com'},
+        )
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        return user
+
+    def create_users(self, count):
+        password = make_password(None)
+        self.bulk(User, (
+            User(username=f'synthetic-{self.tag}-{i}', password=password) for i in range(count)
+        ))
+        return list(User.objects.filter(username__startswith=f'synthetic-{self.tag}-'))
+
+    def create_students(self, count):
+        rng = self.rng
+        departments = [code for code, _label in Student.DEPARTMENTS]
+        years = [code for code, _label in Student.YEARS]
+
+        def students():
+            for i in range(count):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                yield Student(
+                    first_name=first,
+                    middle_name=rng.choice(LAST_NAMES) if rng.random() < 0.7 else '',
+                    last_name=last,
+                    school_id=f'{self.tag}-{i:07d}',
+                    email=f"{first.lower()}.{last.lower().replace(' ', '')}.{i}@example.com",
+                    department=rng.choice(departments),
+                    year=rng.choice(years),
+                    block=rng.choice(BLOCKS),
+                    section=rng.choice(SECTIONS),
+                    achievements='Honor Roll Student' if rng.random() < 0.1 else '',
+                    created_at=self.random_past(),
+                )
+
+        self.bulk(Student, students())
+        created = Student.objects.filter(school_id__startswith=f'{self.tag}-')
+        names.index_students(created.only('id', 'first_name', 'middle_name', 'last_name'))
+        return list(created.values_list('id', flat=True))
+
+    def create_albums(self, count):
+        taken = set(Album.objects.values_list('department', 'year'))
+        free = [(d, y) for d, _ in Student.DEPARTMENTS for y, _ in Student.YEARS if (d, y) not in taken]
+        if count > len(free):
+            self.stdout.write(self.style.WARNING(
+                f'Only {len(free)} album(s) can be added: albums are unique per department and year.'
+            ))
+        pairs = free[:count]
+        self.bulk(Album, (
+            Album(title=f'{department} Class of {year}', description=f'Synthetic album {self.tag}',
+                  department=department, year=year, created_at=self.random_past())
+            for department, year in pairs
+        ))
+        return list(Album.objects.filter(description=f'Synthetic album {self.tag}')
+                    .values_list('id', flat=True))
+
+    def create_images(self, count):
+        """Store ``count`` random images; returns (name, metadata) pairs."""
+        images = []
+        field = Photo._meta.get_field('image')
+        for i in range(count):
+            image = Image.new('RGB', (640, 480), tuple(self.rng.randrange(256) for _ in range(3)))
+            draw = ImageDraw.Draw(image)
+            for _ in range(6):
+                box = sorted(self.rng.sample(range(640), 2)) + sorted(self.rng.sample(range(480), 2))
+                draw.rectangle((box[0], box[2], box[1], box[3]),
+                               fill=tuple(self.rng.randrange(256) for _ in range(3)))
+            buffer = BytesIO()
+            image.save(buffer, 'JPEG', quality=75)
+            name = field.storage.save(field.generate_filename(None, f'synthetic_{self.tag}_{i}.jpg'),
+                                      ContentFile(buffer.getvalue()))
+            renditions.generate_for_instance(Photo(image=name))
+            images.append((name, imagemeta.measure_image(image, buffer.tell())))
+        return images
+
+    def create_photos(self, count, albums, students, images, uploader):
+        rng = self.rng
+
+        def photos():
+            for _ in range(count):
+                name, meta = rng.choice(images)
+                yield Photo(
+                    album_id=rng.choice(albums),
+                    student_id=rng.choice(students) if students and rng.random() < 0.8 else None,
+                    image=name,
+                    caption='Graduation portrait' if rng.random() < 0.3 else '',
+                    is_featured=rng.random() < 0.05,
+                    uploaded_by=uploader,
+                    created_at=self.random_past(),
+                    **imagemeta.values('image', meta),
+                )
+
+        self.bulk(Photo, photos())
+
+    def create_searches(self, count, users):
+        rng = self.rng
+        self.bulk(SearchHistory, (
+            SearchHistory(
+                user=rng.choice(users),
+                search_query=rng.choice(SEARCH_TERMS),
+                search_type='student',
+                created_at=self.random_past(),
+            )
+            for _ in range(count)
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from yearbook import renditions
+from yearbook.models import Album, Photo, Student
+
+
+class Command(BaseCommand):
+    help = 'Generate missing thumbnail, lightbox and avatar renditions for existing media'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate renditions that already exist')
+
+    def handle(self, *args, **options):
+        querysets = (
+            Photo.objects.exclude(image=''),
+            Album.objects.exclude(cover_photo__isnull=True).exclude(cover_photo=''),
+            Student.objects.exclude(profile_photo__isnull=True).exclude(profile_photo=''),
+        )
+        for queryset in querysets:
+            count = 0
+            for instance in queryset.iterator(chunk_size=500):
+                renditions.generate_for_instance(instance, force=options['force'])
+                count += 1
+            self.stdout.write(f'{queryset.model.__name__}: processed {count}')
+        self.stdout.write(self.style.SUCCESS('Renditions up to date.'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from yearbook import roster
+
+
+class Command(BaseCommand):
+    help = 'Create or update students from a CSV roster, matching existing students by school_id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per transaction (default: ROSTER_IMPORT_BATCH_SIZE)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate and count rows without saving anything')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as f:
+                result = roster.import_roster(f, options['batch_size'], options['dry_run'])
+        except OSError as exc:
+            raise CommandError(f"Could not open {options['path']}: {exc}")
+
+        for line, message in result.errors:
+            self.stderr.write(f'Line {line}: {message}')
+        summary = (f'{result.created} created, {result.updated} updated, '
+                   f'{result.unchanged} unchanged, {len(result.errors)} error(s)')
+        if options['dry_run']:
+            summary = f'Dry run: {summary}'
+        style = self.style.WARNING if result.errors else self.style.SUCCESS
+        self.stdout.write(style(summary))
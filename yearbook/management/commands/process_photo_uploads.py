@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from yearbook import uploads
+from yearbook.models import PhotoUploadJob
+
+
+class Command(BaseCommand):
+    help = 'Process queued bulk photo uploads (for PHOTO_UPLOAD_RUNNER = "command")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Process the jobs queued now and exit instead of polling')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds between polls for new jobs')
+
+    def handle(self, *args, **options):
+        while True:
+            reclaimed = uploads.reclaim_stale()
+            if reclaimed:
+                self.stdout.write(f'Requeued {reclaimed} stalled job(s)')
+            while (job_id := uploads.claim_next()) is not None:
+                uploads.process(job_id)
+                job = PhotoUploadJob.objects.get(pk=job_id)
+                self.stdout.write(f'Job {job.id}: {job.status}, {job.processed - job.failed}/{job.total} photos added')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from yearbook import searchlog
+from yearbook.models import SearchHistory
+
+
+class Command(BaseCommand):
+    help = (
+        'Roll complete days of search history up into daily counts, then delete '
+        'raw searches older than the retention window in small batches; run daily'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help=f'Days of raw searches to keep (default {settings.SEARCH_HISTORY_RETENTION_DAYS})')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to wait between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Roll up, but only report what would be deleted')
+
+    def handle(self, *args, **options):
+        days = searchlog.rollup()
+        self.stdout.write(f'Rolled up {days} day(s) through {searchlog.rolled_through() or "-"}.')
+        if options['dry_run']:
+            cutoff = searchlog.prune_cutoff(options['days'])
+            count = SearchHistory.objects.filter(created_at__lt=cutoff).count() if cutoff else 0
+            self.stdout.write(self.style.SUCCESS(f'Would delete {count} search(es).'))
+            return
+        deleted = searchlog.prune(options['days'], batch_size=options['batch_size'], pause=options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} search(es).'))
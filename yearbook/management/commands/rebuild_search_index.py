@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from yearbook import names, search, typeahead
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search indexes for students and albums, and the name matching tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        indexed = names.rebuild(options['database'])
+        typeahead.bump_version()
+        names.invalidate()
+        self.stdout.write(f'Name matching rows written for {indexed} students.')
+        if search.rebuild(connections[options['database']]):
+            self.stdout.write(self.style.SUCCESS('Search indexes rebuilt.'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                'Full-text search is not available on this database; '
+                'searches use icontains filters instead.'
+            ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from yearbook import stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount the admin dashboard statistics from the tables and correct '
+        'any counter that has drifted; run periodically (e.g. nightly from cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        drift = stats.reconcile(dry_run=options['dry_run'])
+        for key, (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f'  {key}: {stored if stored is not None else "missing"} -> {actual}')
+        verb = 'Would correct' if options['dry_run'] else 'Corrected'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(drift)} statistic(s).'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from yearbook.models import Album
+
+
+class Command(BaseCommand):
+    help = "Recompute each album's stored photo_count from the Photo table"
+
+    def handle(self, *args, **options):
+        updated = Album.recount_photos()
+        self.stdout.write(self.style.SUCCESS(f'Recounted photos for {updated} album(s).'))
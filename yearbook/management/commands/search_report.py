@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from yearbook import searchlog
+
+
+class Command(BaseCommand):
+    help = 'Top search queries and searches per day, from the daily rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Complete days to report on')
+        parser.add_argument('--limit', type=int, default=20, help='Top queries to list')
+        parser.add_argument('--type', dest='search_type', help='Only this search type')
+        parser.add_argument('--query', help='Daily trend for this query instead of all searches')
+
+    def handle(self, *args, **options):
+        days, search_type = options['days'], options['search_type']
+        self.stdout.write(f'Top queries, last {days} days:')
+        for query, total in searchlog.top_queries(days, options['limit'], search_type):
+            self.stdout.write(f'  {total:8}  {query}')
+        label = repr(options['query']) if options['query'] else 'all searches'
+        self.stdout.write(f'Per day, {label}:')
+        for day, total in searchlog.trend(days, options['query'], search_type):
+            self.stdout.write(f'  {day}  {total:8}')
@@ -0,0 +1,51 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into each SQLite read replica in '
+        'DATABASE_REPLICAS using the SQLite backup API. Other engines replicate '
+        'on their own and are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Keep syncing every this many seconds instead of once')
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if 'sqlite3' not in primary['ENGINE']:
+            raise CommandError('The primary database is not SQLite; use its own replication.')
+        targets = []
+        for alias in settings.DATABASE_REPLICAS:
+            config = settings.DATABASES[alias]
+            if 'sqlite3' in config['ENGINE']:
+                targets.append((alias, config['NAME']))
+            else:
+                self.stdout.write(self.style.WARNING(f'Skipping {alias}: not SQLite'))
+        if not targets:
+            raise CommandError('No SQLite replicas configured in DATABASE_REPLICAS.')
+
+        while True:
+            for alias, name in targets:
+                start = time.perf_counter()
+                self.sync(primary['NAME'], name)
+                self.stdout.write(f'{alias}: synced in {(time.perf_counter() - start) * 1000:.0f} ms')
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, source, target):
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(target)
+        try:
+            # One step, so readers of the replica never see a half-copied file
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
@@ -0,0 +1,172 @@
+"""
+Access-controlled media serving.
+
+Every file under MEDIA_URL goes through the media_file view, which only
+serves a file when the user may see a row that references it: a photo or
+cover of an active album, or a student's profile photo (staff see
+everything). Renditions inherit the visibility of their original. The
+check is an exact lookup on the indexed image fields, after mapping a
+rendition name back to its original.
+
+Responses carry a strong ETag (the content hash for blobs, size and
+modification time otherwise), Last-Modified and Accept-Ranges; a matching
+If-None-Match or If-Modified-Since gets a 304, and a single byte range
+gets a 206. With MEDIA_SENDFILE set, the body is left to the front-end
+server through X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd),
+so workers only check access and write headers.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import renditions, storage
+from .models import Album, MediaBlob, Photo, Student
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+RENDITION_NAME = re.compile(rf'^(.*)\.({"|".join(renditions.RENDITIONS)})\.{renditions.EXTENSION}$')
+
+
+def _names(querysets, field_lookup):
+    """One UNION query over ``(queryset, field)`` pairs, each filtered by
+    ``field_lookup(field)``; every image field is indexed."""
+    parts = [queryset.filter(**field_lookup(field)).order_by().values_list(field, flat=True)
+             for queryset, field in querysets]
+    return parts[0].union(*parts[1:])
+
+
+def _originals(name):
+    """Stored names that ``name`` is a rendition of.
+
+    rendition_name() drops the original's extension, so candidates come
+    from an index range over ``<root>.``: MediaBlob's primary key for blobs,
+    the image fields for files stored before blob storage.
+    """
+    match = RENDITION_NAME.match(name)
+    if not match:
+        return []
+    root, rendition = match.groups()
+    if storage.is_blob(root):
+        sources = [(MediaBlob.objects.all(), 'name')]
+    else:
+        sources = [(Photo.objects.all(), 'image'), (Album.objects.all(), 'cover_photo'),
+                   (Student.objects.all(), 'profile_photo')]
+    stored = _names(sources, lambda field: {f'{field}__gte': root + '.', f'{field}__lt': root + '/'})
+    return [original for original in stored if renditions.rendition_name(original, rendition) == name]
+
+
+def can_view(user, name):
+    """Staff see every file; anyone else only files stored on a visible row,
+    and the renditions of those files."""
+    if user.is_staff:
+        return True
+    names = [name] + _originals(name)
+    visible = [(Photo.objects.filter(album__is_active=True), 'image'),
+               (Album.objects.filter(is_active=True), 'cover_photo'),
+               (Student.objects.all(), 'profile_photo')]
+    return _names(visible, lambda field: {f'{field}__in': names}).exists()
+
+
+def etag_for(name, stat):
+    digest = posixpath.basename(name).split('.', 1)[0]
+    if storage.is_blob(name):
+        return f'"{digest}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single ``bytes=`` range, None to send the
+    whole file, or False when the range cannot be satisfied."""
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Malformed or multiple ranges: serving the whole file is allowed
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve(request, name):
+    media = storage.media_storage()
+    try:
+        path = media.path(name)
+    except SuspiciousFileOperation:
+        raise Http404('File not found')
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('File not found')
+    if not os.path.isfile(path):
+        raise Http404('File not found')
+
+    etag = etag_for(name, stat)
+    last_modified = int(stat.st_mtime)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    size = stat.st_size
+    byte_range = None
+    if 'HTTP_RANGE' in request.META:
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range is None or if_range == etag:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    sendfile = settings.MEDIA_SENDFILE
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if sendfile:
+        # The front-end server reads the file and handles Range itself
+        response = HttpResponse(content_type=content_type)
+        if sendfile == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_REDIRECT_PREFIX + name)
+        else:
+            response['X-Sendfile'] = path
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end - start + 1),
+                                         status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    # Blob names change whenever their content does
+    max_age = 31536000 if storage.is_blob(name) else 3600
+    response['Cache-Control'] = f'private, max-age={max_age}'
+    return response
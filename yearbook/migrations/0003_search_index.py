@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from yearbook import search
+    search.install(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from yearbook import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yearbook', '0002_album_photo'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
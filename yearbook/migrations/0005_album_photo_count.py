@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:50
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_photos(apps, schema_editor):
+    Album = apps.get_model('yearbook', 'Album')
+    Photo = apps.get_model('yearbook', 'Photo')
+    photos = (Photo.objects.filter(album=models.OuterRef('pk')).order_by()
+              .values('album').annotate(total=models.Count('id')).values('total'))
+    Album.objects.update(photo_count=Coalesce(models.Subquery(photos), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yearbook', '0004_photo_upload_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='photo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_photos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yearbook', '0005_album_photo_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['created_at'], name='album_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['album', 'is_featured', 'created_at'], name='photo_album_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photouploadjob',
+            index=models.Index(fields=['album', 'created_at'], name='uploadjob_album_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchhistory',
+            index=models.Index(fields=['user', 'created_at'], name='searchhistory_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['department', 'year'], name='student_class_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['department', 'year', 'block', 'section'], name='student_section_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['created_at'], name='student_created_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:06
+
+import yearbook.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yearbook', '0006_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('references', models.IntegerField(default=0)),
+            ],
+        ),
+        # storage is not a database attribute, but SQLite would still remake
+        # each table for these AlterFields; only the state needs changing
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='album',
+                    name='cover_photo',
+                    field=models.ImageField(blank=True, null=True, storage=yearbook.storage.media_storage, upload_to='albums/covers/'),
+                ),
+                migrations.AlterField(
+                    model_name='photo',
+                    name='image',
+                    field=models.ImageField(storage=yearbook.storage.media_storage, upload_to='albums/photos/'),
+                ),
+                migrations.AlterField(
+                    model_name='student',
+                    name='profile_photo',
+                    field=models.ImageField(blank=True, null=True, storage=yearbook.storage.media_storage, upload_to='profile_photos/'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_everything(apps, schema_editor):
+    Statistic = apps.get_model('yearbook', 'Statistic')
+    Student = apps.get_model('yearbook', 'Student')
+    counts = {
+        'students': Student.objects.count(),
+        'users': apps.get_model(settings.AUTH_USER_MODEL).objects.count(),
+        'albums': apps.get_model('yearbook', 'Album').objects.count(),
+        'photos': apps.get_model('yearbook', 'Photo').objects.count(),
+        'searches': apps.get_model('yearbook', 'SearchHistory').objects.count(),
+    }
+    classes = Student.objects.values_list('department', 'year').annotate(n=models.Count('id')).order_by()
+    counts.update({f'students:{department}:{year}': n for department, year, n in classes})
+    Statistic.objects.bulk_create([Statistic(key=key, value=value) for key, value in counts.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('yearbook', '0007_media_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Statistic',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_everything, migrations.RunPython.noop),
+    ]
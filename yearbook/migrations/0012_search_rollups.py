@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yearbook', '0011_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('search_type', models.CharField(max_length=50)),
+                ('query', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField()),
+            ],
+            options={
+                'ordering': ['-day', '-count'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'search_type', 'query'), name='searchrollup_unique')],
+            },
+        ),
+    ]
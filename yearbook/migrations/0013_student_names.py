@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:33
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fold(value):
+    # As yearbook.names.fold(), which may change after this migration
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(c for c in value if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', value.lower()))
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return ''.join(sorted({padded[i:i + 3] for i in range(len(padded) - 2)}))
+
+
+def index_names(apps, schema_editor):
+    Student = apps.get_model('yearbook', 'Student')
+    StudentName = apps.get_model('yearbook', 'StudentName')
+    NameWord = apps.get_model('yearbook', 'NameWord')
+    rows, words = [], set()
+    students = Student.objects.values_list('id', 'first_name', 'middle_name', 'last_name')
+    for student_id, *parts in students.iterator(chunk_size=2000):
+        folded = fold(' '.join(part or '' for part in parts))
+        rows.append(StudentName(student_id=student_id, folded=folded))
+        words.update(folded.split())
+    StudentName.objects.bulk_create(rows, batch_size=500)
+    NameWord.objects.bulk_create([NameWord(word=word, trigrams=trigrams(word)) for word in words],
+                                 batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yearbook', '0012_search_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NameWord',
+            fields=[
+                ('word', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('trigrams', models.TextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudentName',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='name_key', serialize=False, to='yearbook.student')),
+                ('folded', models.CharField(max_length=310)),
+            ],
+        ),
+        migrations.RunPython(index_names, migrations.RunPython.noop),
+    ]
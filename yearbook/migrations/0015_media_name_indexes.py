@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:52
+
+import yearbook.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yearbook', '0014_upload_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='album',
+            name='cover_photo',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=yearbook.storage.media_storage, upload_to='albums/covers/'),
+        ),
+        migrations.AlterField(
+            model_name='photo',
+            name='image',
+            field=models.ImageField(db_index=True, storage=yearbook.storage.media_storage, upload_to='albums/photos/'),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='profile_photo',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=yearbook.storage.media_storage, upload_to='profile_photos/'),
+        ),
+    ]
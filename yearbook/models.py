@@ -1,7 +1,10 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .storage import media_storage
+
 class Student(models.Model):
     DEPARTMENTS = [
         ('BSHM', 'BSHM'),
@@ -29,9 +32,28 @@ class Student(models.Model):
     year = models.CharField(max_length=4, choices=YEARS)
     block = models.CharField(max_length=10)
     section = models.CharField(max_length=50)
-    profile_photo = models.ImageField(upload_to='profile_photos/', null=True, blank=True)
+    profile_photo = models.ImageField(upload_to='profile_photos/', storage=media_storage, null=True, blank=True, db_index=True)
+    # Measured at ingest (see imagemeta.py) and None until then; nullable
+    # columns are also a plain ADD COLUMN on SQLite rather than a table rebuild
+    photo_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    photo_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    photo_bytes = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    photo_color = models.CharField(max_length=7, null=True, blank=True, editable=False)
+    photo_placeholder = models.TextField(null=True, blank=True, editable=False)
     achievements = models.TextField(blank=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # Part of the cached student card/row keys: bulk updates must set it too
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Student lists filter a class or one section of it and page by id;
+            # within equal keys SQLite keeps index entries in id order, so
+            # each filter needs an index on exactly its columns to skip a sort
+            models.Index(fields=['department', 'year'], name='student_class_idx'),
+            models.Index(fields=['department', 'year', 'block', 'section'], name='student_section_idx'),
+            models.Index(fields=['created_at'], name='student_created_idx'),
+        ]
 
     @property
     def full_name(self):
@@ -40,31 +62,96 @@ class Student(models.Model):
     def __str__(self):
         return f"{self.full_name} ({self.department}-{self.year})"
 
+class StudentName(models.Model):
+    """A student's accent-folded full name (see names.py)"""
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='name_key')
+    folded = models.CharField(max_length=310)
+
+    def __str__(self):
+        return self.folded
+
+class NameWord(models.Model):
+    """A folded word used in student names, with its trigrams (see names.py)"""
+    word = models.CharField(max_length=100, primary_key=True)
+    # Sorted and concatenated, three characters each
+    trigrams = models.TextField()
+
+    def __str__(self):
+        return self.word
+
 class Album(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     department = models.CharField(max_length=10, choices=Student.DEPARTMENTS)
     year = models.CharField(max_length=4, choices=Student.YEARS)
-    cover_photo = models.ImageField(upload_to='albums/covers/', null=True, blank=True)
+    cover_photo = models.ImageField(upload_to='albums/covers/', storage=media_storage, null=True, blank=True, db_index=True)
+    # Measured at ingest (see imagemeta.py)
+    cover_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    cover_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    cover_bytes = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    cover_color = models.CharField(max_length=7, null=True, blank=True, editable=False)
+    cover_placeholder = models.TextField(null=True, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by Photo signals and bulk paths; repair with `manage.py recount_albums`
+    photo_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-created_at']
         unique_together = ['department', 'year']
+        indexes = [
+            # Not (is_active, created_at): SQLite filters booleans as "WHERE is_active",
+            # which cannot use an index on the column
+            models.Index(fields=['created_at'], name='album_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.department}-{self.year})"
 
-    @property
-    def photo_count(self):
-        return self.photos.count()
+    def save(self, *args, **kwargs):
+        # Never write back a photo_count that may have changed since this
+        # instance was loaded
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'photo_count'
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def adjust_photo_count(cls, album_id, delta):
+        cls.objects.filter(pk=album_id).update(photo_count=models.F('photo_count') + delta)
+
+    @classmethod
+    def adjust_photo_counts(cls, deltas):
+        """Apply ``{album_id: change}``; one UPDATE per distinct change."""
+        by_delta = {}
+        for album_id, delta in deltas.items():
+            if delta:
+                by_delta.setdefault(delta, []).append(album_id)
+        for delta, album_ids in by_delta.items():
+            cls.objects.filter(pk__in=album_ids).update(photo_count=models.F('photo_count') + delta)
+
+    @classmethod
+    def recount_photos(cls, queryset=None):
+        """Recompute photo_count from the Photo table in one UPDATE."""
+        photos = (Photo.objects.filter(album=models.OuterRef('pk')).order_by()
+                  .values('album').annotate(total=models.Count('id')).values('total'))
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.update(photo_count=Coalesce(models.Subquery(photos), 0))
 
 class Photo(models.Model):
     album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='photos')
     student = models.ForeignKey(Student, on_delete=models.CASCADE, null=True, blank=True)
-    image = models.ImageField(upload_to='albums/photos/')
+    image = models.ImageField(upload_to='albums/photos/', storage=media_storage, db_index=True)
+    # Measured at ingest (see imagemeta.py)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_bytes = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    image_color = models.CharField(max_length=7, null=True, blank=True, editable=False)
+    image_placeholder = models.TextField(null=True, blank=True, editable=False)
     caption = models.CharField(max_length=300, blank=True)
     is_featured = models.BooleanField(default=False)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -72,6 +159,12 @@ class Photo(models.Model):
 
     class Meta:
         ordering = ['-is_featured', '-created_at']
+        indexes = [
+            # Read backwards for album pages: -is_featured, -created_at, -id
+            models.Index(fields=['album', 'is_featured', 'created_at'], name='photo_album_order_idx'),
+            # Admin changelist order and date_hierarchy ranges
+            models.Index(fields=['created_at'], name='photo_created_idx'),
+        ]
 
     def __str__(self):
         if self.student:
@@ -87,3 +180,78 @@ class SearchHistory(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Search Histories'
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='searchhistory_user_idx'),
+            models.Index(fields=['created_at'], name='searchhistory_created_idx'),
+        ]
+
+class PhotoUploadJob(models.Model):
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='upload_jobs')
+    student = models.ForeignKey(Student, on_delete=models.SET_NULL, null=True, blank=True)
+    caption = models.CharField(max_length=300, blank=True)
+    is_featured = models.BooleanField(default=False)
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    staging_dir = models.CharField(max_length=500)
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Set when the job is claimed and after every batch; see uploads.reclaim_stale()
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['album', 'created_at'], name='uploadjob_album_idx'),
+        ]
+
+    def __str__(self):
+        return f"Upload to {self.album_id}: {self.processed}/{self.total} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+class MediaBlob(models.Model):
+    """A stored image blob and how many rows reference it (see storage.py)"""
+    name = models.CharField(max_length=255, primary_key=True)
+    # Signed: a stale count must be able to go below zero rather than fail a delete
+    references = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.references})"
+
+class Statistic(models.Model):
+    """A dashboard counter kept current by signals (see stats.py)"""
+    key = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+class SearchRollup(models.Model):
+    """Searches per day, type and normalized query (see searchlog.py)"""
+    day = models.DateField()
+    search_type = models.CharField(max_length=50)
+    query = models.CharField(max_length=255)
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['-day', '-count']
+        constraints = [
+            # Also serves the reports' day ranges
+            models.UniqueConstraint(fields=['day', 'search_type', 'query'], name='searchrollup_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.search_type} {self.query!r}: {self.count}"
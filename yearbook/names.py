@@ -0,0 +1,327 @@
+"""
+Typo-tolerant, accent-folding student name matching.
+
+Saving a student writes its folded name to StudentName and each new word,
+with its pg_trgm-style trigrams, to NameWord (bulk paths call
+index_students()). Each worker matches against an in-memory index loaded
+from those tables. A name change is logged in the cache under this
+index's own version, so other workers apply it in place; they reload
+only when changes are missing from the log or after a bulk write.
+
+similar() widens search.py's full-text query with the name words most
+like each query word; match() fills up the typeahead suggestions.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from itertools import chain, filterfalse, islice
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import typeahead
+from .routers import primary_reads
+from .typeahead import normalize
+
+WORD_RE = re.compile(r'\w+')
+
+THRESHOLD = 0.35     # least similarity for a query word to match a name word
+MIN_QUERY = 3        # shorter queries are left to the prefix and full-text searches
+WORD_MATCHES = 8     # name words each query word may match
+
+VERSION_KEY = 'yearbook:names:version'
+CHANGE_KEY = 'yearbook:names:change:%d'
+CHANGE_TIMEOUT = 600  # seconds a name change stays in the log
+MAX_CHANGES = 500     # workers further behind than this reload
+
+
+def fold(value):
+    """Lowercase words without accents or punctuation."""
+    return ' '.join(WORD_RE.findall(normalize(value)))
+
+
+def folded_name(student):
+    return fold(' '.join((student.first_name, student.middle_name or '', student.last_name)))
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def pack(grams):
+    return ''.join(sorted(grams))
+
+
+def unpack(packed):
+    return {packed[i:i + 3] for i in range(0, len(packed), 3)}
+
+
+def index_students(students, using=None):
+    """Write the side table rows for saved ``students``; two queries per 500."""
+    from .models import NameWord, StudentName
+
+    students = list(students)
+    for start in range(0, len(students), 500):
+        rows, words = [], set()
+        for student in students[start:start + 500]:
+            folded = folded_name(student)
+            rows.append(StudentName(student_id=student.pk, folded=folded))
+            words.update(folded.split())
+        StudentName.objects.using(using).bulk_create(rows, update_conflicts=True,
+                                                      unique_fields=['student'], update_fields=['folded'])
+        new_words = [NameWord(word=word, trigrams=pack(trigrams(word))) for word in words]
+        NameWord.objects.using(using).bulk_create(new_words, ignore_conflicts=True)
+    return len(students)
+
+
+def rebuild(using=None):
+    """Rewrite both side tables from the Student table; returns students indexed."""
+    from .models import NameWord, Student, StudentName
+
+    StudentName.objects.using(using).all().delete()
+    NameWord.objects.using(using).all().delete()
+    students = Student.objects.using(using).only('id', 'first_name', 'middle_name', 'last_name')
+    batch, total = [], 0
+    for student in students.iterator(chunk_size=2000):
+        batch.append(student)
+        if len(batch) >= 2000:
+            total += index_students(batch, using)
+            batch = []
+    return total + index_students(batch, using)
+
+
+def current_version():
+    return typeahead.current_version(VERSION_KEY)
+
+
+def invalidate():
+    """Make every worker reload, after a write that bypassed publish()."""
+    typeahead.bump_version(VERSION_KEY)
+
+
+def publish(student_id, folded=None):
+    """Log one committed name change (``folded`` None for a deleted student)
+    for the other workers, and apply it to this one's index."""
+    version = typeahead.bump_version(VERSION_KEY)
+    cache.set(CHANGE_KEY % version, (student_id, folded), CHANGE_TIMEOUT)
+    name_index.apply(student_id, folded, version)
+
+
+class NameIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._students = {}      # folded word -> {student_id, ...}
+        self._words = {}         # student_id -> (folded word, ...)
+        self._grams = {}         # trigram -> [folded word, ...]
+        self._word_grams = {}    # folded word -> frozenset of its trigrams
+        self._vocabulary = []    # sorted folded words
+        self.version = None
+        self._checked_at = 0.0
+
+    def _add_word(self, word, grams):
+        self._word_grams[word] = frozenset(grams)
+        for gram in grams:
+            self._grams.setdefault(gram, []).append(word)
+
+    def _add_student(self, student_id, folded):
+        words = tuple(dict.fromkeys(folded.split()))
+        self._words[student_id] = words
+        for word in words:
+            self._students.setdefault(word, set()).add(student_id)
+            if word not in self._word_grams:
+                # New, or saved while this index was loading
+                self._add_word(word, trigrams(word))
+                insort(self._vocabulary, word)
+
+    def load(self):
+        from .models import NameWord, StudentName
+
+        version = current_version()
+        fresh = NameIndex()
+        # From the primary, as StudentPrefixIndex.load() does
+        with primary_reads():
+            for word, grams in NameWord.objects.values_list('word', 'trigrams').iterator(chunk_size=5000):
+                fresh._add_word(word, unpack(grams))
+            fresh._vocabulary = sorted(fresh._word_grams)
+            rows = StudentName.objects.values_list('student_id', 'folded').order_by('student_id')
+            for student_id, folded in rows.iterator(chunk_size=5000):
+                fresh._add_student(student_id, folded)
+        with self._lock:
+            self._students, self._words = fresh._students, fresh._words
+            self._grams, self._word_grams = fresh._grams, fresh._word_grams
+            self._vocabulary = fresh._vocabulary
+            self.version = version
+            self._checked_at = time.monotonic()
+
+    def _check_due(self):
+        interval = getattr(settings, 'TYPEAHEAD_RESYNC_INTERVAL', 1.0)
+        return self.version is None or time.monotonic() - self._checked_at >= interval
+
+    def _ensure_current(self):
+        if not self._check_due():
+            return
+        version = current_version()
+        if version != self.version and not self._catch_up(version):
+            self.load()
+        else:
+            self._checked_at = time.monotonic()
+
+    def _catch_up(self, version):
+        """Apply the logged changes up to ``version``; False if any are gone."""
+        if self.version is None or not 0 < version - self.version <= MAX_CHANGES:
+            return False
+        keys = [CHANGE_KEY % v for v in range(self.version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        with self._lock:
+            # Another thread may have caught up part of the way meanwhile
+            for v in range(self.version + 1, version + 1):
+                self._change(*changes[CHANGE_KEY % v])
+            self.version = max(self.version, version)
+            self._checked_at = time.monotonic()
+        return True
+
+    def _remove(self, student_id):
+        # Words stay in the vocabulary; one nobody uses any more matches no one
+        for word in self._words.pop(student_id, ()):
+            self._students[word].discard(student_id)
+
+    def _change(self, student_id, folded):
+        self._remove(student_id)
+        if folded is not None:
+            self._add_student(student_id, folded)
+
+    def apply(self, student_id, folded, version):
+        """Apply this worker's own change; see publish()."""
+        with self._lock:
+            if self.version is None:
+                return
+            if version != self.version + 1:
+                # Earlier changes are missing; the next check reads them from the log
+                self._checked_at = 0.0
+                return
+            self._change(student_id, folded)
+            self.version = version
+
+    def match(self, query, limit=20):
+        """[(student_id, similarity)] for names like ``query``, best first."""
+        self._ensure_current()
+        return self._match(query, limit)
+
+    async def amatch(self, query, limit=20):
+        if self._check_due():
+            await sync_to_async(self._ensure_current)()
+        return self._match(query, limit)
+
+    def similar(self, query):
+        """{query token: [name words like it, closest first]} for search.py.
+
+        Only tokens that aren't the start of any name word are looked up;
+        the others are found as they are, and may still be being typed.
+        """
+        self._ensure_current()
+        return self._similar(query)
+
+    async def asimilar(self, query):
+        if self._check_due():
+            await sync_to_async(self._ensure_current)()
+        return self._similar(query)
+
+    def _similar(self, query):
+        found = {}
+        with self._lock:
+            for token in WORD_RE.findall(query):
+                word = fold(token)
+                if len(word) < MIN_QUERY or ' ' in word or self._known_prefix(word):
+                    continue
+                matches = self._similar_words(word)
+                if matches:
+                    found[token] = sorted(matches, key=matches.get, reverse=True)
+        return found
+
+    def _known_prefix(self, word):
+        position = bisect_left(self._vocabulary, word)
+        return position < len(self._vocabulary) and self._vocabulary[position].startswith(word)
+
+    def _similar_words(self, word):
+        """{name word: similarity} for the name words most like ``word``."""
+        grams = trigrams(word)
+        # Fewer shared trigrams than this can't reach THRESHOLD, so a match
+        # shares at least one of the rarest len(grams) - least + 1 of them;
+        # only their (short) lists are read
+        least = math.ceil(THRESHOLD * len(grams))
+        rarest = sorted(grams, key=lambda gram: len(self._grams.get(gram, ())))[:len(grams) - least + 1]
+        similar = []
+        for other in set(chain.from_iterable(self._grams.get(gram, ()) for gram in rarest)):
+            count = len(grams & self._word_grams[other])
+            if count >= least and self._students.get(other):
+                similarity = count / (len(grams) + len(self._word_grams[other]) - count)
+                if similarity >= THRESHOLD:
+                    similar.append((similarity, other))
+        return {other: similarity for similarity, other in heapq.nlargest(WORD_MATCHES, similar)}
+
+    def _match(self, query, limit):
+        words = fold(query).split()
+        if len(''.join(words)) < MIN_QUERY:
+            return []
+        with self._lock:
+            similar = [self._similar_words(word) for word in words]
+            if not all(similar):
+                return []
+            if len(similar) == 1:
+                # A student ranks by their name word most like the query word
+                found = {}
+                for other, similarity in sorted(similar[0].items(), key=lambda item: -item[1]):
+                    new = filterfalse(found.__contains__, self._students[other])
+                    found.update(dict.fromkeys(islice(new, limit - len(found)), round(similarity, 3)))
+                    if len(found) >= limit:
+                        break
+                return list(found.items())
+
+            # Narrow the candidates down one query word at a time, the most
+            # selective first. Each name word of the first query word is
+            # intersected on its own rather than through their union, so every
+            # step is a C set intersection that iterates only the students
+            # still in the running
+            similar.sort(key=lambda matches: sum(len(self._students[word]) for word in matches))
+            survivors = set()
+            for first in similar[0]:
+                candidates = self._students[first]
+                for matches in similar[1:]:
+                    candidates = set().union(*(candidates & self._students[word] for word in matches))
+                    if not candidates:
+                        break
+                survivors |= candidates
+            if not survivors:
+                return []
+            closest = [max(matches.items(), key=itemgetter(1)) for matches in similar]
+            top = survivors.intersection(*(self._students[word] for word, _ in closest))
+            if len(top) >= limit:
+                # Enough students share every query word's closest name word,
+                # and nobody can outrank them
+                similarity = sum(similarity for _, similarity in closest) / len(similar)
+                return [(student_id, round(similarity, 3)) for student_id in sorted(top)[:limit]]
+            # Each survivor's best similarity per query word, closest words first
+            totals = dict.fromkeys(survivors, 0.0)
+            for matches in similar:
+                remaining = set(survivors)
+                for other, similarity in sorted(matches.items(), key=itemgetter(1), reverse=True):
+                    found = remaining & self._students[other]
+                    for student_id in found:
+                        totals[student_id] += similarity
+                    remaining -= found
+            scored = [(total / len(similar), -student_id) for student_id, total in totals.items()]
+        best = heapq.nlargest(limit, scored)
+        return [(-student_id, round(similarity, 3)) for similarity, student_id in best]
+
+
+name_index = NameIndex()
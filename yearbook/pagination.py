@@ -0,0 +1,222 @@
+"""
+Keyset (cursor) pagination.
+
+Unlike django.core.paginator.Paginator this never runs COUNT(*) or an
+OFFSET scan: each page is fetched with a WHERE clause that continues
+after the sort key of the last row seen, so deep pages cost the same as
+the first one. Pages are addressed by opaque cursor tokens instead of
+page numbers.
+
+EstimatedCountPaginator is for the Django admin changelists of large
+tables, which need page numbers: it takes an unfiltered table's size from
+the planner's statistics instead of counting every row.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, models, router
+from django.utils.functional import cached_property
+
+
+def _json_default(value):
+    # Full precision: DjangoJSONEncoder rounds datetimes to milliseconds,
+    # which would skip or repeat rows sharing a timestamp prefix
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} cannot be used in a cursor')
+
+
+def encode_cursor(values, direction):
+    raw = json.dumps({'k': values, 'd': direction}, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return ``(values, direction)``, or ``(None, 'n')`` for a bad token."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+        values, direction = data['k'], data['d']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None, 'n'
+    if not isinstance(values, list) or direction not in ('n', 'p'):
+        return None, 'n'
+    if not all(isinstance(value, (str, int, float)) for value in values):
+        return None, 'n'
+    return values, direction
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Paginate ``queryset`` by its ordering plus a primary key tiebreaker.
+
+    The ordering defaults to the queryset's own order_by() or the model's
+    Meta.ordering; every ordering field must be non-null. Fields may be
+    annotations (e.g. a search rank).
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        ordering = list(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+        if not any(f.lstrip('-') in ('pk', 'id') for f in ordering):
+            # Tiebreak in the same direction as the last key so a composite
+            # index on (..., key, id) can serve the scan
+            ordering.append('-pk' if ordering and ordering[-1].startswith('-') else 'pk')
+        self.keys = [(f.lstrip('-'), f.startswith('-')) for f in ordering]
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def _after(self, values, reverse):
+        """Q matching rows strictly after ``values`` in (reversed) order."""
+        condition = models.Q()
+        equal = models.Q()
+        for (field, descending), value in zip(self.keys, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & models.Q(**{f'{field}__{lookup}': value})
+            equal &= models.Q(**{field: value})
+        return condition
+
+    def _field(self, name):
+        query = self.queryset.query
+        if name in query.annotations:
+            return query.annotations[name].output_field
+        meta = self.queryset.model._meta
+        return meta.pk if name == 'pk' else meta.get_field(name)
+
+    def _coerce(self, values):
+        """``values`` as the key fields' Python types.
+
+        Tokens come from the client, so a forged one must not reach the
+        query: raises ValueError, TypeError or ValidationError for values
+        its fields would reject.
+        """
+        coerced = []
+        for (name, _descending), value in zip(self.keys, values):
+            field = self._field(name)
+            value = field.to_python(value)
+            if value is None:
+                raise ValueError(f'{name} is never null')
+            field.run_validators(value)
+            coerced.append(value)
+        return coerced
+
+    def _order(self, reverse):
+        return [f'-{field}' if descending != reverse else field for field, descending in self.keys]
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field, _descending in self.keys]
+
+    def _query(self, cursor):
+        values, direction = decode_cursor(cursor) if cursor else (None, 'n')
+        if values is not None and len(values) != len(self.keys):
+            values, direction = None, 'n'
+        if values is not None:
+            try:
+                values = self._coerce(values)
+            except (ValueError, TypeError, ValidationError):
+                # Like an undecodable token: the first page
+                values, direction = None, 'n'
+        backwards = direction == 'p'
+
+        queryset = self.queryset.order_by(*self._order(backwards))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backwards))
+        return queryset[:self.per_page + 1], values, backwards
+
+    def _page(self, rows, values, backwards):
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return CursorPage(rows, None, None)
+        has_next = (more and not backwards) or (backwards and values is not None)
+        has_previous = (more and backwards) or (not backwards and values is not None)
+        return CursorPage(
+            rows,
+            encode_cursor(self._key(rows[-1]), 'n') if has_next else None,
+            encode_cursor(self._key(rows[0]), 'p') if has_previous else None,
+        )
+
+    def get_page(self, cursor=None):
+        queryset, values, backwards = self._query(cursor)
+        return self._page(list(queryset), values, backwards)
+
+    async def aget_page(self, cursor=None):
+        queryset, values, backwards = self._query(cursor)
+        return self._page([row async for row in queryset], values, backwards)
+
+
+def estimated_count(model):
+    """Approximate rows in ``model``'s table, or None if the database can't
+    tell cheaply.
+
+    PostgreSQL keeps an estimate in pg_class; SQLite has one in sqlite_stat1
+    once ANALYZE (or PRAGMA optimize) has run, and otherwise the largest
+    rowid, which only overcounts by the rows deleted since.
+    """
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+            if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+                return model.objects.aggregate(last=models.Max('pk'))['last'] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that reports an unfiltered table's estimated size once it
+    is over ``threshold`` rows, rather than running COUNT(*) on every page.
+
+    Filtered querysets (search, list_filter, date_hierarchy) are still
+    counted exactly; pair it with ``show_full_result_count = False`` so the
+    admin doesn't count the whole table for the "N total" link either.
+    """
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, models.QuerySet) and not queryset.query.where:
+            estimate = estimated_count(queryset.model)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
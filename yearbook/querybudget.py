@@ -0,0 +1,133 @@
+"""
+Per-view SQL query budgets.
+
+QueryBudgetMiddleware records the queries each request runs (count,
+repeated SQL, total DB time) and logs a warning when a view goes over its
+budget: settings.QUERY_BUDGETS for reads (GET, HEAD, OPTIONS) and
+settings.QUERY_WRITE_BUDGETS for every other method, whose saves run their
+signals' queries as well. QueryBudgetTestMixin lets tests
+assert the same budgets, so an N+1 regression fails the suite before it
+reaches the logs.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def budget_for(view_name, method='GET'):
+    if method.upper() in SAFE_METHODS:
+        return settings.QUERY_BUDGETS.get(view_name, settings.QUERY_BUDGET_DEFAULT)
+    return settings.QUERY_WRITE_BUDGETS.get(view_name, settings.QUERY_WRITE_BUDGET_DEFAULT)
+
+
+class QueryRecorder:
+    """Context manager collecting every query run on any database."""
+
+    def __init__(self):
+        self.queries = []  # (alias, sql, seconds)
+        self._stack = None
+
+    def _wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append((alias, sql, time.perf_counter() - start))
+        return record
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for conn in connections.all():
+            self._stack.enter_context(conn.execute_wrapper(self._wrapper(conn.alias)))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(seconds for _alias, _sql, seconds in self.queries)
+
+    @property
+    def duplicates(self):
+        """SQL statements run more than once, with their repeat counts."""
+        counts = Counter(sql for _alias, sql, _seconds in self.queries)
+        return {sql: n for sql, n in counts.items() if n > 1}
+
+    def summary(self):
+        lines = [f'{self.count} queries in {self.total_time * 1000:.1f} ms']
+        for sql, n in sorted(self.duplicates.items(), key=lambda item: -item[1]):
+            lines.append(f'  x{n}: {sql}')
+        return '\n'.join(lines)
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        # Database work for an async request runs on its thread-sensitive
+        # worker thread, and connections are per thread: record there
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        if view_name:
+            budget = budget_for(view_name, request.method)
+            if recorder.count > budget:
+                logger.warning(
+                    'Query budget exceeded for %s %s (%s): %d > %d\n%s',
+                    request.method, view_name, request.path, recorder.count, budget, recorder.summary(),
+                )
+        if settings.DEBUG:
+            response['X-DB-Queries'] = str(recorder.count)
+            response['X-DB-Time'] = f'{recorder.total_time * 1000:.1f}ms'
+        return response
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin: ``self.assertQueryBudget(url, view_name)``."""
+
+    def assertQueryBudget(self, url, view_name, budget=None, method='get', **kwargs):
+        budget = budget_for(view_name, method) if budget is None else budget
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method)(url, **kwargs)
+        if recorder.count > budget:
+            self.fail(f'{method.upper()} {view_name} ({url}) ran over its query budget of {budget}: '
+                      f'{recorder.summary()}')
+        return response
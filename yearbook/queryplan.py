@@ -0,0 +1,83 @@
+"""
+Query plan checks for tests.
+
+QueryPlanRecorder collects the SELECTs a block of code runs, with their
+parameters, and asks SQLite for each one's EXPLAIN QUERY PLAN. A plan
+step that reads a whole table without an index ("SCAN <table>") or sorts
+rows itself ("USE TEMP B-TREE FOR ORDER BY") usually means a missing
+index; QueryPlanTestMixin.assertIndexedQueries fails on either. Walking
+an index ("SCAN <table> USING INDEX ...") is not reported: that is how an
+ordered LIMIT query or a COUNT(*) is meant to run.
+
+Some table scans are expected, such as a page ordered by primary key
+(SQLite reports the rowid walk as a plain SCAN). Pass those as ``allow``,
+regular expressions matched against the plan step text.
+"""
+import re
+from contextlib import ExitStack
+
+from django.db import connections
+
+PROBLEMS = [
+    re.compile(r'^SCAN \S+$'),
+    re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)'),
+]
+
+
+class QueryPlanRecorder:
+    """Context manager collecting (alias, sql, params) for every SELECT."""
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def _wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith('SELECT'):
+                self.queries.append((alias, sql, params))
+            return execute(sql, params, many, context)
+        return record
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for conn in connections.all():
+            self._stack.enter_context(conn.execute_wrapper(self._wrapper(conn.alias)))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def plans(self):
+        """(sql, [plan step, ...]) for each recorded query."""
+        results = []
+        for alias, sql, params in self.queries:
+            conn = connections[alias]
+            if conn.vendor != 'sqlite':
+                continue
+            with conn.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                results.append((sql, [row[-1] for row in cursor.fetchall()]))
+        return results
+
+    def problems(self, allow=()):
+        """(sql, step) for every plan step that scans a table or sorts."""
+        allow = [re.compile(pattern) for pattern in allow]
+        found = []
+        for sql, steps in self.plans():
+            for step in steps:
+                if any(p.search(step) for p in PROBLEMS) and not any(a.search(step) for a in allow):
+                    found.append((sql, step))
+        return found
+
+
+class QueryPlanTestMixin:
+    """TestCase mixin: ``self.assertIndexedQueries(url, allow=[...])``."""
+
+    def assertIndexedQueries(self, url, allow=(), method='get', **kwargs):
+        with QueryPlanRecorder() as recorder:
+            response = getattr(self.client, method)(url, **kwargs)
+        problems = recorder.problems(allow)
+        if problems:
+            details = '\n'.join(f'  {step}\n    {sql}' for sql, step in problems)
+            self.fail(f'{url} runs queries without a usable index:\n{details}')
+        return response
@@ -0,0 +1,114 @@
+"""
+Fixed-size derivatives of uploaded images.
+
+Renditions are generated when an image is saved and stored beside the
+original as ``<name>.<rendition>.webp`` (or ``.jpg`` when Pillow was built
+without WebP). Templates ask for a rendition through the ``rendition``
+filter and fall back to the original until one exists.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# name -> (width, height, crop to fill)
+RENDITIONS = {
+    'thumb': (480, 480, True),
+    'lightbox': (1600, 1600, False),
+    'avatar': (256, 256, True),
+}
+
+# Renditions produced for each (model, image field)
+FIELD_RENDITIONS = {
+    ('Photo', 'image'): ('thumb', 'lightbox'),
+    ('Album', 'cover_photo'): ('thumb',),
+    ('Student', 'profile_photo'): ('avatar',),
+}
+
+if features.check('webp'):
+    FORMAT, EXTENSION, SAVE_OPTIONS = 'WEBP', 'webp', {'quality': 80, 'method': 4}
+else:
+    FORMAT, EXTENSION, SAVE_OPTIONS = 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}
+
+
+def rendition_name(name, rendition):
+    root, _ext = posixpath.splitext(name)
+    return f'{root}.{rendition}.{EXTENSION}'
+
+
+def rendition_size(width, height, rendition):
+    """(width, height) of ``rendition`` made from a ``width`` x ``height`` image."""
+    max_width, max_height, crop = RENDITIONS[rendition]
+    if crop:
+        return max_width, max_height
+    # Image.thumbnail: fit inside the box, never enlarge
+    scale = min(max_width / width, max_height / height, 1)
+    return max(round(width * scale), 1), max(round(height * scale), 1)
+
+
+def render(image, rendition):
+    """Return ``image`` resized for ``rendition`` as encoded bytes."""
+    width, height, crop = RENDITIONS[rendition]
+    if crop:
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail((width, height), Image.LANCZOS)
+    if image.mode not in ('RGB', 'RGBA') or (FORMAT == 'JPEG' and image.mode == 'RGBA'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, FORMAT, **SAVE_OPTIONS)
+    return buffer.getvalue()
+
+
+def generate(fieldfile, renditions, force=False):
+    """Write the missing ``renditions`` of ``fieldfile`` to its storage.
+
+    Returns the names of the renditions that were written.
+    """
+    if not fieldfile:
+        return []
+    storage = fieldfile.storage
+    pending = [r for r in renditions
+               if force or not storage.exists(rendition_name(fieldfile.name, r))]
+    if not pending:
+        return []
+    with storage.open(fieldfile.name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    written = []
+    for rendition in pending:
+        # Renamed into place: racing writers never leave a suffixed copy
+        storage.replace(rendition_name(fieldfile.name, rendition), ContentFile(render(image, rendition)))
+        written.append(rendition)
+    return written
+
+
+def generate_for_instance(instance, force=False):
+    """Generate renditions for every image field of a model instance."""
+    model = type(instance).__name__
+    for (model_name, field), renditions in FIELD_RENDITIONS.items():
+        if model_name != model:
+            continue
+        fieldfile = getattr(instance, field)
+        try:
+            generate(fieldfile, renditions, force=force)
+        except FileNotFoundError:
+            logger.debug('Original %s is missing; no renditions generated', fieldfile.name)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.exception('Could not generate renditions for %s', fieldfile.name)
+
+
+def url(fieldfile, rendition):
+    """URL of a rendition, or of the original if it was never generated."""
+    if not fieldfile:
+        return ''
+    name = rendition_name(fieldfile.name, rendition)
+    if fieldfile.storage.exists(name):
+        return fieldfile.storage.url(name)
+    return fieldfile.url
@@ -0,0 +1,176 @@
+"""
+Bulk roster import.
+
+A roster is a CSV with one student per row, keyed on school_id. Rows are
+read and validated in batches of ROSTER_IMPORT_BATCH_SIZE; for each batch
+the existing students are fetched in one query, then new rows are inserted
+with bulk_create and changed rows written with bulk_update, inside one
+transaction. A bad row is reported with its line number and skipped; it
+never stops the rest of the file.
+
+Headers may be the Student field names or the column titles written by
+the student export, so an exported file can be edited and imported back.
+Optional columns that are absent are left untouched on existing students.
+"""
+import csv
+import io
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import caching, exports, names, stats, typeahead
+from .models import Student
+
+REQUIRED = ['school_id', 'first_name', 'last_name', 'email', 'department', 'year', 'block', 'section']
+OPTIONAL = ['middle_name', 'achievements']
+
+_HEADER_ALIASES = {header.lower(): name for header, name in exports.COLUMNS}
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)  # (line number, message)
+
+    @property
+    def total(self):
+        return self.created + self.updated + self.unchanged + len(self.errors)
+
+
+def _field_name(header):
+    header = (header or '').strip().lower()
+    return _HEADER_ALIASES.get(header, header.replace(' ', '_'))
+
+
+def _clean(row, columns):
+    """Validated field values for one row, or raise ValidationError."""
+    values = {name: (row.get(name) or '').strip() for name in columns}
+    problems = [f'{name} is required' for name in REQUIRED if not values[name]]
+    if problems:
+        raise ValidationError(problems)
+    for name in columns:
+        max_length = Student._meta.get_field(name).max_length
+        if max_length and len(values[name]) > max_length:
+            problems.append(f'{name} is longer than {max_length} characters')
+    try:
+        validate_email(values['email'])
+    except ValidationError:
+        problems.append(f"'{values['email']}' is not a valid email")
+    if values['department'] not in dict(Student.DEPARTMENTS):
+        problems.append(f"unknown department '{values['department']}'")
+    if values['year'] not in dict(Student.YEARS):
+        problems.append(f"unknown year '{values['year']}'")
+    if problems:
+        raise ValidationError(problems)
+    return values
+
+
+def _apply(batch, columns, result, dry_run):
+    existing = Student.objects.in_bulk([values['school_id'] for _line, values in batch],
+                                       field_name='school_id')
+    creates, updates = [], []
+    moved = Counter()
+    for _line, values in batch:
+        student = existing.get(values['school_id'])
+        if student is None:
+            creates.append(Student(**values))
+            continue
+        previous = (student.department, student.year)
+        changed = False
+        for name in columns:
+            if getattr(student, name) != values[name]:
+                setattr(student, name, values[name])
+                changed = True
+        if changed:
+            # bulk_update skips auto_now; cached student cards key on it
+            student.updated_at = timezone.now()
+            updates.append(student)
+            if (student.department, student.year) != previous:
+                moved[previous] -= 1
+                moved[student.department, student.year] += 1
+        else:
+            result.unchanged += 1
+    if not dry_run:
+        deltas = stats.student_deltas((s.department, s.year, 1) for s in creates)
+        for (department, year), change in moved.items():
+            deltas[stats.class_key(department, year)] += change
+        with transaction.atomic():
+            Student.objects.bulk_create(creates)
+            Student.objects.bulk_update(updates, [c for c in columns if c != 'school_id'] + ['updated_at'])
+            # Neither sends signals, so the dashboard counters and the
+            # name matching rows are written here
+            stats.adjust(deltas)
+            names.index_students(creates + updates)
+    result.created += len(creates)
+    result.updated += len(updates)
+
+
+def import_roster(file, batch_size=None, dry_run=False):
+    """Create or update students from a CSV roster; returns an ImportResult.
+
+    ``file`` may be a text or binary file object (an upload, or a file
+    opened with ``open(path, 'rb')``). With ``dry_run`` every row is
+    validated and counted but nothing is written.
+    """
+    batch_size = batch_size or settings.ROSTER_IMPORT_BATCH_SIZE
+    if 'b' in getattr(file, 'mode', 'b'):
+        file = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    reader = csv.reader(file)
+    result = ImportResult()
+    try:
+        headers = [_field_name(h) for h in next(reader)]
+    except StopIteration:
+        result.errors.append((1, 'the file is empty'))
+        return result
+    missing = [name for name in REQUIRED if name not in headers]
+    if missing:
+        result.errors.append((1, f"missing column(s): {', '.join(missing)}"))
+        return result
+    columns = REQUIRED + [name for name in OPTIONAL if name in headers]
+
+    batch, seen = [], {}
+
+    def flush():
+        try:
+            _apply(batch, columns, result, dry_run)
+        except DatabaseError as exc:
+            result.errors.extend((line, f'not saved: {exc}') for line, _values in batch)
+        batch.clear()
+
+    try:
+        for row in reader:
+            line = reader.line_num
+            if not any(cell.strip() for cell in row):
+                continue
+            try:
+                values = _clean(dict(zip(headers, row)), columns)
+            except ValidationError as exc:
+                result.errors.append((line, '; '.join(exc.messages)))
+                continue
+            if values['school_id'] in seen:
+                result.errors.append(
+                    (line, f"school_id {values['school_id']} repeats line {seen[values['school_id']]}")
+                )
+                continue
+            seen[values['school_id']] = line
+            batch.append((line, values))
+            if len(batch) >= batch_size:
+                flush()
+    except (csv.Error, UnicodeDecodeError) as exc:
+        result.errors.append((reader.line_num, f'could not read the file: {exc}'))
+    if batch:
+        flush()
+
+    if not dry_run and (result.created or result.updated):
+        # bulk_create/bulk_update skip the Student signals
+        typeahead.bump_version()
+        names.invalidate()
+        caching.bump('students')
+    return result
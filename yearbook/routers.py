@@ -0,0 +1,148 @@
+"""
+Read replica routing.
+
+Settings:
+    DATABASE_REPLICAS       aliases in DATABASES holding copies of 'default'
+    REPLICA_STICKY_SECONDS  how long a user's reads stay on the primary
+                            after that user writes
+
+Replicas are only used inside requests. ReplicaRoutingMiddleware marks a
+GET/HEAD request as replica-safe; while it runs, ReadReplicaRouter sends
+reads of the yearbook models to a randomly chosen replica. Everything else
+reads from the primary: management commands, background threads, other
+HTTP methods, reads inside a transaction, and sessions/auth (a session
+written at login must be visible on the very next request).
+
+Reads that fill a shared cache or index run inside primary_reads(), so
+a replica that hasn't caught up with a change can't be cached as its
+result.
+
+Read-your-writes: the first write in a request pins the rest of that
+request to the primary, and the response sets a short-lived cookie that
+pins the same browser's following requests until the replicas have
+caught up.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'yearbook_db_pin'
+
+REPLICA_APPS = {'yearbook'}
+
+# None outside requests; otherwise {'replica': bool, 'wrote': bool}
+_request_state = ContextVar('yearbook_replica_state', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+@contextmanager
+def replica_reads(allowed=True):
+    """Let reads in this block use replicas (the middleware does this)."""
+    state = {'replica': allowed and bool(replicas()), 'wrote': False}
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary in this block, then go back to the replicas.
+
+    For reads that fill something shared under a version that was just
+    bumped (page cache misses, ETag validators, the in-memory indexes): a
+    lagging replica would store stale data there until the next change.
+    """
+    state = _request_state.get()
+    if state is None or not state['replica']:
+        yield
+        return
+    state['replica'] = False
+    try:
+        yield
+    finally:
+        # A write in the block pins the rest of the request anyway
+        state['replica'] = not state['wrote']
+
+
+def pin_to_primary():
+    """Send every remaining read in this request to the primary."""
+    state = _request_state.get()
+    if state is not None:
+        state['replica'] = False
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or not state['replica']:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label not in REPLICA_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        # Session saves are not content; they shouldn't pin the browser
+        if state is not None and model._meta.app_label != 'sessions':
+            state['wrote'] = True
+            state['replica'] = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary, never migrated directly
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(allowed=not self.pinned(request)) as state:
+            response = self.get_response(request)
+        return self.remember_write(state, response)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, so the ORM's worker thread sees
+        # (and updates) the same state dict
+        with replica_reads(allowed=not self.pinned(request)) as state:
+            response = await self.get_response(request)
+        return self.remember_write(state, response)
+
+    def pinned(self, request):
+        return request.method not in ('GET', 'HEAD') or PIN_COOKIE in request.COOKIES
+
+    def remember_write(self, state, response):
+        if state['wrote']:
+            max_age = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(PIN_COOKIE, str(int(time.time() + max_age)), max_age=max_age,
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,213 @@
+"""
+Full-text search for students and albums.
+
+On SQLite the Student and Album tables are shadowed by FTS5 indexes that
+are kept in sync by triggers, so a search is a single MATCH against the
+index instead of one LIKE '%q%' scan per field. Other databases (or a
+SQLite build without FTS5) fall back to the original icontains filters.
+
+Student searches that name a name field are also typo tolerant: a word
+that starts no student's name ("santso", "mendosa") is widened to the
+similar name words found by names.name_index ("santos", "mendoza").
+
+The a* variants are for async views; they return the same lazy querysets.
+"""
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connection, connections, models
+from django.db.models.expressions import RawSQL
+
+from . import names
+
+STUDENT_INDEX = 'yearbook_student_fts'
+ALBUM_INDEX = 'yearbook_album_fts'
+
+STUDENT_FIELDS = ('first_name', 'middle_name', 'last_name', 'school_id',
+                  'email', 'department', 'block', 'section')
+ALBUM_FIELDS = ('title', 'description', 'department', 'year')
+
+# Fields searched by the dashboards and the admin student list
+STUDENT_BASIC_FIELDS = ('first_name', 'last_name', 'school_id', 'email')
+
+STUDENT_NAME_FIELDS = ('first_name', 'middle_name', 'last_name')
+
+# (index table, content table, indexed columns)
+INDEXES = (
+    (STUDENT_INDEX, 'yearbook_student', STUDENT_FIELDS),
+    (ALBUM_INDEX, 'yearbook_album', ALBUM_FIELDS),
+)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _index_sql(index, table, columns):
+    cols = ', '.join(columns)
+    new_cols = ', '.join(f'new.{c}' for c in columns)
+    old_cols = ', '.join(f'old.{c}' for c in columns)
+    delete_row = (
+        f"INSERT INTO {index}({index}, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_cols});"
+    )
+    insert_row = f"INSERT INTO {index}(rowid, {cols}) VALUES (new.id, {new_cols});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({cols}, "
+        f"content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table} "
+        f"BEGIN {insert_row} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table} "
+        f"BEGIN {delete_row} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE ON {table} "
+        f"BEGIN {delete_row} {insert_row} END",
+    ]
+
+
+def _triggers_present(cursor, index):
+    cursor.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+        [f'{index}_ai', f'{index}_ad', f'{index}_au'],
+    )
+    return cursor.fetchone()[0] == 3
+
+
+_fts_support = {}
+
+
+def fts_available(conn=None):
+    """Return True if the connection is SQLite with the FTS5 extension."""
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return False
+    if conn.alias not in _fts_support:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            _fts_support[conn.alias] = bool(cursor.fetchone()[0])
+    return _fts_support[conn.alias]
+
+
+def install(conn=None):
+    """Create the indexes and triggers if missing.
+
+    SQLite drops triggers whenever a migration rebuilds a table, so this is
+    also run after every migrate; an index whose triggers had to be
+    recreated is rebuilt since it may have missed writes in between.
+    """
+    conn = conn or connection
+    if not fts_available(conn):
+        return
+    with conn.cursor() as cursor:
+        for index, table, columns in INDEXES:
+            stale = not _triggers_present(cursor, index)
+            for statement in _index_sql(index, table, columns):
+                cursor.execute(statement)
+            if stale:
+                cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def uninstall(conn=None):
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        for index, table, columns in INDEXES:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {index}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {index}")
+
+
+def rebuild(conn=None):
+    """Repopulate both indexes from their content tables."""
+    conn = conn or connection
+    install(conn)
+    if not fts_available(conn):
+        return False
+    with conn.cursor() as cursor:
+        for index, table, columns in INDEXES:
+            cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {index}({index}) VALUES ('optimize')")
+    return True
+
+
+def _term(token, alternatives):
+    if not alternatives:
+        return f'"{token}"*'
+    return '(%s)' % ' OR '.join([f'"{token}"*'] + [f'"{word}"' for word in alternatives])
+
+
+def match_expression(query, columns=None, similar=None):
+    """Turn free text into an FTS5 expression.
+
+    Every word becomes a quoted prefix term so partial input still matches
+    ("jo" finds "John") and user input can never inject FTS5 syntax.
+    ``similar`` maps words to alternatives that may match instead, as
+    returned by names.name_index.similar().
+    """
+    similar = similar or {}
+    # An explicit AND: FTS5 doesn't take an implicit one before a bracket
+    terms = ' AND '.join(_term(token, similar.get(token)) for token in TOKEN_RE.findall(query))
+    if not terms:
+        return ''
+    if columns:
+        return '{%s} : (%s)' % (' '.join(columns), terms)
+    return terms
+
+
+def _icontains(query, fields):
+    condition = models.Q()
+    for field in fields:
+        condition |= models.Q(**{f'{field}__icontains': query})
+    return condition
+
+
+def _search(queryset, query, index, fields, all_fields, similar=None):
+    expression = match_expression(query, None if fields == all_fields else fields, similar)
+    if not expression:
+        return queryset.none() if query.strip() else queryset
+    if not fts_available(connections[queryset.db]):
+        condition = _icontains(query, fields)
+        for word in {word for words in (similar or {}).values() for word in words}:
+            condition |= _icontains(word, [f for f in fields if f in STUDENT_NAME_FIELDS])
+        return queryset.filter(condition)
+    table = queryset.model._meta.db_table
+    # An annotation rather than an extra select, so callers can filter and
+    # paginate on search_rank like any other field
+    return queryset.extra(
+        tables=[index],
+        where=[f'{index} MATCH %s', f'{index}.rowid = {table}.id'],
+        params=[expression],
+    ).annotate(
+        search_rank=RawSQL(f'{index}.rank', (), output_field=models.FloatField()),
+    ).order_by('search_rank')
+
+
+def _names_searched(fields):
+    return not set(fields).isdisjoint(STUDENT_NAME_FIELDS)
+
+
+def search_students(queryset, query, fields=STUDENT_FIELDS):
+    """Filter a Student queryset by ``query``, best matches first."""
+    similar = names.name_index.similar(query) if _names_searched(fields) else None
+    return _search(queryset, query, STUDENT_INDEX, tuple(fields), STUDENT_FIELDS, similar)
+
+
+def search_albums(queryset, query, fields=ALBUM_FIELDS):
+    """Filter an Album queryset by ``query``, best matches first."""
+    return _search(queryset, query, ALBUM_INDEX, tuple(fields), ALBUM_FIELDS)
+
+
+async def _acheck_fts(alias):
+    # fts_available() queries SQLite once per alias; do that in a thread
+    if alias not in _fts_support:
+        await sync_to_async(lambda: fts_available(connections[alias]))()
+
+
+async def asearch_students(queryset, query, fields=STUDENT_FIELDS):
+    await _acheck_fts(queryset.db)
+    similar = await names.name_index.asimilar(query) if _names_searched(fields) else None
+    return _search(queryset, query, STUDENT_INDEX, tuple(fields), STUDENT_FIELDS, similar)
+
+
+async def asearch_albums(queryset, query, fields=ALBUM_FIELDS):
+    await _acheck_fts(queryset.db)
+    return search_albums(queryset, query, fields)
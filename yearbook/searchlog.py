@@ -0,0 +1,156 @@
+"""
+Search history retention and analytics.
+
+SearchHistory gains a row for nearly every filtered page view and would
+grow without bound. Complete days are instead rolled up into SearchRollup
+(one row per day, search type and normalized query, with a count), and raw
+rows older than SEARCH_HISTORY_RETENTION_DAYS are deleted in small batches,
+each its own short transaction, so writers are never locked out for long.
+Rows are only deleted once their day has been rolled up.
+
+``manage.py prune_search_history`` does both (run it daily, e.g. from
+cron); top_queries() and trend() report from the rollups, so they cost the
+same however long the history is, and don't include the current day.
+"""
+import datetime
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+
+from . import stats
+
+# A day is rolled up this long after it ends, once the history writer's
+# queue (see history.py) can no longer hold searches from it
+GRACE = datetime.timedelta(hours=1)
+
+
+def normalize(query):
+    """Case- and whitespace-insensitive form of a search, as rolled up."""
+    return ' '.join(query.casefold().split())[:255]
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+
+
+def rolled_through():
+    """The last day in the rollups, or None."""
+    from .models import SearchRollup
+
+    return SearchRollup.objects.aggregate(last=Max('day'))['last']
+
+
+def rollup(now=None):
+    """Roll up every complete day after the last one rolled up.
+
+    Returns the number of days written. Runs of days without searches are
+    jumped over rather than queried one by one.
+    """
+    from .models import SearchHistory, SearchRollup
+
+    last_complete = timezone.localdate((now or timezone.now()) - GRACE) - datetime.timedelta(days=1)
+    last = rolled_through()
+    start = _day_start(last + datetime.timedelta(days=1)) if last else None
+
+    days = 0
+    while True:
+        remaining = SearchHistory.objects.all()
+        if start is not None:
+            remaining = remaining.filter(created_at__gte=start)
+        first = remaining.aggregate(first=Min('created_at'))['first']
+        if first is None or timezone.localdate(first) > last_complete:
+            break
+        day = timezone.localdate(first)
+        start, end = _day_start(day), _day_start(day + datetime.timedelta(days=1))
+
+        counts = Counter()
+        rows = (SearchHistory.objects.filter(created_at__gte=start, created_at__lt=end)
+                .values_list('search_type', 'search_query').annotate(n=Count('id')).order_by())
+        for search_type, query, n in rows:
+            counts[search_type, normalize(query)] += n
+        with transaction.atomic():
+            # ignore_conflicts: a concurrent run writes the same counts
+            SearchRollup.objects.bulk_create([
+                SearchRollup(day=day, search_type=search_type, query=query, count=n)
+                for (search_type, query), n in counts.items()
+            ], batch_size=500, ignore_conflicts=True)
+        days += 1
+        start = end
+    return days
+
+
+def prune_cutoff(retention_days=None, now=None):
+    """Raw rows before this time may be deleted, or None if none may."""
+    if retention_days is None:
+        retention_days = settings.SEARCH_HISTORY_RETENTION_DAYS
+    last = rolled_through()
+    if last is None:
+        return None
+    oldest_kept = timezone.localdate(now or timezone.now()) - datetime.timedelta(days=retention_days)
+    return _day_start(min(oldest_kept, last + datetime.timedelta(days=1)))
+
+
+def prune(retention_days=None, batch_size=1000, pause=0, now=None):
+    """Delete rolled-up raw rows older than the retention window.
+
+    Each batch is deleted and counted in its own transaction, oldest first
+    along the created_at index, with ``pause`` seconds between batches to
+    let other writers in. Returns the number of rows deleted.
+    """
+    from .models import SearchHistory
+
+    cutoff = prune_cutoff(retention_days, now)
+    if cutoff is None:
+        return 0
+    expired = SearchHistory.objects.filter(created_at__lt=cutoff).order_by('created_at')
+    connection = connections[router.db_for_write(SearchHistory)]
+    table = connection.ops.quote_name(SearchHistory._meta.db_table)
+    total = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            # A plain DELETE, as QuerySet.delete() would fetch every row for
+            # the signals; nothing references SearchHistory, so there is
+            # nothing to cascade, and the counter is adjusted here once
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+            deleted = cursor.rowcount
+            stats.adjust({'searches': -deleted})
+        total += deleted
+        if pause:
+            time.sleep(pause)
+
+
+def _since(days, search_type):
+    from .models import SearchRollup
+
+    rollups = SearchRollup.objects.filter(day__gte=timezone.localdate() - datetime.timedelta(days=days))
+    if search_type:
+        rollups = rollups.filter(search_type=search_type)
+    return rollups
+
+
+def top_queries(days=30, limit=20, search_type=None):
+    """[(query, searches)] for the most searched queries of the last ``days``."""
+    rows = (_since(days, search_type).values('query').annotate(total=Sum('count'))
+            .order_by('-total', 'query').values_list('query', 'total')[:limit])
+    return list(rows)
+
+
+def trend(days=30, query=None, search_type=None):
+    """[(day, searches)] per day of the last ``days``, for one query or all.
+
+    Days without searches are included as zero.
+    """
+    rollups = _since(days, search_type)
+    if query:
+        rollups = rollups.filter(query=normalize(query))
+    totals = dict(rollups.values('day').annotate(total=Sum('count')).order_by().values_list('day', 'total'))
+    today = timezone.localdate()
+    first = today - datetime.timedelta(days=days)
+    return [(day, totals.get(day, 0)) for day in (first + datetime.timedelta(days=n) for n in range(days))]
@@ -0,0 +1,222 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import caching, imagemeta, names, renditions, search, stats, storage, typeahead
+from .models import Album, Photo, SearchHistory, Student
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, using, update_fields=None, **kwargs):
+    transaction.on_commit(lambda: caching.bump('students'))
+    if update_fields is None or set(search.STUDENT_NAME_FIELDS).intersection(update_fields):
+        # Written with the row rather than on commit, so they roll back with it
+        names.index_students([instance], using)
+        student_id, folded = instance.pk, names.folded_name(instance)
+        transaction.on_commit(lambda: names.publish(student_id, folded))
+    student_id, row = instance.pk, typeahead.StudentPrefixIndex.row(instance)
+    transaction.on_commit(lambda: typeahead.publish(student_id, row))
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    student_id = instance.pk
+    transaction.on_commit(lambda: caching.bump('students'))
+    transaction.on_commit(lambda: names.publish(student_id))
+    transaction.on_commit(lambda: typeahead.publish(student_id))
+
+
+@receiver(post_save, sender=Photo)
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Student)
+def image_saved(sender, instance, **kwargs):
+    renditions.generate_for_instance(instance)
+
+
+def _media_names(instance):
+    return {field: getattr(instance, field).name or '' for model, field in renditions.FIELD_RENDITIONS
+            if model == type(instance).__name__}
+
+
+# Stored values the post_save receivers compare with, besides the images
+PREVIOUS_FIELDS = {Photo: ('album_id',), Student: ('department', 'year')}
+
+
+def _tally(origin, key, deltas):
+    """Add ``deltas`` to a Counter kept on a delete's origin.
+
+    The collector sends every pre_delete before deleting anything, so the
+    rows of one delete, cascades included, are tallied there and the first
+    post_delete applies the total with _take().
+    """
+    origin.__dict__.setdefault(key, Counter()).update(deltas)
+
+
+def _take(origin, key):
+    return origin.__dict__.pop(key, Counter())
+
+
+@receiver(pre_save, sender=Photo)
+@receiver(pre_save, sender=Album)
+@receiver(pre_save, sender=Student)
+def previous_values(sender, instance, **kwargs):
+    # One query for every receiver that needs the row as it was
+    instance._previous = {}
+    if not instance._state.adding and instance.pk:
+        fields = [*_media_names(instance), *PREVIOUS_FIELDS.get(sender, ())]
+        instance._previous = sender.objects.filter(pk=instance.pk).values(*fields).first() or {}
+
+
+@receiver(pre_save, sender=Photo)
+@receiver(pre_save, sender=Album)
+@receiver(pre_save, sender=Student)
+def media_measuring(sender, instance, update_fields=None, **kwargs):
+    # After previous_values, which records the names being replaced
+    previous = getattr(instance, '_previous', {})
+    for field, name in _media_names(instance).items():
+        if update_fields is not None and field not in update_fields:
+            continue
+        prefix = imagemeta.prefix_for(sender, field)
+        changed = name != (previous.get(field) or '')
+        if not name:
+            meta = None
+        elif changed or getattr(instance, f'{prefix}_width') is None:
+            meta = imagemeta.measure_fieldfile(getattr(instance, field))
+            if meta is None and not changed:
+                continue
+        else:
+            continue
+        for column, value in imagemeta.values(prefix, meta).items():
+            setattr(instance, column, value)
+
+
+@receiver(post_save, sender=Photo)
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Student)
+def media_saved(sender, instance, **kwargs):
+    deltas = Counter()
+    previous = getattr(instance, '_previous', {})
+    for field, name in _media_names(instance).items():
+        if name != (previous.get(field) or ''):
+            deltas[name] += 1
+            deltas[previous.get(field) or ''] -= 1
+    storage.adjust_references(deltas)
+
+
+def _released(instance):
+    return Counter({name: -1 for name in _media_names(instance).values()})
+
+
+@receiver(pre_delete, sender=Photo)
+@receiver(pre_delete, sender=Album)
+@receiver(pre_delete, sender=Student)
+def media_releasing(sender, instance, origin=None, **kwargs):
+    if origin is not None:
+        _tally(origin, '_released', _released(instance))
+
+
+@receiver(post_delete, sender=Photo)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=Student)
+def media_released(sender, instance, origin=None, **kwargs):
+    storage.adjust_references(_released(instance) if origin is None else _take(origin, '_released'))
+
+
+@receiver(post_save, sender=Photo)
+def photo_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', {}).get('album_id')
+    versions = [f'album:{instance.album_id}', f'photo:{instance.pk}']
+    if created:
+        Album.adjust_photo_count(instance.album_id, 1)
+        versions.append('photo-counts')
+    elif previous is not None and previous != instance.album_id:
+        Album.adjust_photo_count(previous, -1)
+        Album.adjust_photo_count(instance.album_id, 1)
+        versions += [f'album:{previous}', 'photo-counts']
+    transaction.on_commit(lambda: caching.bump(*versions))
+
+
+def _album_deleted(origin):
+    # Its photos go with it, leaving no counter to keep
+    return isinstance(origin, Album) or getattr(origin, 'model', None) is Album
+
+
+@receiver(pre_delete, sender=Photo)
+def photo_deleting(sender, instance, origin=None, **kwargs):
+    if origin is not None and not _album_deleted(origin):
+        _tally(origin, '_photo_counts', {instance.album_id: -1})
+
+
+@receiver(post_delete, sender=Photo)
+def photo_deleted(sender, instance, origin=None, **kwargs):
+    # Also runs for each photo of a deleted student (cascade); the counts
+    # of every album losing photos are adjusted once, by the first of them
+    versions = [f'album:{instance.album_id}', f'photo:{instance.pk}', 'photo-counts']
+    transaction.on_commit(lambda: caching.bump(*versions))
+    if origin is None:
+        Album.adjust_photo_count(instance.album_id, -1)
+    elif not _album_deleted(origin):
+        Album.adjust_photo_counts(_take(origin, '_photo_counts'))
+
+
+@receiver(post_save, sender=Album)
+@receiver(post_delete, sender=Album)
+def album_changed(sender, instance, **kwargs):
+    versions = ['albums', f'album:{instance.pk}']
+    transaction.on_commit(lambda: caching.bump(*versions))
+
+
+@receiver(post_save, sender=Student)
+def student_counted(sender, instance, created, **kwargs):
+    current = (instance.department, instance.year)
+    stored = getattr(instance, '_previous', {})
+    previous = (stored['department'], stored['year']) if stored else None
+    if created:
+        stats.adjust(stats.student_deltas([(*current, 1)]))
+    elif previous is not None and previous != current:
+        deltas = stats.student_deltas([(*current, 1)])
+        deltas.update(stats.student_deltas([(*previous, 1)], -1))
+        stats.adjust(deltas)
+
+
+TOTAL_KEYS = {Album: 'albums', Photo: 'photos', SearchHistory: 'searches'}
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Photo)
+@receiver(post_save, sender=SearchHistory)
+def row_counted(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust({TOTAL_KEYS.get(sender, 'users'): 1})
+
+
+def _uncounted(sender, instance):
+    if sender is Student:
+        return stats.student_deltas([(instance.department, instance.year, 1)], -1)
+    return Counter({TOTAL_KEYS.get(sender, 'users'): -1})
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+@receiver(pre_delete, sender=Album)
+@receiver(pre_delete, sender=Photo)
+@receiver(pre_delete, sender=SearchHistory)
+@receiver(pre_delete, sender=Student)
+def row_uncounting(sender, instance, origin=None, **kwargs):
+    if origin is not None:
+        _tally(origin, '_uncounted', _uncounted(sender, instance))
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=Photo)
+@receiver(post_delete, sender=SearchHistory)
+@receiver(post_delete, sender=Student)
+def row_uncounted(sender, instance, origin=None, **kwargs):
+    if origin is None:
+        stats.adjust(_uncounted(sender, instance))
+    else:
+        stats.adjust(_take(origin, '_uncounted'))
@@ -0,0 +1,124 @@
+"""
+Incrementally maintained dashboard statistics.
+
+The admin dashboard used to COUNT(*) five tables on every load, and
+SearchHistory only ever grows. Instead each count is a Statistic row:
+
+    students, users, albums, photos, searches   table totals
+    students:<department>:<year>                students in each class
+
+The model signals adjust them as rows are created, moved and deleted;
+bulk paths (roster import, bulk reassign, photo uploads, the search
+history writer) call adjust() themselves. Photos per class need no
+counter of their own: albums are unique per (department, year) and
+already carry photo_count.
+
+Counters can still drift (a bulk write that forgot to adjust, a raw SQL
+fix, a lost race creating a row), so ``manage.py reconcile_stats``
+recounts everything from the tables and rewrites what differs; run it
+periodically.
+"""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F
+
+TOTALS = ('students', 'users', 'albums', 'photos', 'searches')
+
+
+def class_key(department, year):
+    return f'students:{department}:{year}'
+
+
+def student_deltas(rows, sign=1):
+    """Counter of total and class changes for (department, year, count) rows."""
+    deltas = Counter()
+    for department, year, count in rows:
+        deltas['students'] += sign * count
+        deltas[class_key(department, year)] += sign * count
+    return deltas
+
+
+def adjust(deltas):
+    """Apply ``{key: change}`` to the counters.
+
+    Usually one UPDATE per distinct change; a counter seen for the first
+    time is created.
+    """
+    from .models import Statistic
+
+    by_delta = {}
+    for key, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(key)
+    for delta, keys in by_delta.items():
+        updated = Statistic.objects.filter(key__in=keys).update(value=F('value') + delta)
+        if updated < len(keys):
+            existing = set(Statistic.objects.filter(key__in=keys).values_list('key', flat=True))
+            Statistic.objects.bulk_create(
+                [Statistic(key=key, value=delta) for key in keys if key not in existing],
+                ignore_conflicts=True,
+            )
+
+
+def count_all():
+    """Counter of every statistic, counted from the tables."""
+    from .models import Album, Photo, SearchHistory, Student
+
+    counts = Counter({key: 0 for key in TOTALS})
+    counts['users'] = get_user_model().objects.count()
+    counts['albums'] = Album.objects.count()
+    counts['photos'] = Photo.objects.count()
+    counts['searches'] = SearchHistory.objects.count()
+    classes = Student.objects.values_list('department', 'year').annotate(n=Count('id')).order_by()
+    counts.update(student_deltas(classes))
+    return counts
+
+
+def reconcile(dry_run=False):
+    """Rewrite every counter that differs from the tables.
+
+    Returns ``{key: (stored, actual)}`` for the counters that had drifted.
+    """
+    from .models import Statistic
+
+    with transaction.atomic():
+        actual = count_all()
+        stored = dict(Statistic.objects.values_list('key', 'value'))
+        drift = {key: (stored.get(key), value) for key, value in actual.items() if stored.get(key) != value}
+        # Classes nobody is in any more
+        drift.update({key: (value, 0) for key, value in stored.items() if key not in actual and value})
+        if not dry_run:
+            Statistic.objects.bulk_update(
+                [Statistic(key=key, value=value) for key, (old, value) in drift.items() if old is not None],
+                ['value'], batch_size=500,
+            )
+            Statistic.objects.bulk_create(
+                [Statistic(key=key, value=value) for key, (old, value) in drift.items() if old is None],
+                batch_size=500,
+            )
+    return drift
+
+
+def dashboard():
+    """(totals, classes) for the admin dashboard, in two queries.
+
+    ``classes`` lists department, year, students and photos for every
+    class with students or an album.
+    """
+    from .models import Album, Statistic
+
+    values = dict(Statistic.objects.values_list('key', 'value'))
+    totals = {key: values.get(key, 0) for key in TOTALS}
+    classes = {}
+    for key, value in values.items():
+        if key.startswith('students:') and value:
+            _prefix, department, year = key.split(':', 2)
+            classes[department, year] = {'department': department, 'year': year,
+                                         'students': value, 'photos': 0}
+    for department, year, photos in Album.objects.values_list('department', 'year', 'photo_count'):
+        row = classes.setdefault((department, year), {'department': department, 'year': year,
+                                                      'students': 0, 'photos': 0})
+        row['photos'] += photos
+    return totals, [classes[key] for key in sorted(classes)]
@@ -0,0 +1,152 @@
+"""
+Content-addressed, deduplicated storage for uploaded images.
+
+ContentAddressedStorage names every upload by the SHA-256 of its bytes:
+``blobs/ab/cd/abcd....jpg``. The upload is hashed in one read pass before
+anything is written; if a blob with that digest already exists the write
+is skipped and the existing name returned, so the same class photo added
+to five albums is stored (and its renditions generated) once. Renditions
+live beside their blob; replace() writes them to their fixed names.
+
+MediaBlob.references counts the rows pointing at each blob. The model
+signals keep it current for single saves and deletes; bulk paths call
+adjust_references() themselves, and recount_references() rebuilds it from
+the tables. ``manage.py collect_media_garbage`` deletes blobs nobody
+references. Files saved before this storage existed keep their original
+names and are left alone.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+BLOB_DIR = 'blobs'
+
+# A blob, not one of its renditions: blobs/ab/cd/<64 hex digits><.ext>
+BLOB_NAME = re.compile(rf'^{BLOB_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.[A-Za-z0-9]+)?$')
+
+
+def is_blob(name):
+    return bool(name) and BLOB_NAME.match(name) is not None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def blob_name(self, digest, original_name):
+        ext = posixpath.splitext(original_name)[1].lower()
+        return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def _save(self, name, content):
+        if name.startswith(f'{BLOB_DIR}/'):
+            # A rendition (or other derivative) of an existing blob
+            return self.replace(name, content)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        name = self.blob_name(digest.hexdigest(), name)
+        if self.exists(name):
+            # Fresh mtime keeps a reused blob out of the garbage collector's
+            # grace window until the row pointing at it is saved
+            os.utime(self.path(name))
+            return name
+        # A concurrent upload of the same bytes can only replace it with itself
+        return self.replace(name, content)
+
+    def replace(self, name, content):
+        """Write ``content`` to exactly ``name``, replacing any file there.
+
+        The file is written beside the target and renamed into place, so
+        readers only ever see a whole file and concurrent writers race to
+        one name; unlike save(), a taken name is never suffixed.
+        """
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    out.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+def media_storage():
+    """Storage for the image fields (a callable keeps it out of migrations)."""
+    return _storage
+
+
+_storage = ContentAddressedStorage()
+
+
+def media_fields():
+    """(model, field name) for every image field stored as blobs."""
+    from django.apps import apps
+
+    from .renditions import FIELD_RENDITIONS
+
+    return [(apps.get_model('yearbook', model), field) for model, field in FIELD_RENDITIONS]
+
+
+def adjust_references(deltas):
+    """Apply ``{blob name: change}`` to MediaBlob.references.
+
+    Names that are not blobs (older uploads, empty fields) are ignored.
+    """
+    from .models import MediaBlob
+
+    deltas = Counter({name: delta for name, delta in deltas.items() if delta and is_blob(name)})
+    if not deltas:
+        return
+    with transaction.atomic():
+        existing = set(MediaBlob.objects.filter(name__in=deltas).values_list('name', flat=True))
+        MediaBlob.objects.bulk_create([
+            MediaBlob(name=name, references=max(delta, 0))
+            for name, delta in deltas.items() if name not in existing
+        ])
+        by_delta = {}
+        for name in existing:
+            by_delta.setdefault(deltas[name], []).append(name)
+        for delta, names in by_delta.items():
+            MediaBlob.objects.filter(name__in=names).update(references=F('references') + delta)
+
+
+def count_references():
+    """Counter of blob name -> rows referencing it, read from the tables."""
+    counts = Counter()
+    for model, field in media_fields():
+        names = model.objects.filter(**{f'{field}__startswith': f'{BLOB_DIR}/'}).values_list(field, flat=True)
+        counts.update(name for name in names.iterator() if is_blob(name))
+    return counts
+
+
+def recount_references():
+    """Rebuild MediaBlob.references from the tables; returns blobs counted."""
+    from .models import MediaBlob
+
+    counts = count_references()
+    with transaction.atomic():
+        stored = dict(MediaBlob.objects.values_list('name', 'references'))
+        orphaned = [name for name, total in stored.items() if total and name not in counts]
+        for start in range(0, len(orphaned), 500):
+            MediaBlob.objects.filter(name__in=orphaned[start:start + 500]).update(references=0)
+        MediaBlob.objects.bulk_update([
+            MediaBlob(name=name, references=total)
+            for name, total in counts.items() if name in stored and stored[name] != total
+        ], ['references'], batch_size=500)
+        MediaBlob.objects.bulk_create([
+            MediaBlob(name=name, references=total) for name, total in counts.items() if name not in stored
+        ], batch_size=500)
+    return len(counts)
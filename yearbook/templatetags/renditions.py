@@ -0,0 +1,34 @@
+from django import template
+from django.utils.html import format_html
+
+from .. import imagemeta, renditions
+
+register = template.Library()
+
+
+@register.filter
+def rendition(fieldfile, name):
+    """Usage: ``<img src="{{ photo.image|rendition:'thumb' }}">``"""
+    return renditions.url(fieldfile, name)
+
+
+@register.filter
+def image_attrs(fieldfile, name):
+    """Size and placeholder attributes for a rendition's <img>.
+
+    Usage: ``<img src="{{ photo.image|rendition:'thumb' }}" {{ photo.image|image_attrs:'thumb' }}>``
+
+    width and height let the browser reserve the space before the image
+    arrives; the dominant colour and blurred placeholder fill it meanwhile.
+    Empty until the image has been measured.
+    """
+    meta = imagemeta.stored(fieldfile) if fieldfile else None
+    if meta is None:
+        return ''
+    width, height = renditions.rendition_size(meta['width'], meta['height'], name)
+    if meta['placeholder']:
+        return format_html(
+            'width="{}" height="{}" style="background: {} url({}) center / cover no-repeat;"',
+            width, height, meta['color'], meta['placeholder'],
+        )
+    return format_html('width="{}" height="{}"', width, height)
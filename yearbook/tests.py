@@ -1,3 +1,1741 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import (AsyncClient, LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from . import names, routers, urls
+from .models import Album, Photo, PhotoUploadJob, SearchHistory, Student
+from .querybudget import QueryBudgetTestMixin, QueryRecorder, budget_for
+from .queryplan import QueryPlanTestMixin
+
+
+# Keep tests away from the shared on-disk cache, and write search history
+# inline rather than from a thread outside the test transaction
+TEST_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    'SEARCH_HISTORY_BUFFER': False,
+}
+
+
+# Plan steps each view may run without an index, and why
+PLAN_ALLOW = {
+    # Unfiltered lists page through students in id (rowid) order
+    'admin_student_list': [r'^SCAN yearbook_student$'],
+    'student_dashboard': [r'^SCAN yearbook_student$'],
+    # Full-text matches are ordered by rank
+    'search_all': [r'TEMP B-TREE FOR ORDER BY'],
+    'dashboard': [r'^SCAN yearbook_student$', r'TEMP B-TREE FOR ORDER BY'],
+    # Loads every student into the typeahead index
+    'search_students': [r'^SCAN yearbook_student$'],
+    # Every student in a form dropdown
+    'admin_photo_add': [r'^SCAN yearbook_student$', r'TEMP B-TREE FOR ORDER BY'],
+    # Reads every counter; one row per total and per class
+    'admin_dashboard': [r'^SCAN yearbook_statistic$'],
+    # Sums and ranks the window's rollups, found through the (day, ...) index
+    'admin_search_report': [r'TEMP B-TREE FOR GROUP BY', r'TEMP B-TREE FOR ORDER BY'],
+}
+
+
+def make_students(count, prefix='S'):
+    students = []
+    for i in range(count):
+        user = User.objects.create(username=f'{prefix}{i:04d}')
+        students.append(Student.objects.create(
+            user=user,
+            first_name=f'First{i}',
+            last_name=f'Last{i}',
+            school_id=f'{prefix}{i:04d}',
+            email=f'{prefix.lower()}{i}@example.com',
+            department='BSIT',
+            year='2024',
+            block='A',
+            section='1',
+        ))
+    return students
+
+
+@override_settings(**TEST_SETTINGS)
+class QueryBudgetTests(QueryBudgetTestMixin, QueryPlanTestMixin, TestCase):
+    """Every route in yearbook/urls.py must stay within its query budget,
+    the budget must not grow with the number of rows on the page, and its
+    queries must be served by indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.students = make_students(15)
+        cls.album = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+        for student in cls.students:
+            Photo.objects.create(album=cls.album, student=student, image='albums/photos/p.jpg',
+                                 caption='Portrait', uploaded_by=cls.admin)
+        cls.photo = cls.album.photos.first()
+        for i in range(5):
+            SearchHistory.objects.create(user=cls.admin, search_query=f'first{i}')
+        cls.job = PhotoUploadJob.objects.create(album=cls.album, uploaded_by=cls.admin,
+                                                staging_dir='/nonexistent', total=1)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def url_kwargs(self, pattern):
+        values = {
+            'album_id': self.album.id,
+            'photo_id': self.photo.id,
+            'student_id': self.students[0].id,
+            'job_id': self.job.id,
+            'path': self.photo.image.name,
+        }
+        return {name: values[name] for name in pattern.pattern.converters}
+
+    def test_every_route_has_a_budget(self):
+        from django.conf import settings
+        missing = [p.name for p in urls.urlpatterns if p.name not in settings.QUERY_BUDGETS]
+        self.assertEqual(missing, [])
+
+    def test_routes_within_budget(self):
+        for pattern in urls.urlpatterns:
+            if pattern.name == 'logout':
+                continue
+            with self.subTest(view=pattern.name):
+                url = reverse(pattern.name, kwargs=self.url_kwargs(pattern))
+                self.assertQueryBudget(url, pattern.name)
+
+    def test_writes_within_budget(self):
+        student = self.students[0]
+        fields = {'first_name': 'Ana', 'middle_name': '', 'last_name': 'Santos', 'department': 'BSIT',
+                  'year': '2024', 'block': 'A', 'section': '1', 'achievements': ''}
+        writes = [
+            ('admin_student_add', reverse('admin_student_add'),
+             {**fields, 'school_id': 'W0001', 'email': 'w1@example.com'}),
+            ('admin_student_edit', reverse('admin_student_edit', args=[student.id]),
+             {**fields, 'school_id': student.school_id, 'email': student.email}),
+            ('admin_bulk_operations', reverse('admin_bulk_operations'),
+             {'action': 'honor_roll', 'selected_students': str(student.id)}),
+            ('admin_album_add', reverse('admin_album_add'),
+             {'title': 'Class of 2025', 'description': '', 'department': 'BSIT', 'year': '2025'}),
+            ('admin_album_edit', reverse('admin_album_edit', args=[self.album.id]),
+             {'title': 'Class of 2024', 'description': 'Renamed', 'department': 'BSIT', 'year': '2024',
+              'is_active': 'on'}),
+            ('admin_photo_bulk_operations', reverse('admin_photo_bulk_operations', args=[self.album.id]),
+             {'action': 'feature', 'selected_photos': str(self.photo.id)}),
+            ('admin_photo_delete', reverse('admin_photo_delete', args=[self.photo.id]), {}),
+            ('admin_student_delete', reverse('admin_student_delete', args=[self.students[1].id]), {}),
+            ('admin_album_delete', reverse('admin_album_delete', args=[self.album.id]), {}),
+        ]
+        for name, url, data in writes:
+            with self.subTest(view=name):
+                response = self.assertQueryBudget(url, name, method='post', data=data)
+                self.assertEqual(response.status_code, 302)
+
+    def test_deletes_do_not_grow_with_rows(self):
+        def album_with_photos(count):
+            album = Album.objects.create(title=f'{count} photos', department='DEL', year=str(count))
+            for i in range(count):
+                digest = f'{count:02x}{i:02x}'.ljust(64, '0')
+                Photo.objects.create(album=album, student=self.students[i % 5],
+                                     image=f'blobs/{digest[:2]}/{digest[2:4]}/{digest}.jpg',
+                                     uploaded_by=self.admin)
+            return album
+
+        def student_with_photos(count, school_id):
+            student = make_students(1, prefix=school_id)[0]
+            albums = [Album.objects.create(title=f'{school_id} {i}', department=school_id, year=str(i))
+                      for i in range(2)]
+            for i in range(count):
+                Photo.objects.create(album=albums[i % 2], student=student, image='albums/photos/p.jpg',
+                                     uploaded_by=self.admin)
+            return student
+
+        for name, make in [('admin_album_delete', album_with_photos),
+                           ('admin_student_delete', lambda n: student_with_photos(n, f'D{n}'))]:
+            counts = []
+            for size in (2, 12):
+                row = make(size)
+                with QueryRecorder() as recorder:
+                    response = self.client.post(reverse(name, args=[row.id]))
+                self.assertEqual(response.status_code, 302)
+                counts.append(recorder.count)
+            with self.subTest(view=name):
+                self.assertEqual(counts[0], counts[1], counts)
+                self.assertLessEqual(counts[1], budget_for(name, 'POST'))
+
+    def test_routes_use_indexes(self):
+        for pattern in urls.urlpatterns:
+            if pattern.name == 'logout':
+                continue
+            with self.subTest(view=pattern.name):
+                cache.clear()
+                url = reverse(pattern.name, kwargs=self.url_kwargs(pattern))
+                self.assertIndexedQueries(url, allow=PLAN_ALLOW.get(pattern.name, ()))
+
+    def test_media_checks_use_indexes(self):
+        # Staff skip the access check, so run it as a student
+        viewer = User.objects.create_user('viewer', 'viewer@example.com', 'pw')
+        self.client.force_login(viewer)
+        blob = 'blobs/ab/cd/' + 'ab' * 32
+        for name in ['albums/photos/p.jpg', 'albums/photos/p.thumb.webp', blob + '.jpg', blob + '.thumb.webp']:
+            with self.subTest(name=name):
+                url = reverse('media_file', kwargs={'path': name})
+                self.assertIndexedQueries(url)
+                self.assertQueryBudget(url, 'media_file')
+
+    def test_filtered_lists_use_indexes(self):
+        for url in [
+            reverse('admin_student_list') + '?department=BSIT&year=2024',
+            reverse('admin_student_list') + '?department=BSIT&year=2024&block=A&section=1',
+            reverse('student_dashboard') + '?department=BSIT&year=2024',
+        ]:
+            with self.subTest(url=url):
+                cache.clear()
+                self.assertIndexedQueries(url)
+
+    def test_listings_do_not_grow_with_rows(self):
+        pages = {
+            'album_detail': reverse('album_detail', args=[self.album.id]),
+            'admin_student_list': reverse('admin_student_list'),
+            'student_dashboard': reverse('student_dashboard'),
+            'admin_photo_list': reverse('admin_photo_list', args=[self.album.id]),
+            'admin_album_list': reverse('admin_album_list'),
+            'search_all': reverse('search_all') + '?q=first',
+        }
+        before = {}
+        for name, url in pages.items():
+            cache.clear()
+            with QueryRecorder() as recorder:
+                self.client.get(url)
+            before[name] = recorder.count
+        for student in make_students(5, prefix='T'):
+            Photo.objects.create(album=self.album, student=student, image='albums/photos/p.jpg',
+                                 uploaded_by=self.admin)
+        Album.objects.create(title='Class of 2025', department='BSIT', year='2025')
+        for name, url in pages.items():
+            with self.subTest(view=name):
+                cache.clear()
+                with QueryRecorder() as recorder:
+                    self.client.get(url)
+                self.assertEqual(recorder.count, before[name], recorder.summary())
+
+    def test_album_pages_cached_until_changed(self):
+        url = reverse('album_detail', args=[self.album.id])
+        other = reverse('album_detail', args=[Album.objects.create(
+            title='Other', department='STEM', year='2024').id])
+        cache.clear()
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(other)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'hit')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Photo.objects.create(album=self.album, image='albums/photos/p.jpg', uploaded_by=self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, f'{self.album.photos.count()} photos')
+        self.assertEqual(self.client.get(other)['X-Page-Cache'], 'hit')
+
+
+@override_settings(**TEST_SETTINGS)
+class DatasetAndBenchmarkTests(TestCase):
+
+    def test_generate_dataset_and_benchmark(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            call_command('generate_dataset', students=30, albums=2, photos=60, searches=20,
+                         users=3, images=1, seed=1, stdout=StringIO())
+            self.assertEqual(Student.objects.count(), 30)
+            self.assertEqual(Photo.objects.count(), 60)
+            self.assertEqual(sum(Album.objects.values_list('photo_count', flat=True)), 60)
+
+            User.objects.create_superuser('bench', 'bench@example.com', 'pw')
+            output = os.path.join(media, 'bench.json')
+            call_command('benchmark_urls', requests=2, warmup=0, output=output,
+                         route=['album_detail', 'search_all'], stdout=StringIO())
+            with open(output) as f:
+                report = json.load(f)
+        self.assertEqual(set(report['routes']), {'album_detail', 'search_all'})
+        self.assertEqual(report['routes']['album_detail']['status'], [200])
+        self.assertIn('p95_ms', report['routes']['search_all'])
+
+    def test_name_matching_stays_under_a_millisecond(self):
+        # Raises CommandError if any query's p95 is over --max-ms
+        out = StringIO()
+        call_command('benchmark_names', students=100_000, repeat=200, max_ms=1.0, stdout=out)
+        self.assertIn('maria dela crus', out.getvalue())
+
+
+@override_settings(**TEST_SETTINGS)
+class ServerBenchmarkTests(LiveServerTestCase):
+
+    def test_benchmark_asgi_over_http(self):
+        Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+        User.objects.create_superuser('bench', 'bench@example.com', 'pw')
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('benchmark_asgi', requests=4, concurrency=2, warmup=1, output=output,
+                         wsgi_url=self.live_server_url, route=['album_list', 'search_students'],
+                         stdout=StringIO())
+            with open(output) as f:
+                report = json.load(f)
+        self.assertEqual(report['harness'], 'http')
+        self.assertEqual(report['servers'], {'wsgi': self.live_server_url})
+        # The session from --user logs the clients in
+        self.assertEqual(report['routes']['album_list']['wsgi']['status'], [200])
+        self.assertEqual(report['routes']['search_students']['wsgi']['status'], [200])
+        self.assertNotIn('asgi', report['routes']['album_list'])
+
+
+@override_settings(**TEST_SETTINGS, EXPORT_CHUNK_SIZE=3)
+class StudentExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.students = make_students(10)
+        Student.objects.filter(id__in=[s.id for s in cls.students[:4]]).update(department='STEM')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def export(self, **data):
+        response = self.client.post(reverse('admin_bulk_operations'), {'action': 'export', **data})
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_of_checked_students(self):
+        ids = ','.join(str(s.id) for s in self.students[:3])
+        response, content = self.export(selected_students=ids, format='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = content.decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'School ID')
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['S0000', 'S0001', 'S0002'])
+
+    def test_xlsx_of_filtered_students(self):
+        response, content = self.export(scope='filtered', department='STEM', format='xlsx')
+        self.assertIn('.xlsx', response['Content-Disposition'])
+        with zipfile.ZipFile(BytesIO(content)) as workbook:
+            self.assertIsNone(workbook.testzip())
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 5)
+        self.assertIn('S0003', sheet)
+        self.assertNotIn('S0004', sheet)
+
+    def test_formulas_neutralized(self):
+        student = self.students[0]
+        Student.objects.filter(pk=student.pk).update(first_name='=HYPERLINK("http://x.test")',
+                                                     last_name='+1', achievements='@SUM(A1)')
+        _response, content = self.export(selected_students=str(student.id), format='csv')
+        row = next(csv.reader(StringIO(content.decode('utf-8-sig').splitlines()[1])))
+        self.assertEqual(row[1:3], ["'+1", "'=HYPERLINK(\"http://x.test\")"])
+        self.assertEqual(row[9], "'@SUM(A1)")
+
+        _response, content = self.export(selected_students=str(student.id), format='xlsx')
+        with zipfile.ZipFile(BytesIO(content)) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn(">'=HYPERLINK(", sheet)
+        self.assertIn(">'@SUM(A1)<", sheet)
+        self.assertNotIn('>=', sheet)
+
+
+@override_settings(**TEST_SETTINGS, ROSTER_IMPORT_BATCH_SIZE=2)
+class RosterImportTests(TestCase):
+    ROSTER = (
+        'school_id,first_name,last_name,email,department,year,block,section\n'
+        'R001,Ana,Santos,ana@example.com,BSIT,2024,A,1\n'
+        'R002,Jose,Reyes,jose@example.com,STEM,2025,B,2\n'
+        'R003,Mark,Cruz,not-an-email,ARTS,2024,A,1\n'
+        'S0000,Renamed,Last0,s0@example.com,BSIT,2024,A,1\n'
+        'R001,Ana,Duplicate,ana@example.com,BSIT,2024,A,1\n'
+        'R004,Joy,Lim,joy@example.com,ABM,2023,C,3\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.existing = make_students(1)[0]
+
+    def test_command_upserts_and_reports_bad_rows(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.ROSTER)
+        self.addCleanup(os.remove, f.name)
+        err = StringIO()
+        call_command('import_roster', f.name, stdout=StringIO(), stderr=err)
+
+        self.assertEqual(set(Student.objects.values_list('school_id', flat=True)),
+                         {'S0000', 'R001', 'R002', 'R004'})
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.first_name, 'Renamed')
+        self.assertIsNotNone(self.existing.user_id)
+        self.assertEqual(Student.objects.get(school_id='R001').last_name, 'Santos')
+        errors = err.getvalue()
+        self.assertIn('Line 4:', errors)
+        self.assertIn("unknown department 'ARTS'", errors)
+        self.assertIn('Line 6: school_id R001 repeats line 2', errors)
+
+    def test_admin_upload_dry_run_saves_nothing(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.force_login(self.admin)
+        upload = SimpleUploadedFile('roster.csv', self.ROSTER.encode(), content_type='text/csv')
+        response = self.client.post(reverse('admin_student_import'),
+                                    {'roster': upload, 'dry_run': 'on'})
+        self.assertContains(response, 'Dry run: 3 created, 1 updated, 0 unchanged')
+        self.assertContains(response, 'not a valid email')
+        self.assertEqual(Student.objects.count(), 1)
+
+
+@override_settings(**TEST_SETTINGS)
+class BulkActionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.students = make_students(6)
+        cls.album = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+        cls.photos = [Photo.objects.create(album=cls.album, image='albums/photos/p.jpg',
+                                           uploaded_by=cls.admin) for _ in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def post_students(self, action, students, **data):
+        ids = ','.join(str(s.id) for s in students)
+        return self.client.post(reverse('admin_bulk_operations'),
+                                {'action': action, 'selected_students': ids, **data})
+
+    def test_honor_roll_is_one_update_and_not_repeated(self):
+        Student.objects.filter(id=self.students[0].id).update(achievements='Dean\'s Lister')
+        with QueryRecorder() as recorder:
+            self.post_students('honor_roll', self.students[:4])
+        updates = [sql for _alias, sql, _seconds in recorder.queries if sql.startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.post_students('honor_roll', self.students[:4])
+        self.assertEqual(Student.objects.get(id=self.students[0].id).achievements,
+                         "Honor Roll Student - Dean's Lister")
+        self.assertEqual(Student.objects.filter(achievements__startswith='Honor Roll').count(), 4)
+
+    def test_reassign_only_given_fields(self):
+        response = self.post_students('reassign', self.students[:2], new_department='STEM', new_section='7',
+                                      department='BSIT')
+        self.assertRedirects(response, reverse('admin_student_list'))
+        moved = Student.objects.filter(id__in=[s.id for s in self.students[:2]])
+        self.assertEqual(set(moved.values_list('department', 'year', 'block', 'section')),
+                         {('STEM', '2024', 'A', '7')})
+        self.post_students('reassign', self.students[:2], new_year='1999')
+        self.assertFalse(Student.objects.filter(year='1999').exists())
+
+    def test_album_and_photo_actions_invalidate_cached_pages(self):
+        url = reverse('album_detail', args=[self.album.id])
+        cache.clear()
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin_photo_bulk_operations', args=[self.album.id]),
+                             {'action': 'feature', 'selected_photos': [self.photos[0].id, self.photos[1].id]})
+        self.assertEqual(Photo.objects.filter(is_featured=True).count(), 2)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:yearbook_album_changelist'), {
+                'action': 'set_albums_active_active_False',
+                '_selected_action': [self.album.id],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_STICKY_SECONDS=15)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Routing decisions only; no query runs against the replica alias."""
+
+    def setUp(self):
+        self.router = routers.ReadReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False):
+        seen = {}
+
+        def view(request):
+            seen['before'] = self.router.db_for_read(Student)
+            seen['session'] = self.router.db_for_read(User)
+            if write:
+                self.router.db_for_write(SearchHistory)
+            seen['after'] = self.router.db_for_read(Photo)
+            return HttpResponse()
+
+        response = routers.ReplicaRoutingMiddleware(view)(request)
+        return seen, response
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Student), 'default')
+
+    def test_get_reads_yearbook_models_from_replica(self):
+        seen, response = self.route(self.factory.get('/albums/'))
+        self.assertEqual(seen, {'before': 'replica', 'session': 'default', 'after': 'replica'})
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+    def test_write_pins_request_and_following_requests(self):
+        seen, response = self.route(self.factory.get('/student-dashboard/'), write=True)
+        self.assertEqual((seen['before'], seen['after']), ('replica', 'default'))
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 15)
+
+        request = self.factory.get('/albums/')
+        request.COOKIES[routers.PIN_COOKIE] = response.cookies[routers.PIN_COOKIE].value
+        seen, _response = self.route(request)
+        self.assertEqual(seen['before'], 'default')
+
+    def test_post_uses_primary(self):
+        seen, _response = self.route(self.factory.post('/panel/bulk-operations/'))
+        self.assertEqual(seen['before'], 'default')
+
+    @override_settings(**TEST_SETTINGS)
+    def test_cache_fills_and_index_loads_read_from_primary(self):
+        from unittest import mock
+
+        from . import caching, typeahead
+
+        # The replica hasn't caught up with the new title yet
+        titles = {'default': 'New', 'replica': 'Old'}
+        seen = []
+
+        def validators(request, album_id):
+            seen.append(('validators', self.router.db_for_read(Album)))
+            return (album_id,), None
+
+        @caching.conditional_page(validators, 'album:{album_id}')
+        @caching.cache_page_versioned('album:{album_id}')
+        def album(request, album_id):
+            seen.append(('page', self.router.db_for_read(Album)))
+            return HttpResponse(titles[self.router.db_for_read(Album)])
+
+        def view(request):
+            response = album(request, album_id=1)
+            seen.append(('after', self.router.db_for_read(Album)))
+            return response
+
+        cache.clear()
+        caching.bump('album:1')
+        for expected in ('miss', 'hit'):
+            response = routers.ReplicaRoutingMiddleware(view)(self.factory.get('/albums/1/'))
+            self.assertEqual((response['X-Page-Cache'], response.content), (expected, b'New'))
+        self.assertEqual(seen, [('validators', 'default'), ('page', 'default'), ('after', 'replica'),
+                                ('validators', 'default'), ('after', 'replica')])
+
+        class Rows:
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self
+
+            def iterator(self, **kwargs):
+                loads.append(self.router.db_for_read(Student))
+                return iter([])
+
+        loads = []
+        Rows.router = self.router
+        with mock.patch.object(Student, 'objects', Rows()), routers.replica_reads():
+            typeahead.StudentPrefixIndex().load()
+        self.assertEqual(loads, ['default'])
+
+
+def image_upload(name, color):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(**TEST_SETTINGS)
+class MediaStorageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.albums = [Album.objects.create(title=f'Class of {year}', department='BSIT', year=year)
+                      for year in ('2023', '2024')]
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media = media.name
+
+    def test_duplicate_uploads_share_one_reference_counted_blob(self):
+        from .models import MediaBlob
+        from .storage import is_blob
+
+        photos = [Photo.objects.create(album=album, image=image_upload(f'class-{i}.jpg', 'red'),
+                                       uploaded_by=self.admin)
+                  for i, album in enumerate(self.albums)]
+        other = Photo.objects.create(album=self.albums[0], image=image_upload('other.jpg', 'blue'),
+                                     uploaded_by=self.admin)
+        name = photos[0].image.name
+        self.assertTrue(is_blob(name))
+        self.assertEqual(photos[1].image.name, name)
+        self.assertNotEqual(other.image.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).references, 2)
+
+        photos[0].delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).references, 1)
+        other.image = photos[1].image.name
+        other.save()
+        self.assertEqual(MediaBlob.objects.get(name=name).references, 2)
+        self.assertEqual(MediaBlob.objects.filter(references__gt=0).count(), 1)
+
+        out = StringIO()
+        call_command('collect_media_garbage', grace_hours=0, recount=True, stdout=out)
+        self.assertIn('Deleted 1 unreferenced blob', out.getvalue())
+        self.assertTrue(os.path.exists(photos[1].image.path))
+        self.assertEqual(len([f for _d, _s, files in os.walk(self.media) for f in files
+                              if f.startswith(os.path.basename(name).split('.')[0])]), 3)
+
+
+    def test_deletes_and_saves_batch_their_reference_updates(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from .models import MediaBlob
+
+        colors = ['red', 'green', 'blue', 'yellow']
+        photos = [Photo.objects.create(album=self.albums[0], image=image_upload(f'{color}.jpg', color),
+                                       uploaded_by=self.admin) for color in colors]
+        kept = Photo.objects.create(album=self.albums[1], image=photos[0].image.name, uploaded_by=self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            kept.album = self.albums[0]
+            kept.caption = 'Moved'
+            kept.save()
+        # One read of the stored row serves every pre_save receiver
+        reads = [q for q in queries.captured_queries if q['sql'].startswith('SELECT "yearbook_photo"')]
+        self.assertEqual(len(reads), 1)
+
+        kept.album = self.albums[1]
+        kept.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.albums[0].delete()
+        writes = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "yearbook_mediablob"')]
+        self.assertEqual(len(writes), 1)
+        references = dict(MediaBlob.objects.values_list('name', 'references'))
+        self.assertEqual(references.pop(photos[0].image.name), 1)
+        self.assertEqual(set(references.values()), {0})
+
+
+@override_settings(**TEST_SETTINGS)
+class MediaServingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.user = User.objects.create_user('viewer', 'viewer@example.com', 'pw')
+        cls.active = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+        cls.hidden = Album.objects.create(title='Drafts', department='BSIT', year='2023', is_active=False)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.photo = Photo.objects.create(album=self.active, image=image_upload('a.jpg', 'red'),
+                                          uploaded_by=self.admin)
+        self.draft = Photo.objects.create(album=self.hidden, image=image_upload('b.jpg', 'blue'),
+                                          uploaded_by=self.admin)
+        self.client.force_login(self.user)
+
+    def url(self, name):
+        return reverse('media_file', kwargs={'path': name})
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_access_follows_album_visibility(self):
+        from .renditions import rendition_name
+
+        self.assertEqual(self.client.get(self.url(self.photo.image.name)).status_code, 200)
+        thumb = rendition_name(self.photo.image.name, 'thumb')
+        self.assertEqual(self.client.get(self.url(thumb)).status_code, 200)
+        self.assertEqual(self.client.get(self.url(self.draft.image.name)).status_code, 404)
+        self.assertEqual(self.client.get(self.url('../settings.py')).status_code, 404)
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(self.url(self.draft.image.name)).status_code, 200)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url(self.photo.image.name)).status_code, 302)
+
+    def test_renditions_of_every_image_field(self):
+        from .renditions import rendition_name
+
+        self.active.cover_photo = image_upload('cover.png', 'green')
+        self.active.save()
+        student = make_students(1)[0]
+        student.profile_photo = image_upload('me.jpg', 'yellow')
+        student.save()
+        visible = {self.photo.image.name: ('thumb', 'lightbox'), self.active.cover_photo.name: ('thumb',),
+                   student.profile_photo.name: ('avatar',)}
+        for name, generated in visible.items():
+            with self.subTest(name=name):
+                # Session, user, then the original found through MediaBlob
+                served = [(name, 3)] + [(rendition_name(name, r), 4) for r in generated]
+                for served_name, queries in served:
+                    with self.assertNumQueries(queries):
+                        self.assertEqual(self.client.get(self.url(served_name)).status_code, 200)
+        for name in [self.draft.image.name, rendition_name(self.draft.image.name, 'thumb'),
+                     rendition_name(self.photo.image.name, 'thumb').replace('.thumb.', '.other.')]:
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(self.url(name)).status_code, 404)
+
+    def test_etag_and_ranges(self):
+        url = self.url(self.photo.image.name)
+        with open(self.photo.image.path, 'rb') as f:
+            data = f.read()
+
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(etag, '"%s"' % os.path.basename(self.photo.image.name).split('.')[0])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.body(response), data)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(data)}')
+        self.assertEqual(self.body(response), data[10:20])
+        response = self.client.get(url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(self.body(response), data[-5:])
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(data)}-')
+        self.assertEqual(response.status_code, 416)
+        # A stale If-Range gets the whole, current file
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_sendfile_hands_off_to_front_end(self):
+        url = self.url(self.photo.image.name)
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.client.get(url)
+            self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.photo.image.name)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(self.client.get(self.url(self.draft.image.name)).status_code, 404)
+        with self.settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.client.get(url)
+            self.assertEqual(response['X-Sendfile'], self.photo.image.path)
+
+
+@override_settings(**TEST_SETTINGS)
+class StatisticsTests(TestCase):
+
+    def assertInSync(self):
+        from . import stats
+        self.assertEqual(stats.reconcile(dry_run=True), {})
+
+    def test_counters_follow_signals_and_bulk_paths(self):
+        from . import bulk, history, roster, stats
+        from .models import Statistic
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        students = make_students(3)
+        album = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+        Photo.objects.create(album=album, student=students[0], image='albums/photos/p.jpg',
+                             uploaded_by=admin)
+        history.buffer.record(admin, 'first')
+        self.assertInSync()
+
+        students[0].year = '2023'
+        students[0].save()
+        bulk.reassign_students(Student.objects.filter(pk=students[1].pk), department='ABM')
+        errors = roster.import_roster(BytesIO(
+            b'school_id,first_name,last_name,email,department,year,block,section\n'
+            b'S0002,First2,Last2,s2@example.com,ABM,2024,A,1\n'
+            b'N0001,New,Student,new@example.com,BSIT,2024,A,1\n'
+        )).errors
+        self.assertEqual(errors, [])
+        self.assertInSync()
+        with override_settings(SEARCH_HISTORY_BUFFER=True):
+            history.buffer.record(admin, 'second')
+            history.buffer.flush()
+        self.assertInSync()
+
+        Student.objects.get(pk=students[2].pk).delete()
+        album.delete()
+        self.assertInSync()
+        totals, classes = stats.dashboard()
+        self.assertEqual(totals, {'students': 3, 'users': 4, 'albums': 0, 'photos': 0, 'searches': 2})
+        self.assertEqual([(c['department'], c['year'], c['students']) for c in classes],
+                         [('ABM', '2024', 1), ('BSIT', '2023', 1), ('BSIT', '2024', 1)])
+
+        Statistic.objects.filter(key='searches').update(value=99)
+        out = StringIO()
+        call_command('reconcile_stats', stdout=out)
+        self.assertIn('searches: 99 -> 2', out.getvalue())
+        self.assertInSync()
+
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(admin)
+        self.assertContains(self.client.get(reverse('admin_dashboard')), 'Students and Photos by Class')
+
+
+    def test_cascades_adjust_counters_once(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        students = make_students(6)
+        albums = [Album.objects.create(title=f'Class of {year}', department='BSIT', year=year)
+                  for year in ('2023', '2024')]
+        for student in students:
+            for album in albums:
+                Photo.objects.create(album=album, student=student, image='albums/photos/p.jpg',
+                                     uploaded_by=admin)
+        for delete in (students[0].delete, albums[0].delete, Student.objects.filter(pk__in=[
+                s.pk for s in students[1:4]]).delete):
+            with self.subTest(delete=delete), CaptureQueriesContext(connection) as queries:
+                delete()
+            statistic_writes = [q['sql'] for q in queries.captured_queries
+                                if q['sql'].startswith('UPDATE "yearbook_statistic"')]
+            # One UPDATE per distinct change, however many rows cascade
+            self.assertLessEqual(len(statistic_writes), 3, statistic_writes)
+            self.assertInSync()
+
+
+@override_settings(**TEST_SETTINGS)
+class AsyncViewTests(TestCase):
+    """The async views through the async (ASGI) handler and middleware."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', 'viewer@example.com', 'pw')
+        cls.students = make_students(3)
+        cls.album = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+        cls.hidden = Album.objects.create(title='Drafts', department='BSIT', year='2023', is_active=False)
+        for student in cls.students:
+            Photo.objects.create(album=cls.album, student=student, image='albums/photos/p.jpg',
+                                 uploaded_by=cls.user)
+
+    def setUp(self):
+        # A warm worker; the name index is loaded once per process
+        cache.clear()
+        names.name_index.load()
+
+    async def test_views(self):
+        client = AsyncClient()
+        response = await client.get(reverse('album_list'))
+        self.assertEqual(response.status_code, 302)
+        await client.aforce_login(self.user)
+
+        response = await client.get(reverse('search_students'), {'q': 'first1'})
+        self.assertEqual([r['school_id'] for r in response.json()['results']], ['S0001'])
+        response = await client.get(reverse('search_all'), {'q': 'class'})
+        self.assertContains(response, 'Class of 2024')
+        self.assertNotContains(response, 'Drafts')
+        response = await client.get(reverse('album_list'))
+        self.assertContains(response, 'Class of 2024')
+        response = await client.get(reverse('album_detail', args=[self.album.id]))
+        self.assertContains(response, 'Last1')
+        response = await client.get(reverse('album_detail', args=[self.hidden.id]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_query_budget_middleware_counts_async_queries(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        with self.settings(DEBUG=True):
+            response = await client.get(reverse('album_detail', args=[self.album.id]))
+        # Session, user, the ETag validators, album and one page of photos
+        self.assertEqual(response['X-DB-Queries'], '5')
+
+
+@override_settings(**TEST_SETTINGS)
+class ImageMetadataTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.album = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_measured_on_save_and_backfilled(self):
+        from django.template import Context, Template
+
+        photo = Photo.objects.create(album=self.album, image=image_upload('a.jpg', 'red'),
+                                     uploaded_by=self.admin)
+        photo.refresh_from_db()
+        self.assertEqual((photo.image_width, photo.image_height), (64, 48))
+        self.assertEqual(photo.image_bytes, photo.image.size)
+        self.assertRegex(photo.image_color, r'^#f[0-9a-f]0[0-9a-f]0[0-9a-f]$')
+        self.assertTrue(photo.image_placeholder.startswith('data:image/'))
+
+        html = Template("{% load renditions %}{{ photo.image|image_attrs:'lightbox' }}").render(
+            Context({'photo': photo}))
+        self.assertTrue(html.startswith('width="64" height="48" style="background: #f'))
+
+        Photo.objects.update(image_width=None, image_placeholder=None)
+        out = StringIO()
+        call_command('backfill_image_metadata', workers=1, stdout=out)
+        self.assertIn('Photo.image: measured 1', out.getvalue())
+        photo.refresh_from_db()
+        self.assertEqual(photo.image_width, 64)
+        self.assertTrue(photo.image_placeholder)
+
+        self.album.cover_photo = photo.image.name
+        self.album.save()
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.cover_height, 48)
+        self.album.cover_photo = None
+        self.album.save()
+        self.album.refresh_from_db()
+        self.assertIsNone(self.album.cover_width)
+
+
+@override_settings(**TEST_SETTINGS)
+class FragmentCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.students = make_students(5)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def stats(self):
+        return self.client.get(reverse('admin_cache_stats')).json()['fragments']
+
+    def test_only_changed_students_are_rendered(self):
+        from . import bulk
+
+        self.assertContains(self.client.get(reverse('admin_student_list')), 'First4')
+        self.assertEqual(self.stats(), {'hits': 0, 'misses': 5, 'hit_rate': 0.0})
+        self.client.get(reverse('admin_student_list'))
+        self.assertEqual(self.stats()['hits'], 5)
+
+        student = self.students[0]
+        student.first_name = 'Renamed'
+        student.save()
+        bulk.reassign_students(Student.objects.filter(pk=self.students[1].pk), section='9')
+        response = self.client.get(reverse('admin_student_list'))
+        self.assertContains(response, 'Renamed')
+        self.assertContains(response, '<td>9</td>', html=True)
+        self.assertEqual(self.stats(), {'hits': 8, 'misses': 7, 'hit_rate': 0.5333})
+
+        # The dashboard's cards are separate fragments
+        self.assertContains(self.client.get(reverse('student_dashboard')), 'Renamed')
+        self.assertEqual(self.stats()['misses'], 12)
+
+
+@override_settings(**TEST_SETTINGS)
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', 'viewer@example.com', 'pw')
+        cls.students = make_students(2)
+        cls.album = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+        cls.photo = Photo.objects.create(album=cls.album, student=cls.students[0],
+                                         image='albums/photos/p.jpg', uploaded_by=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_album_page_revalidates(self):
+        from . import bulk
+
+        url = reverse('album_detail', args=[self.album.id])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        # No timestamp follows caption edits, featuring or renamed students
+        self.assertNotIn('Last-Modified', response)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE='Sun, 18 Oct 2099 00:00:00 GMT').status_code, 200)
+        # Another page of the same album
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # A new photo, a caption edit and a renamed student all change the ETag
+        for change in (
+            lambda: Photo.objects.create(album=self.album, student=self.students[1],
+                                         image='albums/photos/q.jpg', uploaded_by=self.user),
+            lambda: Photo.objects.filter(pk=self.photo.pk).first().save(),
+            lambda: bulk.set_photos_featured(Photo.objects.filter(pk=self.photo.pk), True),
+            lambda: Student.objects.get(pk=self.students[0].pk).save(),
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+
+    def test_photo_page_and_missing_pages(self):
+        url = reverse('photo_detail', args=[self.photo.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.album.title = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.album.save()
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=etag), 'Renamed')
+
+        self.album.is_active = False
+        self.album.save()
+        response = self.client.get(reverse('album_detail', args=[self.album.id]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(self.client.get(reverse('photo_detail', args=[0])).status_code, 404)
+
+
+@override_settings(**TEST_SETTINGS)
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.students = make_students(6)
+        cls.album = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_photos(self, students):
+        for student in students:
+            Photo.objects.create(album=self.album, student=student, image='albums/photos/p.jpg',
+                                 uploaded_by=self.admin)
+            SearchHistory.objects.create(user=self.admin, search_query=student.first_name)
+
+    def count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for name in ('admin:yearbook_photo_changelist', 'admin:yearbook_searchhistory_changelist'):
+            with self.subTest(name):
+                Photo.objects.all().delete()
+                SearchHistory.objects.all().delete()
+                self.add_photos(self.students[:2])
+                few = self.count_queries(reverse(name))
+                self.add_photos(self.students[2:])
+                self.assertEqual(self.count_queries(reverse(name)), few)
+
+    def test_estimated_count(self):
+        from django.db import connection
+
+        from .pagination import EstimatedCountPaginator, estimated_count
+
+        self.add_photos(self.students)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimated_count(SearchHistory), 6)
+
+        class Small(EstimatedCountPaginator):
+            threshold = 3
+
+        SearchHistory.objects.filter(search_query='First0').delete()
+        # Unfiltered: the (now stale) statistics, without a COUNT(*)
+        with self.assertNumQueries(2):
+            self.assertEqual(Small(SearchHistory.objects.all(), 2).count, 6)
+        self.assertEqual(EstimatedCountPaginator(SearchHistory.objects.all(), 2).count, 5)
+        self.assertEqual(Small(SearchHistory.objects.filter(search_query__startswith='First'), 2).count, 5)
+
+    def test_student_form_takes_a_username(self):
+        response = self.client.get(reverse('admin_user_lookup'), {'q': 'S000'})
+        self.assertEqual(response.json()['results'], [f'S{i:04d}' for i in range(6)])
+        self.assertEqual(self.client.get(reverse('admin_user_lookup'), {'q': 's000'}).json()['results'], [])
+
+        student = self.students[0]
+        user = User.objects.create(username='newaccount')
+        data = {
+            'user': 'newaccount', 'first_name': 'First0', 'last_name': 'Last0', 'school_id': student.school_id,
+            'email': student.email, 'department': 'BSIT', 'year': '2024', 'block': 'A', 'section': '1',
+        }
+        url = reverse('admin_student_edit', args=[student.id])
+        self.assertContains(self.client.get(url), f'value="{student.user.username}"')
+        self.client.post(url, data)
+        student.refresh_from_db()
+        self.assertEqual(student.user, user)
+        response = self.client.post(url, {**data, 'user': 'nobody'})
+        self.assertContains(response, 'There is no account with that username.')
+
+
+@override_settings(**TEST_SETTINGS)
+class SearchRetentionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def search(self, query, days_ago, search_type='student'):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        SearchHistory.objects.create(user=self.admin, search_query=query, search_type=search_type,
+                                     created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_rollup_prune_and_reports(self):
+        from . import searchlog, stats
+
+        for days_ago in (100, 100, 40, 3, 0):
+            self.search('Santos', days_ago)
+        self.search('  SANTOS ', 3)
+        self.search('reyes', 3)
+        self.search('class of 2024', 3, 'album')
+
+        # Nothing is deleted before it is rolled up
+        self.assertEqual(searchlog.prune(retention_days=1), 0)
+        self.assertEqual(searchlog.rollup(), 3)
+        self.assertEqual(searchlog.rollup(), 0)
+        self.assertEqual(searchlog.top_queries(days=30), [('santos', 2), ('class of 2024', 1), ('reyes', 1)])
+        self.assertEqual(searchlog.top_queries(days=30, search_type='album'), [('class of 2024', 1)])
+        trend = searchlog.trend(days=7, query='Santos')
+        self.assertEqual(len(trend), 7)
+        self.assertEqual(sum(n for _day, n in trend), 2)
+
+        call_command('prune_search_history', '--dry-run', stdout=StringIO())
+        self.assertEqual(SearchHistory.objects.count(), 8)
+        # Batches of one; today's search has not been rolled up
+        self.assertEqual(searchlog.prune(retention_days=30, batch_size=1), 3)
+        self.assertEqual(SearchHistory.objects.count(), 5)
+        self.assertEqual(searchlog.prune(retention_days=0), 4)
+        self.assertEqual(list(SearchHistory.objects.values_list('search_query', flat=True)), ['Santos'])
+        self.assertEqual(stats.reconcile(dry_run=True), {})
+        self.assertEqual(searchlog.top_queries(days=365)[0], ('santos', 5))
+
+    def test_report_view(self):
+        from . import searchlog
+
+        self.search('Santos', 2)
+        searchlog.rollup()
+        self.client.force_login(self.admin)
+        report = self.client.get(reverse('admin_search_report'), {'days': 'x'}).json()
+        self.assertEqual(report['days'], 30)
+        self.assertEqual(report['top_queries'], [{'query': 'santos', 'searches': 1}])
+        self.assertEqual(sum(day['searches'] for day in report['trend']), 1)
+
+
+@override_settings(**TEST_SETTINGS)
+class NameMatchingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        people = [('Ana', 'Santos'), ('José', 'Caño'), ('Mark', 'Dela Cruz'), ('Joy', 'Mendoza')]
+        for i, (first, last) in enumerate(people):
+            Student.objects.create(first_name=first, last_name=last, school_id=f'N{i:03d}',
+                                   email=f'n{i}@example.com', department='BSIT', year='2024',
+                                   block='A', section='1')
+
+    def setUp(self):
+        from . import typeahead
+
+        cache.clear()
+        names.name_index.load()
+        typeahead.student_index.load()
+
+    def last_names(self, students):
+        return [student.last_name for student in students]
+
+    def test_side_tables_written_on_save(self):
+        from .models import NameWord, StudentName
+
+        self.assertEqual(StudentName.objects.get(student__school_id='N001').folded, 'jose cano')
+        self.assertTrue(NameWord.objects.filter(word='cruz').exists())
+        student = Student.objects.get(school_id='N003')
+        with self.captureOnCommitCallbacks(execute=True):
+            student.last_name = 'Mendiola'
+            student.save()
+        self.assertEqual(student.name_key.folded, 'joy mendiola')
+        self.assertEqual([s for s, _ in names.name_index.match('mendiola')], [student.id])
+        self.assertEqual(names.name_index.match('mendoza'), [])
+
+    def test_typos_and_accents(self):
+        from . import search
+
+        index = names.name_index
+        self.assertEqual(index.match('cano')[0][1], 1.0)
+        self.assertEqual(self.last_names(search.search_students(Student.objects.all(), 'cano')), ['Caño'])
+        self.assertEqual(self.last_names(search.search_students(Student.objects.all(), 'santso')), ['Santos'])
+        self.assertEqual(self.last_names(search.search_students(Student.objects.all(), 'mark dela crus',
+                                                                search.STUDENT_BASIC_FIELDS)), ['Dela Cruz'])
+        # Every word must match some name
+        self.assertEqual(index.match('santso reyes'), [])
+        self.assertEqual(search.search_students(Student.objects.all(), 'zzqxv').count(), 0)
+
+    def test_other_workers_apply_logged_changes(self):
+        other = names.NameIndex()
+        other.load()
+        student = Student.objects.get(school_id='N003')
+        with self.captureOnCommitCallbacks(execute=True):
+            student.last_name = 'Mendiola'
+            student.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.get(school_id='N000').delete()
+        # Read from the log in the cache, without reloading
+        with self.settings(TYPEAHEAD_RESYNC_INTERVAL=0), self.assertNumQueries(0):
+            self.assertEqual([s for s, _ in other.match('mendiola')], [student.id])
+            self.assertEqual(other.match('santos'), [])
+        self.assertEqual(other.version, names.current_version())
+
+        # A bulk write bypasses the log; invalidate() makes every worker reload
+        Student.objects.filter(pk=student.pk).update(last_name='Mendez')
+        names.index_students([Student.objects.get(pk=student.pk)])
+        names.invalidate()
+        with self.settings(TYPEAHEAD_RESYNC_INTERVAL=0):
+            self.assertEqual([s for s, _ in other.match('mendes')], [student.id])
+
+    def test_rebuild_and_typeahead_fallback(self):
+        from .models import StudentName
+
+        StudentName.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(StudentName.objects.count(), 4)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('search_students'), {'q': 'mendosa'})
+        self.assertEqual([r['school_id'] for r in response.json()['results']], ['N003'])
+
+
+@override_settings(**TEST_SETTINGS)
+class FullTextSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.santos = Student.objects.create(first_name='Santos', last_name='Santos', school_id='F001',
+                                            email='f1@example.com', department='BSIT', year='2024')
+        cls.ana = Student.objects.create(first_name='Ana', middle_name='Reyes', last_name='Santos',
+                                         school_id='F002', email='ana.reyes@example.com',
+                                         department='BSIT', year='2024')
+        cls.john = Student.objects.create(first_name='John', last_name='Lim', school_id='F003',
+                                          email='f3@example.com', department='STEM', year='2025')
+        cls.album = Album.objects.create(title='Class of 2024', description='Graduation day',
+                                         department='BSIT', year='2024')
+
+    def setUp(self):
+        cache.clear()
+        names.name_index.load()
+
+    def indexed(self, expression):
+        from django.db import connection
+
+        from . import search
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {search.STUDENT_INDEX} WHERE {search.STUDENT_INDEX} MATCH %s',
+                           [expression])
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_ranking_and_prefixes(self):
+        from . import search
+
+        found = list(search.search_students(Student.objects.all(), 'santos'))
+        # Two mentions of the word outrank one
+        self.assertEqual(found, [self.santos, self.ana])
+        self.assertEqual(list(search.search_students(Student.objects.all(), 'jo')), [self.john])
+        self.assertEqual(list(search.search_students(Student.objects.all(), 'ana sant')), [self.ana])
+        self.assertEqual(list(search.search_albums(Album.objects.all(), 'gradu')), [self.album])
+        # Fields outside the given ones are not searched
+        self.assertEqual(search.search_students(Student.objects.all(), 'reyes',
+                                                search.STUDENT_BASIC_FIELDS).count(), 1)
+        self.assertEqual(search.search_students(Student.objects.all(), '"*').count(), 0)
+
+    def test_triggers_keep_index_in_sync(self):
+        student = Student.objects.create(first_name='Grace', last_name='Torres', school_id='F004',
+                                         email='f4@example.com', department='ABM', year='2023')
+        self.assertEqual(self.indexed('torres'), {student.id})
+        student.last_name = 'Ramos'
+        student.save()
+        self.assertEqual(self.indexed('torres'), set())
+        self.assertEqual(self.indexed('ramos'), {student.id})
+        Student.objects.filter(pk=student.pk).update(first_name='Gracia')
+        self.assertEqual(self.indexed('gracia'), {student.id})
+        student.delete()
+        self.assertEqual(self.indexed('ramos OR gracia'), set())
+
+    def test_fallback_without_fts(self):
+        from unittest import mock
+
+        from . import search
+
+        with mock.patch.dict(search._fts_support, {'default': False}):
+            self.assertEqual(set(search.search_students(Student.objects.all(), 'sant')), {self.santos, self.ana})
+            self.assertEqual(list(search.search_students(Student.objects.all(), 'LIM')), [self.john])
+            self.assertEqual(list(search.search_albums(Album.objects.all(), 'class of')), [self.album])
+
+
+@override_settings(**TEST_SETTINGS, TYPEAHEAD_RESYNC_INTERVAL=0)
+class TypeaheadIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = make_students(3)
+        cls.accented = Student.objects.create(first_name='José', last_name='Dela Cruz', school_id='X100',
+                                              email='x100@example.com', department='STEM', year='2025')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_prefix_results(self):
+        from . import typeahead
+
+        index = typeahead.StudentPrefixIndex()
+        index.load()
+        self.assertEqual([r['school_id'] for r in index.search('first')], ['S0000', 'S0001', 'S0002'])
+        self.assertEqual([r['school_id'] for r in index.search('first', limit=2)], ['S0000', 'S0001'])
+        # Any name word, the full name and the school ID, without accents or case
+        for query in ('jose', 'JOSÉ DE', 'cruz', 'x10'):
+            with self.subTest(query=query):
+                self.assertEqual([r['id'] for r in index.search(query)], [self.accented.id])
+        self.assertEqual(index.search('nobody'), [])
+        result = index.search('last1')[0]
+        self.assertEqual(result, {'id': self.students[1].id, 'name': 'First1  Last1', 'school_id': 'S0001',
+                                  'department': 'BSIT', 'year': '2024', 'section': '1'})
+
+    def test_other_process_applies_logged_changes(self):
+        from . import typeahead
+
+        # This worker's index (kept current by the signals) and another's
+        this, other = typeahead.student_index, typeahead.StudentPrefixIndex()
+        this.load()
+        other.load()
+        student = self.students[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            student.first_name = 'Renamed'
+            student.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.students[1].delete()
+        # The saving worker applied the changes; the other reads them from
+        # the log in the cache, without reloading
+        self.assertEqual(this.version, typeahead.current_version())
+        self.assertEqual([r['id'] for r in this.search('renamed')], [student.id])
+        with self.settings(TYPEAHEAD_RESYNC_INTERVAL=0), self.assertNumQueries(0):
+            self.assertEqual([r['id'] for r in other.search('renamed')], [student.id])
+            self.assertEqual([r['school_id'] for r in other.search('first')], ['S0002'])
+        self.assertEqual(other.version, typeahead.current_version())
+
+        # A bulk update sends no signals; bump_version() alone makes both reload
+        Student.objects.filter(pk=student.pk).update(first_name='Bulk')
+        typeahead.bump_version()
+        self.assertEqual([r['id'] for r in this.search('bulk')], [student.id])
+        self.assertEqual([r['id'] for r in other.search('bulk')], [student.id])
+        self.assertEqual(other.search('renamed'), [])
+
+
+@override_settings(**TEST_SETTINGS)
+class RenditionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.album = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def rendition_files(self, fieldfile):
+        from PIL import Image
+
+        from . import renditions
+
+        sizes = {}
+        for rendition in renditions.FIELD_RENDITIONS['Photo', 'image']:
+            name = renditions.rendition_name(fieldfile.name, rendition)
+            if fieldfile.storage.exists(name):
+                with fieldfile.storage.open(name, 'rb') as f, Image.open(f) as image:
+                    sizes[rendition] = image.size
+        return sizes
+
+    def test_each_rendition_generated_once(self):
+        from . import renditions
+
+        photo = Photo.objects.create(album=self.album, image=image_upload('a.jpg', 'red'),
+                                     uploaded_by=self.admin)
+        # Thumbnails are cropped to fill; the lightbox never enlarges
+        self.assertEqual(self.rendition_files(photo.image), {'thumb': (480, 480), 'lightbox': (64, 48)})
+        thumb = photo.image.storage.path(renditions.rendition_name(photo.image.name, 'thumb'))
+        written_at = os.stat(thumb).st_mtime_ns
+
+        self.assertEqual(renditions.generate(photo.image, ('thumb', 'lightbox')), [])
+        renditions.generate_for_instance(photo)
+        self.assertEqual(os.stat(thumb).st_mtime_ns, written_at)
+        self.assertEqual(renditions.generate(photo.image, ('thumb',), force=True), ['thumb'])
+        self.assertEqual(len(os.listdir(os.path.dirname(thumb))), 3)
+        self.assertEqual(renditions.url(photo.image, 'thumb'), photo.image.storage.url(
+            renditions.rendition_name(photo.image.name, 'thumb')))
+
+    def test_racing_writers_share_one_name(self):
+        from unittest import mock
+
+        from . import renditions
+
+        photo = Photo.objects.create(album=self.album, image=image_upload('a.jpg', 'red'),
+                                     uploaded_by=self.admin)
+        directory = os.path.dirname(photo.image.path)
+        before = sorted(os.listdir(directory))
+        render = renditions.render
+
+        def racing_render(image, rendition):
+            # Another worker writes the same rendition while this one renders
+            data = render(image, rendition)
+            with open(photo.image.storage.path(renditions.rendition_name(photo.image.name, rendition)), 'wb') as f:
+                f.write(data)
+            return data
+
+        with mock.patch.object(renditions, 'render', racing_render):
+            self.assertEqual(renditions.generate(photo.image, ('thumb', 'lightbox'), force=True),
+                             ['thumb', 'lightbox'])
+        self.assertEqual(sorted(os.listdir(directory)), before)
+
+    def test_missing_or_unreadable_original(self):
+        from . import renditions
+
+        photo = Photo.objects.create(album=self.album, image=image_upload('a.jpg', 'red'),
+                                     uploaded_by=self.admin)
+        directory = os.path.dirname(photo.image.path)
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        renditions.generate_for_instance(photo)
+        self.assertEqual(self.rendition_files(photo.image), {})
+        self.assertEqual(renditions.url(photo.image, 'thumb'), photo.image.url)
+
+        with open(photo.image.path, 'wb') as f:
+            f.write(b'not an image')
+        with self.assertLogs('yearbook.renditions', 'ERROR'):
+            renditions.generate_for_instance(photo)
+        self.assertEqual(self.rendition_files(photo.image), {})
+
+
+@override_settings(**TEST_SETTINGS, PHOTO_UPLOAD_RUNNER='command', PHOTO_UPLOAD_WORKERS=1,
+                   PHOTO_UPLOAD_BATCH_SIZE=2, PHOTO_UPLOAD_MAX_RUNNING=1)
+class PhotoUploadJobTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.album = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name,
+                                              PHOTO_UPLOAD_STAGING_DIR=os.path.join(media.name, 'staging'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def stage(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from . import uploads
+
+        files = [image_upload('red.jpg', 'red'), image_upload('red-again.jpg', 'red'),
+                 image_upload('blue.jpg', 'blue'), SimpleUploadedFile('notes.jpg', b'not an image')]
+        return uploads.stage(self.album, files, self.admin, caption='Field trip')
+
+    def test_run_job_end_to_end(self):
+        from . import renditions, uploads
+        from .models import MediaBlob, PhotoUploadJob
+
+        job = self.stage()
+        with self.captureOnCommitCallbacks(execute=True):
+            uploads.run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total, job.processed, job.failed), ('done', 4, 4, 1))
+        self.assertIn('notes.jpg: not a recognized image file', job.errors)
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(os.path.exists(job.staging_dir))
+
+        photos = list(Photo.objects.filter(album=self.album))
+        self.assertEqual(len(photos), 3)
+        self.assertEqual({photo.caption for photo in photos}, {'Field trip'})
+        self.assertTrue(all(photo.image_width == 64 for photo in photos))
+        # The two identical files share one blob
+        counts = dict(MediaBlob.objects.values_list('name', 'references'))
+        self.assertEqual(sorted(counts.values()), [1, 2])
+        self.assertEqual(set(counts), {photo.image.name for photo in photos})
+        for name in counts:
+            self.assertTrue(photos[0].image.storage.exists(renditions.rendition_name(name, 'thumb')))
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.photo_count, 3)
+        # Only pending jobs are claimed
+        uploads.run_job(job.id)
+        self.assertEqual(PhotoUploadJob.objects.get(pk=job.id).processed, 4)
+
+    def test_running_jobs_capped_and_stalled_jobs_requeued(self):
+        import datetime
+
+        from django.utils import timezone
+
+        from . import uploads
+        from .models import PhotoUploadJob
+
+        stalled = self.stage()
+        waiting = self.stage()
+        self.assertEqual(uploads.claim_next(), stalled.id)
+        # Its process died after saving the first batch
+        for path in sorted(os.listdir(stalled.staging_dir))[:2]:
+            os.remove(os.path.join(stalled.staging_dir, path))
+        PhotoUploadJob.objects.filter(pk=stalled.pk).update(processed=2)
+        self.assertIsNone(uploads.claim_next())
+        uploads.run_job(waiting.id)
+        self.assertEqual(PhotoUploadJob.objects.get(pk=waiting.id).status, 'pending')
+
+        self.assertEqual(uploads.reclaim_stale(), 0)
+        later = timezone.now() + datetime.timedelta(hours=1)
+        self.assertEqual(uploads.reclaim_stale(now=later), 1)
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_photo_uploads', once=True, stdout=out)
+        stalled.refresh_from_db()
+        self.assertEqual((stalled.status, stalled.processed, stalled.failed), ('done', 4, 1))
+        self.assertEqual(PhotoUploadJob.objects.get(pk=waiting.id).status, 'done')
+        self.assertIn(f'Job {waiting.id}: done, 3/4 photos added', out.getvalue())
+        # The stalled job adds only the blue photo left in its staging directory
+        self.assertEqual(Photo.objects.count(), 4)
+
+
+@override_settings(**TEST_SETTINGS)
+class CursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.utils import timezone
+
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.students = make_students(7)
+        # Ties on the sort key are broken by id
+        Student.objects.filter(id__in=[s.id for s in cls.students[1:5]]).update(last_name='Santos')
+        cls.album = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+        taken = timezone.now()
+        for student in cls.students:
+            Photo.objects.create(album=cls.album, student=student, image='albums/photos/p.jpg',
+                                 uploaded_by=cls.admin, created_at=taken)
+
+    def token(self, values, direction='n'):
+        import base64
+
+        return base64.urlsafe_b64encode(json.dumps({'k': values, 'd': direction}).encode()).decode()
+
+    def walk(self, paginator):
+        """Ids of every page going forward, then going back from the last."""
+        forward, page = [], paginator.get_page()
+        self.assertFalse(page.has_previous())
+        while True:
+            forward.append([obj.id for obj in page])
+            if not page.has_next():
+                break
+            page = paginator.get_page(page.next_cursor)
+        backward = [[obj.id for obj in page]]
+        while page.has_previous():
+            page = paginator.get_page(page.previous_cursor)
+            backward.insert(0, [obj.id for obj in page])
+        return forward, backward
+
+    def test_next_and_previous_pages_with_ties(self):
+        from .pagination import CursorPaginator
+
+        for queryset, ordering in [
+            (Student.objects.all(), ['last_name']),
+            (Student.objects.all(), ['-last_name', '-id']),
+            (Photo.objects.filter(album=self.album), None),  # -is_featured, -created_at
+        ]:
+            with self.subTest(ordering=ordering or queryset.model._meta.ordering):
+                paginator = CursorPaginator(queryset, 3, ordering)
+                expected = list(queryset.order_by(*(paginator._order(False))).values_list('id', flat=True))
+                forward, backward = self.walk(paginator)
+                self.assertEqual([len(ids) for ids in forward], [3, 3, 1])
+                self.assertEqual(sum(forward, []), expected)
+                self.assertEqual(backward, forward)
+
+    def test_search_ranked_pages(self):
+        from . import search
+        from .pagination import CursorPaginator
+
+        paginator = CursorPaginator(search.search_students(Student.objects.all(), 'first'), 3)
+        forward, backward = self.walk(paginator)
+        self.assertEqual(sorted(sum(forward, [])), sorted(s.id for s in self.students))
+        self.assertEqual(backward, forward)
+
+    def test_bad_or_forged_cursor_gives_first_page(self):
+        from .pagination import CursorPaginator
+
+        students = CursorPaginator(Student.objects.all(), 3, ['last_name'])
+        photos = CursorPaginator(Photo.objects.filter(album=self.album), 3)
+        first_students = [s.id for s in students.get_page()]
+        first_photos = [p.id for p in photos.get_page()]
+        for paginator, first, cursor in [
+            (students, first_students, 'not a cursor!'),
+            (students, first_students, self.token(['a'])),
+            (students, first_students, self.token(['Last0', 'a'])),
+            (students, first_students, self.token(['Last0', 2 ** 70], 'p')),
+            (students, first_students, self.token(['Last0', None])),
+            (students, first_students, self.token([['Last0'], {'id': 1}])),
+            (photos, first_photos, self.token([True, 'yesterday', 1])),
+            (photos, first_photos, self.token([True, '2024-13-45T00:00:00', 1])),
+        ]:
+            with self.subTest(cursor=cursor):
+                self.assertEqual([obj.id for obj in paginator.get_page(cursor)], first)
+
+        self.client.force_login(self.admin)
+        for url, forged in [
+            (reverse('admin_student_list'), self.token(['a'])),
+            (reverse('student_dashboard'), self.token(['a'])),
+            (reverse('album_detail', args=[self.album.id]), self.token([True, 'yesterday', 1])),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, {'cursor': forged}).status_code, 200)
+
+
+@override_settings(**{**TEST_SETTINGS, 'SEARCH_HISTORY_BUFFER': True}, SEARCH_HISTORY_FLUSH_SIZE=3,
+                   SEARCH_HISTORY_FLUSH_INTERVAL=3600, SEARCH_HISTORY_COALESCE_SECONDS=300,
+                   SEARCH_HISTORY_FLUSH_RETRIES=2)
+class SearchHistoryBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('viewer', 'viewer@example.com', 'pw')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'pw')
+
+    def setUp(self):
+        from unittest import mock
+
+        from . import history
+
+        self.buffer = history.SearchHistoryBuffer()
+        # Flushed by the tests rather than the writer thread, which would
+        # write outside the test transaction
+        patcher = mock.patch.object(self.buffer, '_start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeats_coalesced(self):
+        for query in ('Santos', ' santos ', 'SANTOS'):
+            self.buffer.record(self.user, query)
+        self.buffer.record(self.user, 'santos', 'album')
+        self.buffer.record(self.other, 'santos')
+        self.buffer.record(self.user, '   ')
+        self.assertEqual([(e.user_id, e.search_query, e.search_type) for e in self.buffer._pending],
+                         [(self.user.id, 'Santos', 'student'), (self.user.id, 'santos', 'album'),
+                          (self.other.id, 'santos', 'student')])
+        with override_settings(SEARCH_HISTORY_COALESCE_SECONDS=0):
+            self.buffer.record(self.user, 'Santos')
+        self.assertEqual(len(self.buffer._pending), 4)
+
+    def test_flush_when_full_and_recent_merges_pending(self):
+        from . import stats
+
+        SearchHistory.objects.create(user=self.user, search_query='stored')
+        self.buffer.record(self.user, 'first')
+        self.buffer.record(self.other, 'second')
+        self.assertFalse(self.buffer._wake.is_set())
+        self.assertEqual([e.search_query for e in self.buffer.recent(self.user)], ['first', 'stored'])
+
+        self.buffer.record(self.user, 'third')
+        # The writer thread is woken rather than waiting out the interval
+        self.assertTrue(self.buffer._wake.is_set())
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(self.buffer._pending, [])
+        self.assertEqual(SearchHistory.objects.count(), 4)
+        self.assertEqual(stats.reconcile(dry_run=True), {})
+        self.assertEqual([e.search_query for e in self.buffer.recent(self.user, 2)], ['third', 'first'])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_shutdown_drains(self):
+        self.buffer.record(self.user, 'first')
+        self.buffer.record(self.user, 'second')
+        self.buffer.shutdown()
+        self.assertEqual(self.buffer._pending, [])
+        self.assertEqual(sorted(SearchHistory.objects.values_list('search_query', flat=True)),
+                         ['first', 'second'])
+
+    def test_failed_flush_requeued_then_dropped(self):
+        from unittest import mock
+
+        from django.db import DatabaseError
+
+        self.buffer.record(self.user, 'first')
+        failing = mock.patch.object(SearchHistory.objects, 'bulk_create', side_effect=DatabaseError('locked'))
+        with failing, self.assertLogs('yearbook.history', 'ERROR'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.buffer.record(self.user, 'second')
+        self.assertEqual([e.search_query for e in self.buffer._pending], ['first', 'second'])
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(SearchHistory.objects.count(), 2)
+
+        # Only dropped after SEARCH_HISTORY_FLUSH_RETRIES failures in a row
+        self.buffer.record(self.user, 'third')
+        with failing, self.assertLogs('yearbook.history', 'ERROR') as logs:
+            self.buffer.flush()
+            self.assertEqual(len(self.buffer._pending), 1)
+            self.buffer.flush()
+        self.assertIn('Dropped 1 search history entries', logs.output[-1])
+        self.assertEqual(self.buffer._pending, [])
+        self.assertEqual(SearchHistory.objects.count(), 2)
+
+
+@override_settings(**TEST_SETTINGS)
+class AlbumPhotoCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.first = Album.objects.create(title='Class of 2023', department='BSIT', year='2023')
+        cls.second = Album.objects.create(title='Class of 2024', department='BSIT', year='2024')
+
+    def counts(self):
+        return list(Album.objects.order_by('id').values_list('photo_count', flat=True))
+
+    def add_photo(self, album):
+        return Photo.objects.create(album=album, image='albums/photos/p.jpg', uploaded_by=self.admin)
+
+    def test_signals_keep_count(self):
+        photos = [self.add_photo(self.first) for _ in range(3)]
+        self.add_photo(self.second)
+        self.assertEqual(self.counts(), [3, 1])
+
+        photos[0].album = self.second
+        photos[0].save()
+        self.assertEqual(self.counts(), [2, 2])
+        # Saving without moving changes nothing
+        photos[1].caption = 'Portrait'
+        photos[1].save()
+        self.assertEqual(self.counts(), [2, 2])
+
+        photos[1].delete()
+        self.assertEqual(self.counts(), [1, 2])
+        Photo.objects.filter(album=self.second).delete()
+        self.assertEqual(self.counts(), [1, 0])
+
+    def test_recount_repairs_drift(self):
+        for _ in range(2):
+            self.add_photo(self.first)
+        Album.objects.filter(pk=self.first.pk).update(photo_count=7)
+        Album.objects.filter(pk=self.second.pk).update(photo_count=3)
+        self.assertEqual(Album.recount_photos(Album.objects.filter(pk=self.second.pk)), 1)
+        self.assertEqual(self.counts(), [7, 0])
+
+        out = StringIO()
+        call_command('recount_albums', stdout=out)
+        self.assertIn('Recounted photos for 2 album(s).', out.getvalue())
+        self.assertEqual(self.counts(), [2, 0])
@@ -0,0 +1,207 @@
+"""
+In-memory prefix index behind the search_students autocomplete endpoint.
+
+Each worker keeps a sorted array of normalized name/school ID keys and
+answers typeahead queries with a binary search instead of a table scan.
+Local writes are applied through model signals and logged in the cache
+under the index version, so other workers apply them in place; they
+reload from the database only when changes are missing from the log or
+after a bulk update bumps the version without logging one.
+
+asearch() serves the async endpoint: a lookup never leaves the event
+loop, only the periodic version check (and any reload) runs in a thread.
+"""
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .routers import primary_reads
+
+VERSION_KEY = 'yearbook:typeahead:version'
+CHANGE_KEY = 'yearbook:typeahead:change:%d'
+CHANGE_TIMEOUT = 600  # seconds a change stays in the log
+MAX_CHANGES = 500     # workers further behind than this reload
+
+
+def normalize(value):
+    """Lowercase, strip accents and collapse whitespace."""
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(c for c in value if not unicodedata.combining(c))
+    return ' '.join(value.lower().split())
+
+
+def current_version(key=VERSION_KEY):
+    return cache.get(key, 0)
+
+
+def bump_version(key=VERSION_KEY):
+    """Mark every worker's index as stale and return the new version."""
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def publish(student_id, row=None):
+    """Log one committed write (``row`` None for a deleted student) for the
+    other workers, and apply it to this one's index."""
+    version = bump_version()
+    cache.set(CHANGE_KEY % version, (student_id, row), CHANGE_TIMEOUT)
+    student_index.apply(student_id, row, version)
+
+
+class StudentPrefixIndex:
+    fields = ('id', 'first_name', 'middle_name', 'last_name', 'school_id',
+              'department', 'year', 'section')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []          # sorted (key, student_id) pairs
+        self._keys_by_id = {}
+        self._results = {}       # student_id -> JSON-ready dict
+        self.version = None
+        self._checked_at = 0.0
+
+    @classmethod
+    def row(cls, student):
+        """The values of ``student`` the index keeps, for publish()."""
+        return {f: getattr(student, f) for f in cls.fields}
+
+    @staticmethod
+    def _entries(row):
+        first = normalize(row['first_name'])
+        last = normalize(row['last_name'])
+        full = normalize(' '.join((row['first_name'], row['middle_name'], row['last_name'])))
+        keys = {full, first, last, normalize(row['school_id'])}
+        keys.update(full.split())
+        keys.discard('')
+        return keys
+
+    @staticmethod
+    def _result(row):
+        name = f"{row['first_name']} {row['middle_name']} {row['last_name']}".strip()
+        return {
+            'id': row['id'],
+            'name': name,
+            'school_id': row['school_id'],
+            'department': row['department'],
+            'year': row['year'],
+            'section': row['section'],
+        }
+
+    def load(self):
+        from .models import Student
+
+        version = current_version()
+        keys, keys_by_id, results = [], {}, {}
+        # From the primary: a lagging replica would be recorded as ``version``
+        with primary_reads():
+            for row in Student.objects.values(*self.fields).iterator(chunk_size=2000):
+                entries = self._entries(row)
+                keys.extend((key, row['id']) for key in entries)
+                keys_by_id[row['id']] = entries
+                results[row['id']] = self._result(row)
+        keys.sort()
+        with self._lock:
+            self._keys, self._keys_by_id, self._results = keys, keys_by_id, results
+            self.version = version
+            self._checked_at = time.monotonic()
+
+    def _check_due(self):
+        interval = getattr(settings, 'TYPEAHEAD_RESYNC_INTERVAL', 1.0)
+        return self.version is None or time.monotonic() - self._checked_at >= interval
+
+    def _ensure_current(self):
+        if not self._check_due():
+            return
+        version = current_version()
+        if version != self.version and not self._catch_up(version):
+            self.load()
+        else:
+            self._checked_at = time.monotonic()
+
+    def _catch_up(self, version):
+        """Apply the logged changes up to ``version``; False if any are gone."""
+        if self.version is None or not 0 < version - self.version <= MAX_CHANGES:
+            return False
+        keys = [CHANGE_KEY % v for v in range(self.version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        with self._lock:
+            # Another thread may have caught up part of the way meanwhile
+            for v in range(self.version + 1, version + 1):
+                self._change(*changes[CHANGE_KEY % v])
+            self.version = max(self.version, version)
+            self._checked_at = time.monotonic()
+        return True
+
+    def _remove(self, student_id):
+        for key in self._keys_by_id.pop(student_id, ()):
+            i = bisect_left(self._keys, (key, student_id))
+            if i < len(self._keys) and self._keys[i] == (key, student_id):
+                del self._keys[i]
+        self._results.pop(student_id, None)
+
+    def _change(self, student_id, row):
+        self._remove(student_id)
+        if row is not None:
+            entries = self._entries(row)
+            for key in entries:
+                insort(self._keys, (key, student_id))
+            self._keys_by_id[student_id] = entries
+            self._results[student_id] = self._result(row)
+
+    def apply(self, student_id, row, version):
+        """Apply this worker's own change; see publish()."""
+        with self._lock:
+            if self.version is None:
+                return
+            if version != self.version + 1:
+                # Earlier changes are missing; the next check reads them from the log
+                self._checked_at = 0.0
+                return
+            self._change(student_id, row)
+            self.version = version
+
+    def search(self, query, limit=10):
+        self._ensure_current()
+        return self._lookup(query, limit)
+
+    async def asearch(self, query, limit=10):
+        if self._check_due():
+            await sync_to_async(self._ensure_current)()
+        return self._lookup(query, limit)
+
+    def results_for(self, student_ids):
+        """The results for ``student_ids`` in that order, skipping unknown ones."""
+        with self._lock:
+            return [self._results[i] for i in student_ids if i in self._results]
+
+    def _lookup(self, query, limit):
+        prefix = normalize(query)
+        with self._lock:
+            keys = self._keys
+            i = bisect_left(keys, (prefix,))
+            seen, results = set(), []
+            while i < len(keys) and len(results) < limit:
+                key, student_id = keys[i]
+                if not key.startswith(prefix):
+                    break
+                if student_id not in seen:
+                    seen.add(student_id)
+                    results.append(self._results[student_id])
+                i += 1
+        return results
+
+
+student_index = StudentPrefixIndex()
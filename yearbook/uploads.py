@@ -0,0 +1,264 @@
+"""
+Background processing for bulk photo uploads.
+
+admin_photo_add only copies the uploaded files into a staging directory
+and records a PhotoUploadJob. The job is then run by a pool of worker
+processes that fix orientation, strip EXIF metadata, store the image and
+its renditions and measure it (see imagemeta.py); the parent creates the Photo rows in batches and records
+progress on the job for the status endpoint.
+
+With PHOTO_UPLOAD_RUNNER = 'thread' the pool is driven from a background
+thread of the web process; with 'command' jobs wait for
+``manage.py process_photo_uploads``. Either way no more than
+PHOTO_UPLOAD_MAX_RUNNING jobs run at once, and a job left running by a
+process that died is requeued after PHOTO_UPLOAD_STALE_AFTER seconds.
+"""
+import logging
+import os
+import shutil
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from io import BytesIO
+from multiprocessing import get_context
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.text import get_valid_filename
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Formats kept as-is; anything else is re-encoded as JPEG
+KEEP_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _encode(image, source_format):
+    """Re-encode without EXIF, keeping the colour profile."""
+    fmt = source_format if source_format in KEEP_FORMATS else 'JPEG'
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    options = {'icc_profile': image.info.get('icc_profile')}
+    if fmt == 'JPEG':
+        options.update(quality=90, optimize=True)
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue(), KEEP_FORMATS[fmt]
+
+
+def process_file(staged_path, original_name):
+    """Runs in a pool process. Returns ``(stored name, metadata, error)``."""
+    from django.core.files.base import ContentFile
+
+    from . import imagemeta, renditions
+    from .models import Photo
+
+    try:
+        with Image.open(staged_path) as source:
+            source_format = source.format
+            image = ImageOps.exif_transpose(source)
+            data, extension = _encode(image, source_format)
+        field = Photo._meta.get_field('image')
+        root, _ext = os.path.splitext(original_name)
+        name = field.storage.save(field.generate_filename(None, root + extension), ContentFile(data))
+        renditions.generate_for_instance(Photo(image=name))
+        return name, imagemeta.measure_image(image, len(data)), None
+    except UnidentifiedImageError:
+        return None, None, f'{original_name}: not a recognized image file'
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        return None, None, f'{original_name}: {exc}'
+
+
+def stage(album, files, user, student=None, caption='', is_featured=False):
+    """Copy uploaded files to a fresh staging directory and queue a job."""
+    from .models import PhotoUploadJob
+
+    staging_dir = Path(settings.PHOTO_UPLOAD_STAGING_DIR) / uuid.uuid4().hex
+    staging_dir.mkdir(parents=True)
+    for index, upload in enumerate(files):
+        name = get_valid_filename(os.path.basename(upload.name)) or 'photo'
+        with open(staging_dir / f'{index:05d}_{name}', 'wb') as out:
+            for chunk in upload.chunks():
+                out.write(chunk)
+    return PhotoUploadJob.objects.create(
+        album=album,
+        student=student,
+        caption=caption or '',
+        is_featured=is_featured,
+        uploaded_by=user,
+        staging_dir=str(staging_dir),
+        total=len(files),
+    )
+
+
+def dispatch(job):
+    """Start processing ``job`` according to PHOTO_UPLOAD_RUNNER."""
+    if settings.PHOTO_UPLOAD_RUNNER != 'thread':
+        return
+    from django.db import transaction
+
+    # The thread runs queued jobs, this one included, while fewer than
+    # PHOTO_UPLOAD_MAX_RUNNING run anywhere; if none can start now, the
+    # thread of a running job picks it up when that job finishes
+    thread = threading.Thread(target=run_pending, daemon=True, name=f'photo-upload-{job.pk}')
+    transaction.on_commit(thread.start)
+
+
+def reclaim_stale(now=None):
+    """Requeue running jobs whose process stopped making progress.
+
+    Staged files are deleted as their photos are saved, so a requeued job
+    carries on with the files that are left. Returns the number requeued.
+    """
+    from django.db.models import Q
+    from django.utils import timezone
+
+    from .models import PhotoUploadJob
+
+    cutoff = (now or timezone.now()) - timedelta(seconds=settings.PHOTO_UPLOAD_STALE_AFTER)
+    stale = PhotoUploadJob.objects.filter(Q(heartbeat_at__lt=cutoff)
+                                          | Q(heartbeat_at__isnull=True, created_at__lt=cutoff),
+                                          status='running')
+    return stale.update(status='pending')
+
+
+def _claim(jobs):
+    """Mark one of ``jobs`` running unless PHOTO_UPLOAD_MAX_RUNNING already
+    are; the count and the claim are one UPDATE. Returns the job's id or None.
+    """
+    from django.db.models import Count, Subquery
+    from django.db.models.functions import Coalesce
+    from django.utils import timezone
+
+    from .models import PhotoUploadJob
+
+    running = (PhotoUploadJob.objects.filter(status='running').order_by()
+               .values('status').annotate(n=Count('id')).values('n'))
+    for job_id in jobs.filter(status='pending').order_by('created_at', 'id').values_list('id', flat=True)[:5]:
+        claimed = (PhotoUploadJob.objects.filter(pk=job_id, status='pending')
+                   .alias(running=Coalesce(Subquery(running), 0))
+                   .filter(running__lt=settings.PHOTO_UPLOAD_MAX_RUNNING)
+                   .update(status='running', heartbeat_at=timezone.now()))
+        if claimed:
+            return job_id
+    return None
+
+
+def claim_next():
+    """Claim the oldest pending job, if another may run; returns its id or None."""
+    from .models import PhotoUploadJob
+
+    return _claim(PhotoUploadJob.objects.all())
+
+
+def run_pending():
+    """Requeue stale jobs, then run queued jobs until none can be claimed."""
+    from django.db import connection
+
+    try:
+        reclaim_stale()
+        while (job_id := claim_next()) is not None:
+            process(job_id)
+    finally:
+        connection.close()
+
+
+def _flush(job, photos, failed, errors, done):
+    from django.db import transaction
+    from django.db.models import F
+    from django.utils import timezone
+
+    from . import caching, stats, storage
+    from .models import Album, Photo, PhotoUploadJob
+
+    with transaction.atomic():
+        # bulk_create skips post_save, so the album counter, dashboard
+        # statistics and blob references are updated here
+        Photo.objects.bulk_create(photos)
+        Album.adjust_photo_count(job.album_id, len(photos))
+        stats.adjust({'photos': len(photos)})
+        storage.adjust_references(Counter(photo.image.name for photo in photos))
+        updates = {'processed': F('processed') + len(photos) + failed, 'heartbeat_at': timezone.now()}
+        if failed:
+            updates['failed'] = F('failed') + failed
+            job.errors = '\n'.join(filter(None, [job.errors] + errors))
+            updates['errors'] = job.errors
+        PhotoUploadJob.objects.filter(pk=job.pk).update(**updates)
+        if photos:
+            transaction.on_commit(lambda: caching.bump(f'album:{job.album_id}', 'photo-counts'))
+    # Saved; a requeued job must not add these again
+    for path in done:
+        path.unlink(missing_ok=True)
+
+
+def _results(staged):
+    """(staged path, process_file() result) pairs, in the order they finish."""
+    workers = settings.PHOTO_UPLOAD_WORKERS or os.cpu_count()
+    arguments = [(path, (str(path), path.name.split('_', 1)[1])) for path in staged]
+    if workers == 1:
+        for path, args in arguments:
+            yield path, process_file(*args)
+        return
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                               initializer=_init_worker)
+    with pool:
+        futures = {pool.submit(process_file, *args): path for path, args in arguments}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def run_job(job_id):
+    """Claim and process one pending job, if another job may run."""
+    from .models import PhotoUploadJob
+
+    if _claim(PhotoUploadJob.objects.filter(pk=job_id)) is not None:
+        process(job_id)
+
+
+def process(job_id):
+    """Process a job claimed by this process; it ends done or failed."""
+    from django.utils import timezone
+
+    from . import imagemeta
+    from .models import Photo, PhotoUploadJob
+
+    job = PhotoUploadJob.objects.get(pk=job_id)
+    staging_dir = Path(job.staging_dir)
+    batch_size = settings.PHOTO_UPLOAD_BATCH_SIZE
+    status = 'done'
+    try:
+        staged = sorted(staging_dir.iterdir())
+        photos, failed, errors, done = [], 0, [], []
+        for path, (name, meta, error) in _results(staged):
+            done.append(path)
+            if error:
+                failed += 1
+                errors.append(error)
+            else:
+                photos.append(Photo(
+                    album_id=job.album_id,
+                    student_id=job.student_id,
+                    image=name,
+                    caption=job.caption,
+                    is_featured=job.is_featured,
+                    uploaded_by_id=job.uploaded_by_id,
+                    **imagemeta.values('image', meta),
+                ))
+            if len(done) >= batch_size:
+                _flush(job, photos, failed, errors, done)
+                photos, failed, errors, done = [], 0, [], []
+        if done:
+            _flush(job, photos, failed, errors, done)
+    except Exception:
+        logger.exception('Photo upload job %s failed', job_id)
+        status = 'failed'
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        PhotoUploadJob.objects.filter(pk=job_id).update(status=status, finished_at=timezone.now())
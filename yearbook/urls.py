@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -21,6 +22,8 @@ urlpatterns = [
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('panel/students/', views.admin_student_list, name='admin_student_list'),
     path('panel/students/add/', views.admin_student_add, name='admin_student_add'),
+    path('panel/students/import/', views.admin_student_import, name='admin_student_import'),
+    path('panel/users/lookup/', views.admin_user_lookup, name='admin_user_lookup'),
     path('panel/students/<int:student_id>/edit/', views.admin_student_edit, name='admin_student_edit'),
     path('panel/students/<int:student_id>/delete/', views.admin_student_delete, name='admin_student_delete'),
     path('panel/students/<int:student_id>/', views.admin_student_detail, name='admin_student_detail'),
@@ -29,11 +32,19 @@ urlpatterns = [
     # Admin Album Management URLs
     path('panel/albums/', views.admin_album_list, name='admin_album_list'),
     path('panel/albums/add/', views.admin_album_add, name='admin_album_add'),
+    path('panel/albums/bulk-operations/', views.admin_album_bulk_operations, name='admin_album_bulk_operations'),
     path('panel/albums/<int:album_id>/edit/', views.admin_album_edit, name='admin_album_edit'),
     path('panel/albums/<int:album_id>/delete/', views.admin_album_delete, name='admin_album_delete'),
     path('panel/albums/<int:album_id>/photos/', views.admin_photo_list, name='admin_photo_list'),
     path('panel/albums/<int:album_id>/photos/add/', views.admin_photo_add, name='admin_photo_add'),
+    path('panel/albums/<int:album_id>/photos/bulk-operations/', views.admin_photo_bulk_operations, name='admin_photo_bulk_operations'),
     path('panel/photos/<int:photo_id>/delete/', views.admin_photo_delete, name='admin_photo_delete'),
+    path('panel/uploads/<int:job_id>/status/', views.admin_upload_status, name='admin_upload_status'),
+    path('panel/cache-stats/', views.admin_cache_stats, name='admin_cache_stats'),
+    path('panel/search-report/', views.admin_search_report, name='admin_search_report'),
     
     path('logout/', views.logout_view, name='logout'),
+
+    # Uploaded media, access-checked (see yearbook/media.py)
+    path(settings.MEDIA_URL.lstrip('/') + '<path:path>', views.media_file, name='media_file'),
 ]
@@ -4,12 +4,14 @@ from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse
-from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.db import models
 from django.urls import reverse
-from .models import Student, Album, Photo, SearchHistory
-from .forms import SignUpForm, StudentForm, StudentSearchForm
+from .models import Student, Album, Photo, PhotoUploadJob
+from .forms import SignUpForm, StudentForm, StudentSearchForm, RosterImportForm
+from .pagination import CursorPaginator
+from . import bulk, caching, exports, history, media, names, roster, search, searchlog, stats, typeahead, uploads
+from .caching import cache_page_versioned, conditional_page
 
 def landing(request):
     return render(request, 'yearbook/landing.html')
@@ -195,24 +197,15 @@ def student_dashboard(request):
         student_profile = None
     
     # Get recent searches for current user
-    recent_searches = SearchHistory.objects.filter(user=request.user)[:5]
+    recent_searches = history.buffer.recent(request.user, 5)
     
     # Search students
     students = Student.objects.all()
     
     if search_query:
-        students = students.filter(
-            models.Q(first_name__icontains=search_query) |
-            models.Q(last_name__icontains=search_query) |
-            models.Q(school_id__icontains=search_query) |
-            models.Q(email__icontains=search_query)
-        )
-        # Save search to history
-        SearchHistory.objects.create(
-            user=request.user,
-            search_query=search_query,
-            search_type='student'
-        )
+        students = search.search_students(students, search_query, search.STUDENT_BASIC_FIELDS)
+        # Queue search for history (repeats within a few minutes are dropped)
+        history.buffer.record(request.user, search_query, 'student')
     
     if department:
         students = students.filter(department=department)
@@ -224,13 +217,15 @@ def student_dashboard(request):
         students = students.filter(section=section)
     
     # Paginate results
-    paginator = Paginator(students, 12)
-    page_number = request.GET.get('page')
-    students = paginator.get_page(page_number)
+    paginator = CursorPaginator(students, 12)
+    students = paginator.get_page(request.GET.get('cursor'))
+    cards = caching.render_fragments('yearbook/fragments/student_card.html', students,
+                                     lambda student: student.updated_at, name='student')
     
     context = {
         'student_profile': student_profile,
         'students': students,
+        'cards': cards,
         'recent_searches': recent_searches,
         'search_query': search_query,
         'department': department,
@@ -244,25 +239,14 @@ def student_dashboard(request):
     return render(request, 'yearbook/student_dashboard.html', context)
 
 @login_required
-def search_students(request):
+async def search_students(request):
     if request.method == 'GET':
         query = request.GET.get('q', '')
-        students = Student.objects.filter(
-            models.Q(first_name__icontains=query) |
-            models.Q(last_name__icontains=query) |
-            models.Q(school_id__icontains=query)
-        )[:10]
-        
-        results = []
-        for student in students:
-            results.append({
-                'id': student.id,
-                'name': student.full_name,
-                'school_id': student.school_id,
-                'department': student.department,
-                'year': student.year,
-                'section': student.section,
-            })
+        results = await typeahead.student_index.asearch(query, limit=10)
+        if not results:
+            # Nothing starts that way; try names spelled like it ("santso")
+            matches = await names.name_index.amatch(query, limit=10)
+            results = typeahead.student_index.results_for([student_id for student_id, _similarity in matches])
         
         return JsonResponse({'results': results})
 
@@ -271,12 +255,7 @@ def dashboard(request):
     query = request.GET.get('q', '')
     students = Student.objects.all()
     if query:
-        students = students.filter(
-            models.Q(first_name__icontains=query) |
-            models.Q(last_name__icontains=query) |
-            models.Q(school_id__icontains=query) |
-            models.Q(email__icontains=query)
-        )
+        students = search.search_students(students, query, search.STUDENT_BASIC_FIELDS)
     return render(request, 'yearbook/dashboard.html', {'students': students})
 
 
@@ -286,32 +265,20 @@ def logout_view(request):
 
 # Unified search across albums and students
 @login_required
-def search_all(request):
+async def search_all(request):
     """Search albums and students by a single query string.
-    Matches partial, case-insensitive values across multiple fields.
+    Matches word prefixes across multiple fields, best matches first.
     """
     query = (request.GET.get('q') or request.GET.get('search') or '').strip()
-    albums = Album.objects.none()
-    students = Student.objects.none()
+    albums = []
+    students = []
 
     if query:
-        albums = Album.objects.filter(is_active=True).filter(
-            models.Q(title__icontains=query) |
-            models.Q(description__icontains=query) |
-            models.Q(department__icontains=query) |
-            models.Q(year__icontains=query)
-        ).order_by('-created_at')
-
-        students = Student.objects.filter(
-            models.Q(first_name__icontains=query) |
-            models.Q(middle_name__icontains=query) |
-            models.Q(last_name__icontains=query) |
-            models.Q(school_id__icontains=query) |
-            models.Q(email__icontains=query) |
-            models.Q(department__icontains=query) |
-            models.Q(block__icontains=query) |
-            models.Q(section__icontains=query)
-        ).order_by('first_name', 'last_name')
+        albums = await search.asearch_albums(Album.objects.filter(is_active=True), query)
+        students = await search.asearch_students(Student.objects.all(), query)
+        # Templates can't run queries in an async view
+        albums = [album async for album in albums]
+        students = [student async for student in students]
 
     context = {
         'q': query,
@@ -328,12 +295,8 @@ def is_admin(user):
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
-    # Get statistics
-    total_students = Student.objects.count()
-    total_users = User.objects.count()
-    total_albums = Album.objects.count()
-    total_photos = Photo.objects.count()
-    recent_searches = SearchHistory.objects.count()
+    # Get statistics (counters kept by yearbook/stats.py, not COUNT(*))
+    totals, classes = stats.dashboard()
     
     # Get recent students
     recent_students = Student.objects.order_by('-created_at')[:5]
@@ -342,36 +305,28 @@ def admin_dashboard(request):
     recent_albums = Album.objects.order_by('-created_at')[:5]
     
     context = {
-        'total_students': total_students,
-        'total_users': total_users,
-        'total_albums': total_albums,
-        'total_photos': total_photos,
-        'recent_searches': recent_searches,
+        'total_students': totals['students'],
+        'total_users': totals['users'],
+        'total_albums': totals['albums'],
+        'total_photos': totals['photos'],
+        'recent_searches': totals['searches'],
+        'classes': classes,
         'recent_students': recent_students,
         'recent_albums': recent_albums,
     }
     return render(request, 'yearbook/admin_dashboard.html', context)
 
-@login_required
-@user_passes_test(is_admin)
-def admin_student_list(request):
-    search_form = StudentSearchForm(request.GET)
-    students = Student.objects.all()
-    
+def filter_students(students, search_form):
+    """Apply the StudentSearchForm filters shared by the list and export"""
     if search_form.is_valid():
-        search = search_form.cleaned_data.get('search')
+        search_text = search_form.cleaned_data.get('search')
         department = search_form.cleaned_data.get('department')
         year = search_form.cleaned_data.get('year')
         block = search_form.cleaned_data.get('block')
         section = search_form.cleaned_data.get('section')
         
-        if search:
-            students = students.filter(
-                models.Q(first_name__icontains=search) |
-                models.Q(last_name__icontains=search) |
-                models.Q(school_id__icontains=search) |
-                models.Q(email__icontains=search)
-            )
+        if search_text:
+            students = search.search_students(students, search_text, search.STUDENT_BASIC_FIELDS)
         
         if department:
             students = students.filter(department=department)
@@ -381,15 +336,30 @@ def admin_student_list(request):
             students = students.filter(block=block)
         if section:
             students = students.filter(section=section)
+    return students
+
+@login_required
+@user_passes_test(is_admin)
+def admin_student_list(request):
+    search_form = StudentSearchForm(request.GET)
+    students = filter_students(Student.objects.select_related('user'), search_form)
     
     # Pagination
-    paginator = Paginator(students, 20)
-    page_number = request.GET.get('page')
-    students = paginator.get_page(page_number)
+    paginator = CursorPaginator(students, 20)
+    students = paginator.get_page(request.GET.get('cursor'))
+    # Rows show the account's username, which can change without the student
+    rows = caching.render_fragments(
+        'yearbook/fragments/student_row.html', students,
+        lambda student: (student.updated_at, student.user.username if student.user else None),
+        name='student',
+    )
     
     context = {
         'students': students,
+        'rows': rows,
         'search_form': search_form,
+        'departments': Student.DEPARTMENTS,
+        'years': Student.YEARS,
     }
     return render(request, 'yearbook/admin_student_list.html', context)
 
@@ -408,6 +378,38 @@ def admin_student_add(request):
     context = {'form': form, 'title': 'Add New Student'}
     return render(request, 'yearbook/admin_student_form.html', context)
 
+@login_required
+@user_passes_test(is_admin)
+def admin_student_import(request):
+    """Admin view to create or update students from a CSV roster"""
+    result = None
+    if request.method == 'POST':
+        form = RosterImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            dry_run = form.cleaned_data['dry_run']
+            result = roster.import_roster(form.cleaned_data['roster'], dry_run=dry_run)
+            summary = (f'{result.created} created, {result.updated} updated, '
+                       f'{result.unchanged} unchanged')
+            if dry_run:
+                messages.info(request, f'Dry run: {summary}. Nothing was saved.')
+            elif result.errors:
+                messages.warning(request, f'Roster imported with {len(result.errors)} error(s): {summary}.')
+            else:
+                messages.success(request, f'Roster imported: {summary}.')
+                return redirect('admin_student_list')
+    else:
+        form = RosterImportForm()
+    
+    context = {
+        'form': form,
+        'title': 'Import Student Roster',
+        'result': result,
+        'errors': result.errors[:200] if result else [],
+        'required_columns': roster.REQUIRED,
+        'optional_columns': roster.OPTIONAL,
+    }
+    return render(request, 'yearbook/admin_student_import.html', context)
+
 @login_required
 @user_passes_test(is_admin)
 def admin_student_edit(request, student_id):
@@ -442,16 +444,33 @@ def admin_student_delete(request, student_id):
 @login_required
 @user_passes_test(is_admin)
 def admin_student_detail(request, student_id):
-    student = get_object_or_404(Student, id=student_id)
+    student = get_object_or_404(Student.objects.select_related('user'), id=student_id)
     context = {'student': student}
     return render(request, 'yearbook/admin_student_detail.html', context)
 
+def selected_ids(request, name):
+    """IDs posted as repeated checkboxes or one comma-separated value"""
+    return [
+        value.strip() for ids in request.POST.getlist(name)
+        for value in ids.split(',') if value.strip().isdigit()
+    ]
+
 @login_required
 @user_passes_test(is_admin)
 def admin_bulk_operations(request):
     if request.method == 'POST':
         action = request.POST.get('action')
-        student_ids = request.POST.getlist('selected_students')
+        student_ids = selected_ids(request, 'selected_students')
+        
+        if action == 'export':
+            # Checked students, or everything matching the current filters
+            if request.POST.get('scope') == 'filtered':
+                students = filter_students(Student.objects.all(), StudentSearchForm(request.POST))
+            else:
+                students = Student.objects.filter(id__in=student_ids)
+            if not students.query.order_by:
+                students = students.order_by('department', 'year', 'last_name', 'first_name', 'id')
+            return exports.export_response(students, request.POST.get('format', 'csv'))
         
         if action and student_ids:
             students = Student.objects.filter(id__in=student_ids)
@@ -461,15 +480,18 @@ def admin_bulk_operations(request):
                 students.delete()
                 messages.success(request, f'{count} students deleted successfully!')
             elif action == 'honor_roll':
-                count = 0
-                for student in students:
-                    student.achievements = "Honor Roll Student - " + (student.achievements or "")
-                    student.save()
-                    count += 1
+                count = bulk.mark_honor_roll(students)
                 messages.success(request, f'{count} students marked as Honor Roll!')
-            elif action == 'export':
-                # Here you could implement CSV export
-                messages.info(request, 'Export functionality would be implemented here.')
+            elif action == 'reassign':
+                try:
+                    # new_* so they don't collide with the list filters the form also carries
+                    count = bulk.reassign_students(students, **{
+                        name: request.POST.get(f'new_{name}', '').strip() for name in bulk.REASSIGN_FIELDS
+                    })
+                except ValueError as exc:
+                    messages.error(request, str(exc))
+                else:
+                    messages.success(request, f'{count} students reassigned!')
         
         return redirect('admin_student_list')
     
@@ -477,37 +499,48 @@ def admin_bulk_operations(request):
 
 # Album Views
 @login_required
-def album_list(request):
+@cache_page_versioned('albums', 'photo-counts')
+async def album_list(request):
     """Display all available albums with optional search"""
     search_query = request.GET.get('search', '').strip()
     albums = Album.objects.filter(is_active=True)
     
     if search_query:
-        albums = albums.filter(
-            models.Q(title__icontains=search_query) |
-            models.Q(description__icontains=search_query) |
-            models.Q(department__icontains=search_query) |
-            models.Q(year__icontains=search_query)
-        )
-    
-    albums = albums.order_by('-created_at')
+        albums = await search.asearch_albums(albums, search_query)
+    else:
+        albums = albums.order_by('-created_at')
     
     context = {
-        'albums': albums,
+        'albums': [album async for album in albums],
         'search': search_query,
     }
     return render(request, 'yearbook/album_list.html', context)
 
+def album_validators(request, album_id):
+    """ETag parts of an album page, in one query"""
+    newest = (Photo.objects.filter(album=models.OuterRef('pk')).order_by()
+              .values('album').annotate(newest=models.Max('created_at')).values('newest'))
+    row = (Album.objects.filter(id=album_id, is_active=True).order_by()
+           .annotate(newest=models.Subquery(newest))
+           .values_list('updated_at', 'photo_count', 'newest').first())
+    if row is None:
+        return None
+    return (*row, request.GET.get('cursor'))
+
 @login_required
-def album_detail(request, album_id):
+@conditional_page(album_validators, 'students', 'album:{album_id}')
+@cache_page_versioned('students', 'album:{album_id}')
+async def album_detail(request, album_id):
     """Display photos in a specific album"""
-    album = get_object_or_404(Album, id=album_id, is_active=True)
-    photos = album.photos.all().order_by('-is_featured', '-created_at')
+    try:
+        album = await Album.objects.aget(id=album_id, is_active=True)
+    except Album.DoesNotExist:
+        raise Http404('No Album matches the given query.')
+    photos = album.photos.select_related('student').order_by('-is_featured', '-created_at', '-id')
     
     # Paginate photos
-    paginator = Paginator(photos, 12)  # Show 12 photos per page
-    page_number = request.GET.get('page')
-    photos = paginator.get_page(page_number)
+    paginator = CursorPaginator(photos, 12)  # Show 12 photos per page
+    photos = await paginator.aget_page(request.GET.get('cursor'))
     
     context = {
         'album': album,
@@ -515,10 +548,16 @@ def album_detail(request, album_id):
     }
     return render(request, 'yearbook/album_detail.html', context)
 
+def photo_validators(request, photo_id):
+    """ETag parts of a photo page, in one query"""
+    return Photo.objects.filter(id=photo_id).order_by().values_list('created_at', 'album__updated_at').first()
+
 @login_required
+@conditional_page(photo_validators, 'albums', 'students', 'photo:{photo_id}')
+@cache_page_versioned('albums', 'students', 'photo:{photo_id}')
 def photo_detail(request, photo_id):
     """Display individual photo with details"""
-    photo = get_object_or_404(Photo, id=photo_id)
+    photo = get_object_or_404(Photo.objects.select_related('album', 'student'), id=photo_id)
     
     context = {
         'photo': photo,
@@ -537,6 +576,22 @@ def admin_album_list(request):
     }
     return render(request, 'yearbook/admin_album_list.html', context)
 
+@login_required
+@user_passes_test(is_admin)
+def admin_album_bulk_operations(request):
+    """Admin view to activate or deactivate the checked albums"""
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        album_ids = selected_ids(request, 'selected_albums')
+        
+        if not album_ids:
+            messages.error(request, 'Please select at least one album.')
+        elif action in ('activate', 'deactivate'):
+            count = bulk.set_albums_active(Album.objects.filter(id__in=album_ids), action == 'activate')
+            messages.success(request, f'{count} albums {action}d!')
+    
+    return redirect('admin_album_list')
+
 @login_required
 @user_passes_test(is_admin)
 def admin_album_add(request):
@@ -618,14 +673,35 @@ def admin_album_delete(request, album_id):
 def admin_photo_list(request, album_id):
     """Admin view to manage photos in an album"""
     album = get_object_or_404(Album, id=album_id)
-    photos = album.photos.all().order_by('-is_featured', '-created_at')
+    photos = album.photos.select_related('student').order_by('-is_featured', '-created_at')
+    upload_jobs = album.upload_jobs.filter(status__in=['pending', 'running'])
     
     context = {
         'album': album,
         'photos': photos,
+        'upload_jobs': upload_jobs,
     }
     return render(request, 'yearbook/admin_photo_list.html', context)
 
+@login_required
+@user_passes_test(is_admin)
+def admin_photo_bulk_operations(request, album_id):
+    """Admin view to feature or unfeature the checked photos of an album"""
+    album = get_object_or_404(Album, id=album_id)
+    
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        photo_ids = selected_ids(request, 'selected_photos')
+        
+        if not photo_ids:
+            messages.error(request, 'Please select at least one photo.')
+        elif action in ('feature', 'unfeature'):
+            photos = album.photos.filter(id__in=photo_ids)
+            count = bulk.set_photos_featured(photos, action == 'feature')
+            messages.success(request, f'{count} photos {action}d!')
+    
+    return redirect('admin_photo_list', album_id=album.id)
+
 @login_required
 @user_passes_test(is_admin)
 def admin_photo_add(request, album_id):
@@ -646,17 +722,17 @@ def admin_photo_add(request, album_id):
                 except Student.DoesNotExist:
                     pass
             
-            for image in images:
-                Photo.objects.create(
-                    album=album,
-                    student=student,
-                    image=image,
-                    caption=caption,
-                    is_featured=is_featured,
-                    uploaded_by=request.user
-                )
+            job = uploads.stage(
+                album,
+                images,
+                request.user,
+                student=student,
+                caption=caption,
+                is_featured=is_featured,
+            )
+            uploads.dispatch(job)
             
-            messages.success(request, f'{len(images)} photo(s) added to "{album.title}" successfully!')
+            messages.success(request, f'{len(images)} photo(s) queued for "{album.title}". They will appear as processing completes.')
             return redirect('admin_photo_list', album_id=album.id)
         else:
             messages.error(request, 'Please select at least one image.')
@@ -671,11 +747,63 @@ def admin_photo_add(request, album_id):
     }
     return render(request, 'yearbook/admin_photo_form.html', context)
 
+@login_required
+@user_passes_test(is_admin)
+def admin_upload_status(request, job_id):
+    """JSON progress of a bulk photo upload"""
+    job = get_object_or_404(PhotoUploadJob, id=job_id)
+    return JsonResponse({
+        'id': job.id,
+        'album': job.album_id,
+        'status': job.status,
+        'total': job.total,
+        'processed': job.processed,
+        'failed': job.failed,
+        'errors': job.errors.splitlines(),
+        'finished': job.is_finished,
+    })
+
+@login_required
+@user_passes_test(is_admin)
+def admin_user_lookup(request):
+    """Usernames starting with ?q=, for the student form's user box"""
+    query = request.GET.get('q', '').strip()
+    usernames = []
+    if query:
+        # A range rather than LIKE, so the username index serves it
+        usernames = list(User.objects.filter(username__gte=query, username__lt=query + '\U0010ffff')
+                         .order_by('username').values_list('username', flat=True)[:10])
+    return JsonResponse({'results': usernames})
+
+@login_required
+@user_passes_test(is_admin)
+def admin_search_report(request):
+    """JSON top queries and searches per day, from the daily rollups"""
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 366)
+    except ValueError:
+        days = 30
+    search_type = request.GET.get('type') or None
+    query = request.GET.get('query') or None
+    return JsonResponse({
+        'days': days,
+        'top_queries': [{'query': q, 'searches': n}
+                        for q, n in searchlog.top_queries(days, 20, search_type)],
+        'trend': [{'day': day.isoformat(), 'searches': n}
+                  for day, n in searchlog.trend(days, query, search_type)],
+    })
+
+@login_required
+@user_passes_test(is_admin)
+def admin_cache_stats(request):
+    """JSON hit rates of the fragment cache, for monitoring"""
+    return JsonResponse({'fragments': caching.fragment_stats()})
+
 @login_required
 @user_passes_test(is_admin)
 def admin_photo_delete(request, photo_id):
     """Admin view to delete photo"""
-    photo = get_object_or_404(Photo, id=photo_id)
+    photo = get_object_or_404(Photo.objects.select_related('album', 'student'), id=photo_id)
     album = photo.album
     
     if request.method == 'POST':
@@ -687,3 +815,10 @@ def admin_photo_delete(request, photo_id):
         'photo': photo,
     }
     return render(request, 'yearbook/admin_photo_delete.html', context)
+
+@login_required
+def media_file(request, path):
+    """Serve an uploaded image if the user may see what it belongs to"""
+    if not media.can_view(request.user, path):
+        raise Http404('File not found')
+    return media.serve(request, path)